@@ -0,0 +1,66 @@
+"""
+Chawathe edit script time for a node whose N children were shuffled, from a
+few swapped children to a full shuffle. Each child is mapped to its copy, so
+the script is made of the Moves of align_children, one for every child that is
+not part of the longest common subsequence.
+
+Run with `python -m benchmarks.bench_align_children`.
+"""
+
+import random
+
+from benchmarks.util import timed
+from sequoia_diff.actions import generate_chawathe_edit_script
+from sequoia_diff.models import MappingDict, Node
+
+
+def shuffled_siblings(
+    n_children: int, fraction: float, seed: int = 0
+) -> tuple[Node, Node, MappingDict]:
+    """
+    Builds a node with n_children leaves and a copy of it where a fraction of
+    the children were shuffled, with every node mapped to its copy.
+    """
+    rng = random.Random(seed)
+    src = Node(type="enum_body", label=None)
+    for i in range(n_children):
+        src.children_append(Node(type="identifier", label=f"CONSTANT_{i}"))
+
+    dst = src.deep_copy()
+    children = list(dst.children)
+    shuffled = rng.sample(range(n_children), int(fraction * n_children))
+    for i, j in zip(shuffled, rng.sample(shuffled, len(shuffled)), strict=True):
+        children[i] = dst.children[j]
+    dst.children = children
+    dst.needs_position_recomputation()
+
+    mappings = MappingDict()
+    by_label = {child.label: child for child in dst.children}
+    mappings.put(src, dst)
+    for child in src.children:
+        mappings.put(child, by_label[child.label])
+
+    return src, dst, mappings
+
+
+def main() -> None:
+    print(f"{'children':>9} {'shuffled':>9} {'script (s)':>11} {'moves':>6}")
+    for n_children in [100, 1_000, 10_000]:
+        for fraction in [0.05, 1.0]:
+            src, dst, mappings = shuffled_siblings(n_children, fraction)
+
+            script_time = timed(
+                lambda mappings=mappings, src=src, dst=dst: (
+                    generate_chawathe_edit_script(mappings, src, dst)
+                ),
+                repeat=1,
+            )
+            actions = generate_chawathe_edit_script(mappings, src, dst)
+            print(
+                f"{n_children:>9} {fraction:>9.0%} {script_time:>11.3f}"
+                f" {len(actions):>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
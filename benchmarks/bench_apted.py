@@ -0,0 +1,93 @@
+"""
+Last-chance matching time of match_rted (Zhang-Shasha) versus match_apted on
+left-deep trees (think method call chains), right-deep trees (think `else if`
+cascades) and balanced trees of growing size. Zhang-Shasha decomposes the trees
+along left paths only, so it is slow on right-deep trees. The pure Python
+match_rted is skipped once it gets too slow.
+
+Run with `python -m benchmarks.bench_apted`.
+"""
+
+import random
+from typing import Callable
+
+from benchmarks.util import timed
+from sequoia_diff.apted import match_apted
+from sequoia_diff.matching import match_rted
+from sequoia_diff.models import MappingDict, Node
+
+SKIP_AFTER = 10.0
+
+
+def leaf(rng: random.Random) -> Node:
+    return Node(type="identifier", label=rng.choice(["i", "j", "k", "foo", "bar"]))
+
+
+def deep_tree(n_nodes: int, seed: int, left: bool) -> Node:
+    """
+    Chain of binary nodes whose first (left=True) or last child is the rest of
+    the chain and whose other child is a leaf.
+    """
+    rng = random.Random(seed)
+    node = leaf(rng)
+    for _ in range(n_nodes // 2):
+        children = [node, leaf(rng)] if left else [leaf(rng), node]
+        node = Node(type="expression", label=None, children=children)
+
+    return node
+
+
+def balanced_tree(n_nodes: int, seed: int) -> Node:
+    rng = random.Random(seed)
+    level = [leaf(rng) for _ in range((n_nodes + 1) // 2)]
+    while len(level) > 1:
+        level = [
+            Node(type="expression", label=None, children=level[i : i + 2])
+            for i in range(0, len(level), 2)
+        ]
+
+    return level[0]
+
+
+def relabeled_copy(node: Node, fraction: float, seed: int) -> Node:
+    rng = random.Random(seed)
+    result = node.deep_copy()
+    for n in result.pre_order():
+        if len(n.children) == 0 and rng.random() < fraction:
+            n.label = leaf(rng).label
+            n.needs_lightweight_recomputation()
+
+    return result
+
+
+def main() -> None:
+    shapes: list[tuple[str, Callable[[int, int], Node]]] = [
+        ("left", lambda n, seed: deep_tree(n, seed, left=True)),
+        ("right", lambda n, seed: deep_tree(n, seed, left=False)),
+        ("balanced", balanced_tree),
+    ]
+
+    print(f"{'shape':>8} {'nodes':>6} {'rted (s)':>9} {'apted (s)':>10}")
+    for shape, build in shapes:
+        skip_rted = False
+        for n_nodes in [50, 100, 200, 400]:
+            src = build(n_nodes, 1)
+            dst = relabeled_copy(src, 0.3, seed=2)
+
+            rted_time = "-"
+            if not skip_rted:
+                elapsed = timed(
+                    lambda src=src, dst=dst: match_rted(MappingDict(), src, dst),
+                    repeat=1,
+                )
+                rted_time = f"{elapsed:.3f}"
+                skip_rted = elapsed > SKIP_AFTER
+
+            apted_time = timed(
+                lambda src=src, dst=dst: match_apted(MappingDict(), src, dst), repeat=1
+            )
+            print(f"{shape:>8} {src.size:>6} {rted_time:>9} {apted_time:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Bottom-up matching time on nested blocks of repeated statements of growing
+size, with dice similarities looked up in the mapped descendants index
+(current) versus counted by going through the subtrees on every call (previous
+behavior). With the index, the time per node should stay roughly constant.
+
+Run with `python -m benchmarks.bench_bottom_up`.
+"""
+
+from benchmarks.util import nested_blocks, shuffled_copy, timed
+from sequoia_diff.matching import (
+    MappedDescendantsIndex,
+    dice_similarity,
+    match_greedy_bottom_up,
+    match_greedy_top_down,
+)
+from sequoia_diff.models import MappingDict, Node
+
+
+def subtree_dice_similarity(
+    self: MappedDescendantsIndex, src: Node, dst: Node
+) -> float:
+    return dice_similarity(self.mappings, src, dst)
+
+
+def run(n_blocks: int) -> tuple[int, float]:
+    src = nested_blocks(n_blocks, seed=1)
+    dst = shuffled_copy(src, 0.5, seed=2)
+
+    # Change one token per block so that the blocks are not isomorphic
+    for block in dst.children[0].children:
+        for node in block.children[0].children:
+            if node.type == ";":
+                node.label = ","
+                node.needs_lightweight_recomputation()
+
+    mappings = MappingDict()
+    match_greedy_top_down(mappings, src, dst)
+
+    def bottom_up() -> None:
+        match_greedy_bottom_up(
+            MappingDict(dict(mappings.src_to_dst), dict(mappings.dst_to_src)),
+            src,
+            dst,
+        )
+
+    return src.size, timed(bottom_up, repeat=1)
+
+
+def main() -> None:
+    indexed = MappedDescendantsIndex.dice_similarity
+
+    print(f"{'nodes':>8} {'dice':>8} {'bottom-up (s)':>14} {'us/node':>8}")
+    for n_blocks in [100, 200, 400, 800]:
+        for name, func in [("subtree", subtree_dice_similarity), ("index", indexed)]:
+            MappedDescendantsIndex.dice_similarity = func  # type: ignore[method-assign]
+            try:
+                size, bottom_up_time = run(n_blocks)
+            finally:
+                MappedDescendantsIndex.dice_similarity = indexed  # type: ignore[method-assign]
+
+            per_node = bottom_up_time / size * 1e6
+            print(f"{size:>8} {name:>8} {bottom_up_time:>14.3f} {per_node:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Throughput and edit script length of match_chawathe_fast (FastMatch) versus the
+default pipeline (match_greedy_top_down followed by match_greedy_bottom_up), on
+classes of growing size where a few statements are deleted and a few
+identifiers are renamed.
+
+FastMatch computes LCSs with Myers' algorithm, which is linear on similar trees
+but quadratic when many subtrees are moved, so it is not a good fit for
+heavily shuffled trees.
+
+Run with `python -m benchmarks.bench_chawathe_fast`.
+"""
+
+import random
+
+from benchmarks.util import repeated_token_tree, timed
+from sequoia_diff.actions import generate_simplified_chawathe_edit_script
+from sequoia_diff.matching import MatchingFunc, generate_mappings, match_chawathe_fast
+from sequoia_diff.models import Node
+
+
+def class_body(n_methods: int, seed: int) -> Node:
+    """
+    Methods of 10 statements whose identifiers are drawn from a pool of 50.
+    """
+    rng = random.Random(seed)
+    methods: list[Node] = []
+    for i in range(n_methods):
+        block = repeated_token_tree(10, seed + i).children[0]
+        for n in block.pre_order():
+            if n.type == "identifier":
+                n.label = f"var{rng.randrange(50)}"
+            elif n.type == "decimal_integer_literal":
+                n.label = str(rng.randrange(100))
+            n.needs_lightweight_recomputation()
+
+        methods.append(
+            Node(
+                type="method_declaration",
+                label=None,
+                children=[Node(type="identifier", label=f"method{i}"), block],
+            )
+        )
+
+    return Node(
+        type="program",
+        label=None,
+        children=[Node(type="class_body", label=None, children=methods)],
+    )
+
+
+def edited_copy(node: Node, seed: int) -> Node:
+    """
+    Deep copies node, deletes a statement in 30% of the blocks and renames 3% of
+    the identifiers.
+    """
+    rng = random.Random(seed)
+    result = node.deep_copy()
+    for n in list(result.pre_order()):
+        if n.type == "block" and rng.random() < 0.3:
+            n.children_remove(rng.choice(n.children))
+        elif n.type == "identifier" and rng.random() < 0.03:
+            n.label = f"renamed_{n.label}"
+            n.needs_lightweight_recomputation()
+
+    return result
+
+
+def main() -> None:
+    pipelines: list[tuple[str, list[MatchingFunc] | None]] = [
+        ("default", None),
+        ("fast", [match_chawathe_fast]),
+    ]
+
+    print(f"{'nodes':>8} {'matcher':>8} {'time (s)':>9} {'nodes/s':>9} {'actions':>8}")
+    for n_methods in [25, 50, 100, 200, 400]:
+        src = class_body(n_methods, seed=1)
+        dst = edited_copy(src, seed=2)
+        n_nodes = src.size + dst.size
+
+        for name, funcs in pipelines:
+            elapsed = timed(
+                lambda src=src, dst=dst, funcs=funcs: generate_mappings(
+                    src, dst, funcs
+                ),
+                repeat=1,
+            )
+            mappings = generate_mappings(src, dst, funcs)
+            actions = generate_simplified_chawathe_edit_script(mappings, src, dst)
+            print(
+                f"{src.size:>8} {name:>8} {elapsed:>9.3f}"
+                f" {n_nodes / elapsed:>9.0f} {len(actions):>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Candidate discovery time of the bottom-up matcher for every internal node of
+src, with candidates merged bottom-up by DstCandidatesIndex (current) versus
+get_dst_candidates going through the whole subtree of every node (previous
+behavior). Uses nested blocks of repeated statements, both flat and deeply
+nested (think of a long `else if` cascade).
+
+Run with `python -m benchmarks.bench_dst_candidates`.
+"""
+
+from benchmarks.util import nested_blocks, repeated_token_tree, shuffled_copy, timed
+from sequoia_diff.matching import (
+    DstCandidatesIndex,
+    get_dst_candidates,
+    match_greedy_top_down,
+)
+from sequoia_diff.models import MappingDict, Node
+
+
+def deeply_nested_blocks(n_blocks: int, seed: int) -> Node:
+    statements = repeated_token_tree(10 * n_blocks, seed).children[0].children
+
+    block = Node(type="block", label=None, children=statements[:10])
+    for i in range(10, len(statements), 10):
+        block = Node(
+            type="block", label=None, children=statements[i : i + 10] + [block]
+        )
+
+    return Node(type="program", label=None, children=[block])
+
+
+def run(src: Node) -> tuple[float, float]:
+    dst = shuffled_copy(src, 0.5, seed=2)
+
+    mappings = MappingDict()
+    match_greedy_top_down(mappings, src, dst)
+    nodes = [node for node in src.post_order() if len(node.children) != 0]
+
+    def subtree() -> None:
+        for node in nodes:
+            get_dst_candidates(mappings, node)
+
+    def index() -> None:
+        candidates_index = DstCandidatesIndex(mappings)
+        for node in src.post_order():
+            candidates_index.update(node)
+            if len(node.children) != 0:
+                candidates_index.get_dst_candidates(node)
+
+    return timed(subtree, repeat=1), timed(index, repeat=1)
+
+
+def main() -> None:
+    print(f"{'tree':>6} {'nodes':>8} {'subtree (s)':>12} {'index (s)':>10}")
+    for name, build in [("flat", nested_blocks), ("deep", deeply_nested_blocks)]:
+        for n_blocks in [100, 200, 400, 800]:
+            src = build(n_blocks, 1)
+            subtree_time, index_time = run(src)
+            print(f"{name:>6} {src.size:>8} {subtree_time:>12.3f} {index_time:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
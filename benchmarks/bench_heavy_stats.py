@@ -0,0 +1,58 @@
+"""
+Time of number_of_mapped_descendants on nested blocks of repeated statements,
+with descendant checks answered by the heavy statistics index (current) versus
+a set of the descendants of the dst node built on every call (previous
+behavior).
+
+Run with `python -m benchmarks.bench_heavy_stats`.
+"""
+
+from typing import Callable
+
+from benchmarks.util import nested_blocks, shuffled_copy, timed
+from sequoia_diff.matching import match_greedy_top_down, number_of_mapped_descendants
+from sequoia_diff.models import MappingDict, Node
+
+
+def set_number_of_mapped_descendants(
+    mappings: MappingDict, src: Node, dst: Node
+) -> int:
+    dst_descendants = set(node for node in dst.pre_order(skip_self=True))
+
+    result = 0
+    for node in src.pre_order(skip_self=True):
+        if mappings.src_to_dst.get(node) in dst_descendants:
+            result += 1
+
+    return result
+
+
+def run(n_blocks: int, func: Callable[[MappingDict, Node, Node], int]) -> float:
+    src = nested_blocks(n_blocks, seed=1)
+    dst = shuffled_copy(src, 0.5, seed=2)
+
+    mappings = MappingDict()
+    match_greedy_top_down(mappings, src, dst)
+
+    # Every inner src block against the big outer dst block
+    pairs = [(block, dst.children[0]) for block in src.children[0].children]
+
+    def count() -> None:
+        for a, b in pairs:
+            func(mappings, a, b)
+
+    return timed(count)
+
+
+def main() -> None:
+    print(f"{'blocks':>8} {'descendants':>12} {'time (s)':>9}")
+    for n_blocks in [100, 200, 400]:
+        for name, func in [
+            ("set", set_number_of_mapped_descendants),
+            ("index", number_of_mapped_descendants),
+        ]:
+            print(f"{n_blocks:>8} {name:>12} {run(n_blocks, func):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Mapping and edit script time on trees full of repeated tokens, with nodes
+hashed by identity (current) versus by content (previous behavior).
+
+Run with `python -m benchmarks.bench_identity_hashing`.
+"""
+
+from benchmarks.util import repeated_token_tree, shuffled_copy, timed
+from sequoia_diff.actions import generate_simplified_chawathe_edit_script
+from sequoia_diff.matching import generate_mappings
+from sequoia_diff.models import Node
+
+
+def content_hash(self: Node) -> int:
+    return self.hash_value
+
+
+def run(n_statements: int) -> tuple[int, float, float]:
+    src = repeated_token_tree(n_statements, seed=1)
+    dst = shuffled_copy(src, 0.1, seed=2)
+
+    mapping_time = timed(lambda: generate_mappings(src, dst), repeat=1)
+
+    mappings = generate_mappings(src, dst)
+    script_time = timed(
+        lambda: generate_simplified_chawathe_edit_script(mappings, src, dst),
+        repeat=1,
+    )
+
+    return src.size, mapping_time, script_time
+
+
+def main() -> None:
+    identity_hash = Node.__hash__
+
+    print(f"{'nodes':>8} {'hash':>9} {'mapping (s)':>12} {'script (s)':>11}")
+    for n_statements in [125, 250, 500]:
+        for name, hash_func in [("content", content_hash), ("identity", identity_hash)]:
+            Node.__hash__ = hash_func  # type: ignore[method-assign]
+            try:
+                size, mapping_time, script_time = run(n_statements)
+            finally:
+                Node.__hash__ = identity_hash  # type: ignore[method-assign]
+
+            print(f"{size:>8} {name:>9} {mapping_time:>12.3f} {script_time:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Last-chance matching time on statements with long identifiers, where a few
+identifiers are renamed, without caching labels (maxsize 0) versus with a
+LabelDistanceCache of growing size. The hit rate tells whether maxsize is big
+enough.
+
+Run with `python -m benchmarks.bench_label_cache`.
+"""
+
+import random
+
+from benchmarks.util import repeated_token_tree, shuffled_copy, timed
+from sequoia_diff.matching import match_rted
+from sequoia_diff.matching_numpy import match_rted_numpy
+from sequoia_diff.models import MappingDict, Node
+from sequoia_diff.string_comparisons import LabelDistanceCache
+
+WORDS = ["request", "response", "handler", "context", "builder", "factory"]
+
+
+def long_identifiers(n_statements: int, seed: int) -> Node:
+    """
+    Statements whose identifiers are drawn from a pool of 50 names made of 4 to
+    8 words.
+    """
+    rng = random.Random(seed)
+    names = [
+        "_".join(rng.choices(WORDS, k=rng.randint(4, 8))) + str(i) for i in range(50)
+    ]
+
+    result = repeated_token_tree(n_statements, seed)
+    for n in result.pre_order():
+        if n.type == "identifier":
+            n.label = rng.choice(names)
+            n.needs_lightweight_recomputation()
+
+    return result
+
+
+def renamed_copy(node: Node, fraction: float, seed: int) -> Node:
+    """
+    Shuffles a copy of node and appends a suffix to a fraction of its
+    identifiers.
+    """
+    rng = random.Random(seed)
+    result = shuffled_copy(node, 0.3, seed)
+    for n in result.pre_order():
+        if n.type == "identifier" and rng.random() < fraction:
+            n.label = f"{n.label}_renamed"
+            n.needs_lightweight_recomputation()
+
+    return result
+
+
+def main() -> None:
+    print(
+        f"{'nodes':>6} {'matcher':>7} {'maxsize':>8} {'time (s)':>9}"
+        f" {'hits':>8} {'misses':>8}"
+    )
+    for n_statements in [10, 40, 80]:
+        src = long_identifiers(n_statements, seed=1)
+        dst = renamed_copy(src, 0.1, seed=2)
+
+        for name, func in [("python", match_rted), ("numpy", match_rted_numpy)]:
+            for maxsize in [0, 256, 1 << 16]:
+                elapsed = timed(
+                    lambda func=func, src=src, dst=dst, maxsize=maxsize: func(
+                        MappingDict(), src, dst, LabelDistanceCache(maxsize)
+                    ),
+                    repeat=1,
+                )
+                cache = LabelDistanceCache(maxsize)
+                func(MappingDict(), src, dst, cache)
+                print(
+                    f"{src.size:>6} {name:>7} {maxsize:>8} {elapsed:>9.3f}"
+                    f" {cache.hits:>8} {cache.misses:>8}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Load time of from_tree_sitter_tree per MB of Java source, on generated classes
+of growing size. Parsing with tree-sitter is not included.
+
+Run with `python -m benchmarks.bench_loader`.
+"""
+
+import random
+
+import tree_sitter as ts
+import tree_sitter_java
+
+from benchmarks.util import timed
+from sequoia_diff.loaders import from_tree_sitter_tree
+
+
+def java_source(n_methods: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    methods: list[str] = []
+    for i in range(n_methods):
+        statements = [
+            f"        int var{j} = var{rng.randrange(50)} + {rng.randrange(100)};\n"
+            f'        System.out.println("método {i}: " + var{j});\n'
+            for j in range(10)
+        ]
+        methods.append(f"    public void method{i}() {{\n{''.join(statements)}    }}\n")
+
+    return f"public class Generated {{\n{''.join(methods)}}}\n".encode("utf-8")
+
+
+def main() -> None:
+    parser = ts.Parser(ts.Language(tree_sitter_java.language()))
+
+    print(f"{'MB':>6} {'nodes':>8} {'time (s)':>9} {'s/MB':>6}")
+    for n_methods in [100, 1000, 5000]:
+        source = java_source(n_methods, seed=1)
+        tree = parser.parse(source)
+        size = from_tree_sitter_tree(tree, "java").size
+
+        elapsed = timed(lambda tree=tree: from_tree_sitter_tree(tree, "java"))
+        mb = len(source) / 1e6
+        print(f"{mb:>6.2f} {size:>8} {elapsed:>9.3f} {elapsed / mb:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Matching time and edit script length of the default pipeline with the default,
+low latency and thorough matcher configurations, on classes of growing size
+where statements are deleted, identifiers are renamed and methods are
+shuffled. Shorter edit scripts are better.
+
+Run with `python -m benchmarks.bench_matcher_config`.
+"""
+
+from benchmarks.bench_chawathe_fast import class_body, edited_copy
+from benchmarks.util import shuffled_copy, timed
+from sequoia_diff.actions import generate_simplified_chawathe_edit_script
+from sequoia_diff.matching import MatcherConfig, generate_mappings
+
+
+def main() -> None:
+    configs = [
+        ("default", MatcherConfig()),
+        ("low_latency", MatcherConfig.low_latency()),
+        ("thorough", MatcherConfig.thorough()),
+    ]
+
+    print(f"{'nodes':>8} {'config':>12} {'time (s)':>9} {'actions':>8}")
+    for n_methods in [25, 50, 100]:
+        src = class_body(n_methods, seed=1)
+        dst = shuffled_copy(edited_copy(src, seed=2), 0.1, seed=3)
+
+        for name, config in configs:
+            elapsed = timed(
+                lambda src=src, dst=dst, config=config: (
+                    generate_mappings(src, dst, config=config)
+                ),
+                repeat=1,
+            )
+            mappings = generate_mappings(src, dst, config=config)
+            actions = generate_simplified_chawathe_edit_script(mappings, src, dst)
+            print(f"{src.size:>8} {name:>12} {elapsed:>9.3f} {len(actions):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Chawathe edit script time for a node with thousands of children (think of a huge enum or
+array initializer) where a fraction of the children were reordered, with cached
+child positions (current) versus a scan of the parent's children on every
+access (previous behavior).
+
+Run with `python -m benchmarks.bench_position_in_parent`.
+"""
+
+import random
+
+from benchmarks.util import timed
+from sequoia_diff.actions import generate_chawathe_edit_script
+from sequoia_diff.matching import generate_mappings
+from sequoia_diff.models import Node
+
+
+def scanned_position_in_parent(self: Node) -> int:
+    if self.parent is None:
+        return -1
+    for idx, child in enumerate(self.parent.children):
+        if child is self:
+            return idx
+    return -1
+
+
+def enum_body(n_constants: int, seed: int = 0) -> tuple[Node, Node]:
+    rng = random.Random(seed)
+    names = [f"CONSTANT_{i}" for i in range(n_constants)]
+
+    def build(order: list[str]) -> Node:
+        return Node(
+            type="program",
+            label=None,
+            children=[
+                Node(
+                    type="enum_body",
+                    label=None,
+                    children=[Node(type="identifier", label=name) for name in order],
+                )
+            ],
+        )
+
+    shuffled = list(names)
+    for _ in range(n_constants // 20):
+        i, j = rng.randrange(n_constants), rng.randrange(n_constants)
+        shuffled[i], shuffled[j] = shuffled[j], shuffled[i]
+
+    return build(names), build(shuffled)
+
+
+def main() -> None:
+    cached = Node.position_in_parent
+
+    print(f"{'children':>9} {'positions':>10} {'script (s)':>11}")
+    for n_constants in [2_000, 4_000, 8_000]:
+        src, dst = enum_body(n_constants)
+        mappings = generate_mappings(src, dst)
+
+        for name, position_in_parent in [
+            ("scanned", property(scanned_position_in_parent)),
+            ("cached", cached),
+        ]:
+            Node.position_in_parent = position_in_parent  # type: ignore[method-assign]
+            try:
+                script_time = timed(
+                    lambda mappings=mappings, src=src, dst=dst: (
+                        generate_chawathe_edit_script(mappings, src, dst)
+                    ),
+                    repeat=1,
+                )
+            finally:
+                Node.position_in_parent = cached  # type: ignore[method-assign]
+
+            print(f"{n_constants:>9} {name:>10} {script_time:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
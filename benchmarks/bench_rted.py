@@ -0,0 +1,51 @@
+"""
+Last-chance matching time (RTED / Zhang-Shasha) of the pure Python match_rted
+versus match_rted_numpy on subtrees of growing size, and the largest size at
+which each stays under 100 ms. The pure Python version is skipped once it gets
+too slow.
+
+Run with `python -m benchmarks.bench_rted`.
+"""
+
+from benchmarks.util import repeated_token_tree, shuffled_copy, timed
+from sequoia_diff.matching import match_rted
+from sequoia_diff.matching_numpy import match_rted_numpy
+from sequoia_diff.models import MappingDict
+
+BUDGET = 0.1
+SKIP_AFTER = 10.0
+
+
+def main() -> None:
+    largest_under_budget = {"python": 0, "numpy": 0}
+    skipped: set[str] = set()
+
+    print(f"{'nodes':>8} {'python (s)':>11} {'numpy (s)':>10}")
+    for n_statements in [5, 10, 20, 40, 80, 120, 160]:
+        src = repeated_token_tree(n_statements, seed=1)
+        dst = shuffled_copy(src, 0.3, seed=2)
+
+        times: dict[str, str] = {}
+        for name, func in [("python", match_rted), ("numpy", match_rted_numpy)]:
+            if name in skipped:
+                times[name] = "-"
+                continue
+
+            elapsed = timed(
+                lambda func=func, src=src, dst=dst: func(MappingDict(), src, dst),
+                repeat=1,
+            )
+            times[name] = f"{elapsed:.3f}"
+            if elapsed < BUDGET:
+                largest_under_budget[name] = src.size
+            if elapsed > SKIP_AFTER:
+                skipped.add(name)
+
+        print(f"{src.size:>8} {times['python']:>11} {times['numpy']:>10}")
+
+    for name, size in largest_under_budget.items():
+        print(f"{name}: under {BUDGET * 1000:.0f} ms up to {size} nodes")
+
+
+if __name__ == "__main__":
+    main()
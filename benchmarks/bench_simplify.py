@@ -0,0 +1,86 @@
+"""
+Simplified Chawathe edit script time for a file where a whole class is added,
+with a single pass over the inserted and deleted nodes (current) versus a walk
+of the subtree of the parent of every inserted or deleted node and a removal
+from the list of actions for each redundant action (previous behavior).
+
+Run with `python -m benchmarks.bench_simplify`.
+"""
+
+from benchmarks.bench_chawathe_fast import class_body
+from benchmarks.util import timed
+from sequoia_diff.actions import (
+    generate_chawathe_edit_script,
+    generate_simplified_chawathe_edit_script,
+)
+from sequoia_diff.matching import generate_mappings
+from sequoia_diff.models import Action, Delete, Insert, MappingDict, Node
+
+
+def walked_simplified_chawathe_edit_script(
+    mappings: MappingDict, src: Node, dst: Node
+) -> list[Action]:
+    actions = generate_chawathe_edit_script(mappings, src, dst)
+    added_nodes: dict[Node, Insert] = {}
+    deleted_nodes: dict[Node, Delete] = {}
+
+    for action in actions:
+        if isinstance(action, Insert):
+            added_nodes[action.node] = action
+        elif isinstance(action, Delete):
+            deleted_nodes[action.node] = action
+
+    for n in added_nodes:
+        if n.parent in added_nodes and all(
+            d in added_nodes for d in n.parent.pre_order(skip_self=True)
+        ):
+            actions.remove(added_nodes[n])
+            added_nodes[n.parent].whole_subtree = True
+
+    for n in deleted_nodes:
+        if n.parent in deleted_nodes and all(
+            d in deleted_nodes for d in n.parent.pre_order(skip_self=True)
+        ):
+            actions.remove(deleted_nodes[n])
+
+    return actions
+
+
+def with_added_class(src: Node, n_methods: int) -> Node:
+    """
+    Deep copies src and adds a class of n_methods methods, about 100 nodes each,
+    at the end of it.
+    """
+    result = src.deep_copy()
+    added = class_body(n_methods, seed=3).children[0]
+    added.set_parent(None)
+    result.children_append(added)
+
+    return result
+
+
+def main() -> None:
+    src = class_body(20, seed=1)
+
+    print(f"{'added':>8} {'simplifier':>11} {'script (s)':>11} {'actions':>8}")
+    for n_methods in [10, 25, 50]:
+        dst = with_added_class(src, n_methods)
+        mappings = generate_mappings(src, dst)
+
+        for name, func in [
+            ("walked", walked_simplified_chawathe_edit_script),
+            ("single", generate_simplified_chawathe_edit_script),
+        ]:
+            script_time = timed(
+                lambda func=func, mappings=mappings, dst=dst: func(mappings, src, dst),
+                repeat=1,
+            )
+            actions = func(mappings, src, dst)
+            print(
+                f"{dst.size - src.size:>8} {name:>11} {script_time:>11.3f}"
+                f" {len(actions):>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
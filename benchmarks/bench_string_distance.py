@@ -0,0 +1,126 @@
+"""
+Label distance time per backend, on pairs of identifiers, string literals and
+comments where some pairs are equal, some are edited copies and some are
+unrelated. The previous functions, a dynamic program for the Levenshtein
+distance and difflib.SequenceMatcher for the tri-grams, are the reference: the
+backends that are not marked approximate must return the same distances.
+
+Run with `python -m benchmarks.bench_string_distance`.
+"""
+
+import difflib
+import random
+import string
+from typing import Callable
+
+from benchmarks.util import timed
+from sequoia_diff import string_comparisons
+from sequoia_diff.string_comparisons import (
+    BitParallelBackend,
+    DifflibBackend,
+    MultisetBackend,
+    RapidFuzzBackend,
+    StringDistanceBackend,
+    generate_trigrams,
+    levenshtein_distance,
+    normalized_tri_gram_distance,
+    rapidfuzz_levenshtein,
+)
+
+
+def reference_levenshtein_distance(s1: str, s2: str) -> int:
+    return DifflibBackend().levenshtein_distance(s1, s2)
+
+
+def reference_normalized_tri_gram_distance(a: str, b: str) -> float:
+    matcher = difflib.SequenceMatcher(None, generate_trigrams(a), generate_trigrams(b))
+    return 1.0 - matcher.ratio()
+
+
+def label_pairs(n_pairs: int, length: int, seed: int) -> list[tuple[str, str]]:
+    """
+    Builds n_pairs pairs of labels of about `length` characters. A third of the
+    pairs are equal, a third differ by a few characters and a third are
+    unrelated.
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + " _.\"'(),"
+
+    def label() -> str:
+        return "".join(rng.choices(alphabet, k=rng.randint(length // 2, length)))
+
+    pairs: list[tuple[str, str]] = []
+    for i in range(n_pairs):
+        a = label()
+        if i % 3 == 0:
+            b = a
+        elif i % 3 == 1:
+            chars = list(a)
+            for _ in range(max(1, len(a) // 10)):
+                chars[rng.randrange(len(chars))] = rng.choice(alphabet)
+            b = "".join(chars)
+        else:
+            b = label()
+        pairs.append((a, b))
+
+    return pairs
+
+
+def main() -> None:
+    backends: list[tuple[str, StringDistanceBackend]] = [
+        ("difflib", DifflibBackend()),
+        ("bitparallel", BitParallelBackend()),
+        ("multiset*", MultisetBackend()),
+    ]
+    if rapidfuzz_levenshtein is not None:
+        backends.append(("rapidfuzz", RapidFuzzBackend()))
+
+    functions: list[
+        tuple[str, Callable[[str, str], float], Callable[[str, str], float]]
+    ] = [
+        ("levenshtein", reference_levenshtein_distance, levenshtein_distance),
+        (
+            "tri-gram",
+            reference_normalized_tri_gram_distance,
+            normalized_tri_gram_distance,
+        ),
+    ]
+
+    print("* approximate, not expected to match the reference")
+    print(
+        f"{'distance':>11} {'length':>6} {'backend':>11} {'time (s)':>9}"
+        f" {'identical':>10}"
+    )
+    previous_backend = string_comparisons.distance_backend
+    for name, reference, func in functions:
+        for length in [8, 40, 400]:
+            pairs = label_pairs(3000 if length < 400 else 300, length, seed=1)
+            expected = [reference(a, b) for a, b in pairs]
+
+            reference_time = timed(
+                lambda reference=reference, pairs=pairs: [
+                    reference(a, b) for a, b in pairs
+                ]
+            )
+            print(
+                f"{name:>11} {length:>6} {'reference':>11} {reference_time:>9.4f}"
+                f" {len(pairs):>10}"
+            )
+
+            for backend_name, backend in backends:
+                string_comparisons.distance_backend = backend
+                elapsed = timed(
+                    lambda func=func, pairs=pairs: [func(a, b) for a, b in pairs]
+                )
+                identical = sum(
+                    func(a, b) == e for (a, b), e in zip(pairs, expected, strict=True)
+                )
+                print(
+                    f"{name:>11} {length:>6} {backend_name:>11} {elapsed:>9.4f}"
+                    f" {identical:>10}"
+                )
+    string_comparisons.distance_backend = previous_backend
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Time to compute the lightweight statistics (size, height and hashes) of a large
+tree, with the default fast 64-bit hashes versus strict SHA-256 hashes.
+
+Run with `python -m benchmarks.bench_subtree_hashing`.
+"""
+
+import time
+
+from benchmarks.util import repeated_token_tree
+from sequoia_diff.hashing import FastHashStrategy, HashStrategy, Sha256HashStrategy
+from sequoia_diff.models import Node
+
+
+def time_stats(root: Node, repeat: int = 3) -> float:
+    best = float("inf")
+    nodes = list(root.pre_order())
+
+    for _ in range(repeat):
+        for node in nodes:
+            node._needs_lightweight_recomputation = True
+
+        start = time.perf_counter()
+        _ = root.subtree_hash_value
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main() -> None:
+    default_strategy = Node.hash_strategy
+    strategies: list[tuple[str, HashStrategy]] = [
+        ("sha256", Sha256HashStrategy()),
+        ("fast", FastHashStrategy()),
+    ]
+
+    print(f"{'nodes':>8} {'strategy':>9} {'time (s)':>9} {'us/node':>8}")
+    for n_statements in [1000, 5000, 20000]:
+        root = repeated_token_tree(n_statements)
+
+        for name, strategy in strategies:
+            Node.hash_strategy = strategy
+            try:
+                elapsed = time_stats(root)
+            finally:
+                Node.hash_strategy = default_strategy
+
+            print(
+                f"{root.size:>8} {name:>9} {elapsed:>9.3f} "
+                f"{elapsed / root.size * 1e6:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
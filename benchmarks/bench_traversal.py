@@ -0,0 +1,95 @@
+"""
+Traversal time over synthetic deep, wide and balanced trees, comparing the
+iterative traversals of Node against the previous recursive generators and the
+list-based breadth-first search.
+
+Run with `python -m benchmarks.bench_traversal`.
+"""
+
+from typing import Callable, Iterator
+
+from benchmarks.util import timed
+from sequoia_diff.models import Node
+
+
+def recursive_pre_order(node: Node) -> Iterator[Node]:
+    yield node
+    for child in node.children:
+        yield from recursive_pre_order(child)
+
+
+def recursive_post_order(node: Node) -> Iterator[Node]:
+    for child in node.children:
+        yield from recursive_post_order(child)
+    yield node
+
+
+def list_bfs(node: Node) -> Iterator[Node]:
+    queue: list[Node] = [node]
+    while len(queue) != 0:
+        node = queue.pop(0)
+        queue.extend(node.children)
+        yield node
+
+
+def deep_tree(n: int) -> Node:
+    """
+    A single chain, like a long `else if` cascade.
+    """
+    node = Node(type="if_statement", label=None)
+    for _ in range(n - 1):
+        node = Node(type="if_statement", label=None, children=[node])
+    return node
+
+
+def wide_tree(n: int) -> Node:
+    """
+    A single node with n - 1 children, like a huge array initializer.
+    """
+    return Node(
+        type="array_initializer",
+        label=None,
+        children=[
+            Node(type="decimal_integer_literal", label="0") for _ in range(n - 1)
+        ],
+    )
+
+
+def balanced_tree(n: int, arity: int = 4) -> Node:
+    nodes = [Node(type="leaf", label="x") for _ in range(n)]
+    while len(nodes) > 1:
+        nodes = [
+            Node(type="internal", label=None, children=nodes[i : i + arity])
+            for i in range(0, len(nodes), arity)
+        ]
+    return nodes[0]
+
+
+def time_traversal(traversal: Callable[[], Iterator[Node]]) -> str:
+    try:
+        return f"{timed(lambda: sum(1 for _ in traversal())):.3f}"
+    except RecursionError:
+        return "RecursionError"
+
+
+def main() -> None:
+    n = 100_000
+
+    print(f"{'tree':>9} {'traversal':>10} {'recursive (s)':>15} {'iterative (s)':>14}")
+    for name, root in [
+        ("deep", deep_tree(n)),
+        ("wide", wide_tree(n)),
+        ("balanced", balanced_tree(n)),
+    ]:
+        for traversal, before, after in [
+            ("pre_order", recursive_pre_order, Node.pre_order),
+            ("post_order", recursive_post_order, Node.post_order),
+            ("bfs", list_bfs, Node.bfs),
+        ]:
+            before_time = time_traversal(lambda before=before, root=root: before(root))
+            after_time = time_traversal(lambda after=after, root=root: after(root))
+            print(f"{name:>9} {traversal:>10} {before_time:>15} {after_time:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import random
+import time
+from typing import Any, Callable
+
+from sequoia_diff.models import Node
+
+
+def timed(func: Callable[[], Any], repeat: int = 3) -> float:
+    """
+    Returns the best wall-clock time in seconds of `repeat` calls to func.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def repeated_token_tree(n_statements: int, seed: int = 0) -> Node:
+    """
+    Builds a Java-like tree made almost entirely of repeated tokens, e.g. a long
+    method body full of `i = i + 1;` style statements.
+    """
+    rng = random.Random(seed)
+    idents = ["i", "j", "k"]
+
+    statements: list[Node] = []
+    for _ in range(n_statements):
+        lhs = rng.choice(idents)
+        rhs = rng.choice(idents)
+        statements.append(
+            Node(
+                type="expression_statement",
+                label=None,
+                children=[
+                    Node(
+                        type="assignment_expression",
+                        label=None,
+                        children=[
+                            Node(type="identifier", label=lhs),
+                            Node(type="=", label="="),
+                            Node(
+                                type="binary_expression",
+                                label=None,
+                                children=[
+                                    Node(type="identifier", label=rhs),
+                                    Node(type="+", label="+"),
+                                    Node(type="decimal_integer_literal", label="1"),
+                                ],
+                            ),
+                        ],
+                    ),
+                    Node(type=";", label=";"),
+                ],
+            )
+        )
+
+    return Node(
+        type="program",
+        label=None,
+        children=[Node(type="block", label=None, children=statements)],
+    )
+
+
+def nested_blocks(n_blocks: int, seed: int) -> Node:
+    """
+    A block made of many small blocks of repeated statements. The inner blocks
+    are candidates of each other, but so is the outer block, which is big.
+    """
+    statements = repeated_token_tree(10 * n_blocks, seed).children[0].children
+    blocks = [
+        Node(type="block", label=None, children=statements[i : i + 10])
+        for i in range(0, len(statements), 10)
+    ]
+    return Node(
+        type="program",
+        label=None,
+        children=[Node(type="block", label=None, children=blocks)],
+    )
+
+
+def shuffled_copy(node: Node, fraction: float, seed: int = 0) -> Node:
+    """
+    Deep copies node and then shuffles a fraction of the children of every
+    internal node.
+    """
+    rng = random.Random(seed)
+    result = node.deep_copy()
+
+    for n in list(result.pre_order()):
+        if len(n.children) < 2 or rng.random() >= fraction:
+            continue
+
+        children = list(n.children)
+        rng.shuffle(children)
+        for child in children:
+            n.children_remove(child)
+        for child in children:
+            n.children_append(child)
+
+    return result
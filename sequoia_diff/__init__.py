@@ -2,8 +2,13 @@ from typing import Any, Optional
 
 from sequoia_diff.actions import generate_simplified_chawathe_edit_script
 from sequoia_diff.loaders import LoaderFunc, from_tree_sitter_tree
-from sequoia_diff.matching import generate_mappings
+from sequoia_diff.matching import (
+    DEFAULT_MATCHER_CONFIG,
+    MatcherConfig,
+    generate_mappings,
+)
 from sequoia_diff.models import Action, MappingDict, Node
+from sequoia_diff.string_comparisons import LabelDistanceCache
 
 
 def get_tree_diff(
@@ -11,9 +16,16 @@ def get_tree_diff(
     dst_tree: Any,
     loader: Optional[LoaderFunc] = None,
     loader_args: Optional[list[Any]] = None,
+    collapse_pairs: bool = False,
+    config: MatcherConfig = DEFAULT_MATCHER_CONFIG,
+    label_distances: Optional[LabelDistanceCache] = None,
 ) -> list[Action]:
     """
     Produces the edit script in order to transform src_tree into dst_tree.
+
+    With collapse_pairs, subtrees that are deleted and inserted again elsewhere
+    are turned into Moves. config and label_distances are passed to
+    `generate_mappings`.
     """
 
     if loader is None:
@@ -28,14 +40,18 @@ def get_tree_diff(
     src = src_tree if isinstance(src_tree, Node) else loader(src_tree, *loader_args)
     dst = dst_tree if isinstance(dst_tree, Node) else loader(dst_tree, *loader_args)
 
-    mappings: MappingDict = generate_mappings(src, dst)
+    mappings: MappingDict = generate_mappings(
+        src, dst, config=config, label_distances=label_distances
+    )
     edit_script: list[Action] = generate_simplified_chawathe_edit_script(
-        mappings, src, dst
+        mappings, src, dst, collapse_pairs=collapse_pairs
     )
 
     return edit_script
 
 
 __all__ = [
+    "LabelDistanceCache",
+    "MatcherConfig",
     "get_tree_diff",
 ]
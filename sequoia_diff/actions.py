@@ -1,9 +1,60 @@
-from collections import defaultdict
-from typing import Callable, Optional, TypeVar, cast
+from bisect import bisect_left
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import (
+    Callable,
+    Collection,
+    Mapping,
+    Optional,
+    Protocol,
+    Self,
+    TypeVar,
+    cast,
+)
 
 from sequoia_diff.models import Action, Delete, Insert, MappingDict, Move, Node, Update
 
 T = TypeVar("T")
+U = TypeVar("U")
+
+
+class EditScriptNode(Protocol):
+    """
+    What the edit script reads and changes of a node of src. Satisfied by Node
+    and by the _ShadowNode that `generate_chawathe_edit_script` applies the
+    edit script to.
+    """
+
+    label: Optional[str]
+
+    @property
+    def parent(self) -> Optional[Self]: ...
+
+    @property
+    def children(self) -> list[Self]: ...
+
+    @property
+    def position_in_parent(self) -> int: ...
+
+    def needs_position_recomputation(self, index: int = 0) -> None: ...
+
+    def needs_lightweight_recomputation(self) -> None: ...
+
+
+S = TypeVar("S", bound=EditScriptNode)
+
+
+class EditScriptMappings(Protocol[S]):
+    """
+    Mappings between the nodes of src, of type S, and the nodes of dst.
+    Satisfied by MappingDict, with S being Node.
+    """
+
+    @property
+    def src_to_dst(self) -> Mapping[S, Node]: ...
+
+    @property
+    def dst_to_src(self) -> Mapping[Node, S]: ...
 
 
 def lcs(
@@ -41,7 +92,205 @@ def lcs(
     return result
 
 
-def find_pos(dst_node: Node, dst_in_order: set[Node], mappings: MappingDict) -> int:
+def myers_lcs(
+    x: list[T],
+    y: list[T],
+    equal: Callable[[T, T], bool] = lambda a, b: a == b,
+    max_d: Optional[int] = None,
+) -> list[tuple[T, T]]:
+    """
+    Same as `lcs`, using Myers' O(ND) algorithm, where D is the number of
+    elements of x and y that are not part of the result. Much faster than `lcs`
+    on similar lists, but may return a different common subsequence of the same
+    length. Memory is O(m + n): the middle snake of the edit script is found by
+    searching from both ends at once, and both sides of it are solved the same
+    way.
+
+    If D is more than max_d, it may give up after O((m + n) max_d) time and
+    only return the common prefix and suffix of x and y.
+
+    https://doi.org/10.1007/BF01840446
+    """
+    pairs: list[tuple[int, int]] = []
+    stack = [(0, len(x), 0, len(y))]
+    limit = max_d
+    while len(stack) != 0:
+        x_start, x_end, y_start, y_end = stack.pop()
+
+        while x_start < x_end and y_start < y_end and equal(x[x_start], y[y_start]):
+            pairs.append((x_start, y_start))
+            x_start += 1
+            y_start += 1
+        while x_start < x_end and y_start < y_end and equal(x[x_end - 1], y[y_end - 1]):
+            x_end -= 1
+            y_end -= 1
+            pairs.append((x_end, y_end))
+        if x_start == x_end or y_start == y_end:
+            continue
+
+        # Only the whole lists are limited, the D of the parts is lower
+        middle = _middle_snake(x, y, equal, x_start, x_end, y_start, y_end, limit)
+        limit = None
+        if middle is not None:
+            x_middle, y_middle = middle
+            stack.append((x_middle, x_end, y_middle, y_end))
+            stack.append((x_start, x_middle, y_start, y_middle))
+
+    pairs.sort()
+    return [(x[i], y[j]) for i, j in pairs]
+
+
+def _middle_snake(
+    x: list[T],
+    y: list[T],
+    equal: Callable[[T, T], bool],
+    x_start: int,
+    x_end: int,
+    y_start: int,
+    y_end: int,
+    max_d: Optional[int],
+) -> Optional[tuple[int, int]]:
+    """
+    Runs the search of `myers_lcs` forward from the start and backward from the
+    end of x[x_start:x_end] and y[y_start:y_end], whose first and last elements
+    differ, until the paths meet. Returns where they meet, which splits the
+    lists in two, or None if the lists have nothing in common or if D may be
+    more than max_d.
+    """
+    m, n = x_end - x_start, y_end - y_start
+    max_steps = (m + n + 1) // 2
+    if max_d is not None:
+        max_steps = min(max_steps, (max_d + 1) // 2 + 1)
+
+    # forward[offset + k] is the furthest index in x reached from the start on
+    # diagonal k, i.e. with i - j == k, and backward[offset + k] the furthest
+    # from the end, both relative to x_start and y_start. -1 if not reached.
+    offset = max_steps + 1
+    forward = [-1] * (2 * offset + 1)
+    backward = [-1] * (2 * offset + 1)
+    forward[offset + 1] = 0
+    backward[offset + 1] = 0
+
+    # The paths can only meet after a forward step if the difference of the
+    # lengths is odd, and after a backward step if it is even
+    delta = m - n
+    forward_meets = delta % 2 != 0
+
+    # Diagonals that went past the end of x or y are not extended anymore
+    forward_skip_start = forward_skip_end = backward_skip_start = backward_skip_end = 0
+
+    for d in range(max_steps):
+        for k in range(-d + forward_skip_start, d + 1 - forward_skip_end, 2):
+            if k == -d or (
+                k != d and forward[offset + k - 1] < forward[offset + k + 1]
+            ):
+                i = forward[offset + k + 1]
+            else:
+                i = forward[offset + k - 1] + 1
+            j = i - k
+            while i < m and j < n and equal(x[x_start + i], y[y_start + j]):
+                i += 1
+                j += 1
+            forward[offset + k] = i
+
+            if i > m:
+                forward_skip_end += 2
+            elif j > n:
+                forward_skip_start += 2
+            elif forward_meets:
+                backward_k = offset + delta - k
+                if 0 <= backward_k < len(backward) and backward[backward_k] != -1:
+                    if i >= m - backward[backward_k]:
+                        return x_start + i, y_start + j
+
+        for k in range(-d + backward_skip_start, d + 1 - backward_skip_end, 2):
+            if k == -d or (
+                k != d and backward[offset + k - 1] < backward[offset + k + 1]
+            ):
+                i = backward[offset + k + 1]
+            else:
+                i = backward[offset + k - 1] + 1
+            j = i - k
+            while i < m and j < n and equal(x[x_end - i - 1], y[y_end - j - 1]):
+                i += 1
+                j += 1
+            backward[offset + k] = i
+
+            if i > m:
+                backward_skip_end += 2
+            elif j > n:
+                backward_skip_start += 2
+            elif not forward_meets:
+                forward_k = offset + delta - k
+                if 0 <= forward_k < len(forward) and forward[forward_k] != -1:
+                    forward_i = forward[forward_k]
+                    if forward_i >= m - i:
+                        return x_start + forward_i, y_start + forward_i - (
+                            forward_k - offset
+                        )
+
+    return None
+
+
+def unique_lcs(
+    x: list[T], y: list[U], partner: Callable[[U], Optional[T]]
+) -> list[tuple[T, U]]:
+    """
+    Same as `lcs` with `equal` being `a == partner(b)`, for lists without
+    duplicates where each element of x is the partner of at most one element
+    of y, like the children of two nodes and their mappings. Returns the very
+    same pairs as `lcs`, not only a common subsequence of the same length.
+
+    As in the Hunt-Szymanski algorithm, the elements of y are replaced by the
+    positions of their partners in x, and the longest common subsequence is a
+    longest increasing subsequence of those. O((m + n) log(m + n)) time and
+    O(m + n) memory, instead of O(mn) for both.
+    """
+    positions = {a: i for i, a in enumerate(x)}
+
+    # Common elements as positions in x (xs) and in y (ys), in y order
+    xs: list[int] = []
+    ys: list[int] = []
+    for j, b in enumerate(y):
+        a = partner(b)
+        i = positions.get(a) if a is not None else None
+        if i is not None:
+            xs.append(i)
+            ys.append(j)
+
+    # levels[v - 1] are the common elements from which the longest chain of
+    # common elements, increasing in both x and y, has length v. They are
+    # added in decreasing y order, and thus increasing x order. negated_heads
+    # is the negated greatest x position that starts a chain of each length.
+    levels: list[list[int]] = []
+    negated_heads: list[int] = []
+    for t in range(len(xs) - 1, -1, -1):
+        v = bisect_left(negated_heads, -xs[t])
+        if v == len(levels):
+            levels.append([])
+            negated_heads.append(-xs[t])
+        else:
+            negated_heads[v] = -xs[t]
+        levels[v].append(t)
+
+    # `lcs` skips elements of x for as long as it does not shorten the common
+    # subsequence, so it takes, from each level, the element with the greatest
+    # x position among those after the previous one, i.e. the first in y order
+    result: list[tuple[T, U]] = []
+    j = 0
+    for level in reversed(levels):
+        while ys[level[-1]] < j:
+            level.pop()
+        t = level[-1]
+        result.append((x[xs[t]], y[ys[t]]))
+        j = ys[t] + 1
+
+    return result
+
+
+def find_pos(
+    dst_node: Node, dst_in_order: set[Node], mappings: EditScriptMappings[S]
+) -> int:
     """
     Finds the rightmost sibling of node that is to the left of node and is
     marked in order. Returns the position immediately to the right of it.
@@ -52,21 +301,15 @@ def find_pos(dst_node: Node, dst_in_order: set[Node], mappings: MappingDict) ->
 
     siblings = parent.children
 
-    # If node is the leftmost child of its parent that is marked "in order",
-    # return 0
-    for sibling in siblings:
-        if sibling in dst_in_order:
-            if sibling is dst_node:
-                return 0
-            break
-
     # Find the rightmost sibling of node that is to the left of node and is
-    # marked "in order"
+    # marked "in order". If there is none, node is the leftmost child of its
+    # parent that is marked "in order", so we return 0
     rightmost_in_order_sibling: Optional[Node] = None
-    for i in range(dst_node.position_in_parent):
+    for i in range(dst_node.position_in_parent - 1, -1, -1):
         sibling = siblings[i]
         if sibling in dst_in_order:
             rightmost_in_order_sibling = sibling
+            break
 
     if rightmost_in_order_sibling is None:
         return 0
@@ -94,65 +337,224 @@ def align_children(
     that the children are misaligned, we generate Move operations to align the
     children.
     """
+    return [
+        Move(child, src, position)
+        for child, position in _align_children(
+            src, dst, src_in_order, dst_in_order, mappings
+        )
+    ]
+
+
+def _align_children(
+    src: S,
+    dst: Node,
+    src_in_order: set[S],
+    dst_in_order: set[Node],
+    mappings: EditScriptMappings[S],
+) -> list[tuple[S, int]]:
+    """
+    `align_children` for any kind of src node. Returns the moved children of
+    src and their new positions.
+    """
 
-    actions: list[Move] = []
+    result: list[tuple[S, int]] = []
 
     # Mark all children of src and dst as "out of order"
     for child in src.children:
         if child in src_in_order:
             src_in_order.remove(child)
-    for child in dst.children:
-        if child in dst_in_order:
-            dst_in_order.remove(child)
+    for dst_child in dst.children:
+        if dst_child in dst_in_order:
+            dst_in_order.remove(dst_child)
 
     # Children of src whose partners are children of dst
-    matched_src_children: list[Node] = []
+    matched_src_children: list[S] = []
     for child in src.children:
-        if mappings.src_to_dst.get(child) in dst.children:
+        partner = mappings.src_to_dst.get(child)
+        if partner is not None and partner.parent is dst:
             matched_src_children.append(child)
 
     # Children of dst whose partners are children of src
     matched_dst_children: list[Node] = []
-    for child in dst.children:
-        if mappings.dst_to_src.get(child) in src.children:
-            matched_dst_children.append(child)
+    for dst_child in dst.children:
+        src_partner = mappings.dst_to_src.get(dst_child)
+        if src_partner is not None and src_partner.parent is src:
+            matched_dst_children.append(dst_child)
 
     # Find the longest common subsequence of matched_src_children and
     # matched_dst_children. Basically, the aligned children.
-    lcs_list = lcs(
-        matched_src_children,
-        matched_dst_children,
-        lambda a, b: a == mappings.dst_to_src[b],
+    lcs_list = unique_lcs(
+        matched_src_children, matched_dst_children, mappings.dst_to_src.get
     )
 
+    aligned_src_children: set[S] = set()
     for src_node, dst_node in lcs_list:
+        aligned_src_children.add(src_node)
         src_in_order.add(src_node)
         dst_in_order.add(dst_node)
 
-    # Ensure left-to-right insertions by doing matched_dst first
+    # Ensure left-to-right insertions by doing matched_dst first. Children are
+    # matched one-to-one, so each misaligned child is moved once, right after
+    # the partner of the matched child of dst before it, which is in order by
+    # then (see `find_pos`), or first if there is none.
+    #
+    # Positions are computed without moving anything: the children of src and
+    # the places they are moved to are slots of a linked list. Slots are never
+    # reordered, so the final list gives each slot an index, and a Fenwick
+    # tree over those indices counts the slots in use before a child.
+    slot_children: list[S] = list(src.children)
+    next_slots: list[int] = list(range(1, len(slot_children))) + [-1]
+    first_slot = 0 if len(slot_children) != 0 else -1
+    slots: dict[S, int] = {child: i for i, child in enumerate(slot_children)}
+
+    # Moved child, its partner, its slot before and after the move and the
+    # slot it is moved after, or -1 if it is moved first
+    moves: list[tuple[S, Node, int, int, int]] = []
+    previous = -1
     for dst_child in matched_dst_children:
-        for src_child in matched_src_children:
-            # Only consider mapped, misaligned children
-            if not mappings.has(src_child, dst_child):
-                continue
-            if (src_child, dst_child) in lcs_list:
-                continue
+        src_child = mappings.dst_to_src[dst_child]
+        if src_child not in aligned_src_children:
+            slot = len(slot_children)
+            slot_children.append(src_child)
+            if previous == -1:
+                next_slots.append(first_slot)
+                first_slot = slot
+            else:
+                next_slots.append(next_slots[previous])
+                next_slots[previous] = slot
 
-            # Append and apply move operation
+            moves.append((src_child, dst_child, slots[src_child], slot, previous))
+            slots[src_child] = slot
 
-            if src_child.parent is None:  # NOTE: Shouldn't happen
-                raise ValueError("parent is None")
+        previous = slots[src_child]
 
-            src.children_remove(src_child)
-            position = find_pos(dst_child, dst_in_order, mappings)
+    if len(moves) == 0:
+        return result
 
-            actions.append(Move(src_child, src, position))
-            src.children_insert(position, src_child)
+    order: list[int] = []
+    slot = first_slot
+    while slot != -1:
+        order.append(slot)
+        slot = next_slots[slot]
 
-            src_in_order.add(src_child)
-            dst_in_order.add(dst_child)
+    indices = [0] * len(order)
+    for idx, slot in enumerate(order):
+        indices[slot] = idx
+    n_children = len(src.children)
+    in_use = _FenwickTree([1 if slot < n_children else 0 for slot in order])
 
-    return actions
+    for src_child, dst_child, old_slot, new_slot, previous in moves:
+        in_use.add(indices[old_slot], -1)
+        position = 0 if previous == -1 else in_use.prefix_sum(indices[previous] + 1)
+        in_use.add(indices[new_slot], 1)
+
+        result.append((src_child, position))
+
+        src_in_order.add(src_child)
+        dst_in_order.add(dst_child)
+
+    # Apply the moves at once
+    src.children[:] = [
+        slot_children[slot] for slot in order if slots[slot_children[slot]] == slot
+    ]
+    src.needs_position_recomputation()
+    src.needs_lightweight_recomputation()
+
+    return result
+
+
+class _FenwickTree:
+    """
+    Counts of indices 0 to n - 1, with O(log n) updates and prefix sums.
+
+    https://doi.org/10.1002/spe.4380240306
+    """
+
+    __slots__ = ("tree",)
+
+    def __init__(self, counts: list[int]):
+        # tree[i] is the sum of the counts of the (i & -i) indices up to i - 1
+        tree = [0] + counts
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, index: int, delta: int) -> None:
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, end: int) -> int:
+        """
+        Returns the sum of the counts of indices 0 to end - 1.
+        """
+        result = 0
+        i = end
+        while i > 0:
+            result += self.tree[i]
+            i -= i & -i
+        return result
+
+
+class _ShadowNode:
+    """
+    Stand-in for a node of src while the edit script is applied to it, so that
+    src is neither modified nor copied. Only has what `EditScriptNode` needs.
+    """
+
+    __slots__ = ("orig", "label", "parent", "children", "_position_in_parent")
+
+    def __init__(self, orig: Node, label: Optional[str]):
+        self.orig = orig  # The src node, or the dst node if inserted
+        self.label = label
+        self.parent: Optional[_ShadowNode] = None
+        self.children: list[_ShadowNode] = []
+        self._position_in_parent = -1
+
+    @property
+    def position_in_parent(self) -> int:
+        if self.parent is None:
+            return -1
+
+        # Cached, but siblings may have been inserted or removed since
+        siblings = self.parent.children
+        position = self._position_in_parent
+        if not (0 <= position < len(siblings) and siblings[position] is self):
+            position = self._position_in_parent = siblings.index(self)
+        return position
+
+    def children_insert(self, index: int, child: "_ShadowNode") -> None:
+        self.children.insert(index, child)
+        child.parent = self
+        child._position_in_parent = index
+
+    def children_remove(self, child: "_ShadowNode") -> None:
+        self.children.pop(child.position_in_parent)
+        child.parent = None
+
+    def needs_position_recomputation(self, index: int = 0) -> None:
+        for idx in range(index, len(self.children)):
+            self.children[idx]._position_in_parent = idx
+
+    def needs_lightweight_recomputation(self) -> None:
+        pass  # Shadows have no statistics
+
+
+@dataclass(slots=True)
+class _ShadowMappings:
+    """
+    Mappings between the _ShadowNodes of src and the nodes of dst.
+    """
+
+    src_to_dst: dict[_ShadowNode, Node] = field(default_factory=dict)
+    dst_to_src: dict[Node, _ShadowNode] = field(default_factory=dict)
+
+    def put(self, src: _ShadowNode, dst: Node) -> None:
+        self.src_to_dst[src] = dst
+        self.dst_to_src[dst] = src
 
 
 def generate_chawathe_edit_script(
@@ -164,31 +566,30 @@ def generate_chawathe_edit_script(
     https://doi.org/10.1145/235968.233366
     """
 
-    # Create a copy of src to work with. We could technically create a copy of
-    # dst, but we never modify it (aside from setting a fake parent), so it's
-    # not necessary.
-    cpy_src = src.deep_copy()
-    cpy_mappings = MappingDict()
+    # The edit script is applied to a shadow of src, made of _ShadowNodes,
+    # instead of a deep copy. We never modify dst (aside from setting a fake
+    # parent).
+    cpy_mappings = _ShadowMappings()
 
     def fake_node() -> Node:
         return Node(type="fake-type", label="fake-label")
 
-    # TODO: See if we can use a MappingDict instead
-    src_to_cpy: defaultdict[Node, Node] = defaultdict(fake_node)
-    cpy_to_src: defaultdict[Node, Node] = defaultdict(fake_node)
+    # Create "fake roots" (sentinel nodes) to make things easier
+    new_cpy_src_parent = _ShadowNode(fake_node(), "fake-label")
 
-    for src_node, cpy_node in zip(src.pre_order(), cpy_src.pre_order()):
-        src_to_cpy[src_node] = cpy_node
-        cpy_to_src[cpy_node] = src_node
+    stack: list[tuple[Node, _ShadowNode]] = [(src, new_cpy_src_parent)]
+    while len(stack) != 0:
+        src_node, parent_shadow = stack.pop()
+        shadow = _ShadowNode(src_node, src_node.label)
+        parent_shadow.children_insert(len(parent_shadow.children), shadow)
 
-    for src_node, dst_node in mappings.items():
-        cpy_mappings.put(src_to_cpy[src_node], dst_node)
+        dst_node = mappings.src_to_dst.get(src_node)
+        if dst_node is not None:
+            cpy_mappings.put(shadow, dst_node)
 
-    # Create "fake roots" (sentinel nodes) to make things easier
-    dst_orig_parent = dst.parent  # Defer dst.parent = dst_orig_parent
+        stack.extend((child, shadow) for child in reversed(src_node.children))
 
-    new_cpy_src_parent = fake_node()
-    cpy_src.set_parent(new_cpy_src_parent)
+    dst_orig_parent = dst.parent  # Defer dst.parent = dst_orig_parent
 
     new_dst_parent = fake_node()
     dst.set_parent(new_dst_parent)
@@ -197,37 +598,31 @@ def generate_chawathe_edit_script(
 
     actions: list[Action] = []
     dst_in_order: set[Node] = set()
-    src_in_order: set[Node] = set()
+    src_in_order: set[_ShadowNode] = set()
 
     # Visit the nodes of dst in breadth-first order
     for current_node in dst.bfs():
         # Parent should always have a partner because of bfs traversal
-        partner_of_parent: Node = cpy_mappings.dst_to_src[
-            cast(Node, current_node.parent)
-        ]
-        partner_node: Node
+        assert current_node.parent is not None
+        partner_of_parent = cpy_mappings.dst_to_src[current_node.parent]
+        partner_node: _ShadowNode
 
         # If current node has no partner
         if current_node not in cpy_mappings.dst_to_src:
-            partner_node = fake_node()
+            partner_node = _ShadowNode(current_node, current_node.label)
             position = find_pos(current_node, dst_in_order, cpy_mappings)
 
             actions.append(
                 Insert(
                     current_node,
-                    cpy_to_src[partner_of_parent],
+                    partner_of_parent.orig,
                     position,
                     whole_subtree=len(current_node.children) == 0,
                 )
             )
 
-            cpy_to_src[partner_node] = current_node
             cpy_mappings.put(partner_node, current_node)
-
-            # Funky parent stuff to keep cpy_to_src working, as using
-            # children_insert will update the subtree_hash
-            partner_of_parent.children.insert(position, partner_node)
-            partner_node.parent = partner_of_parent
+            partner_of_parent.children_insert(position, partner_node)
 
         # else if current_node is not the root
         elif current_node is not dst:
@@ -240,68 +635,244 @@ def generate_chawathe_edit_script(
             if partner_node.label != current_node.label:
                 # Append and apply update operation
                 actions.append(
-                    Update(
-                        cpy_to_src[partner_node],
-                        cpy_to_src[partner_node].label,
-                        current_node.label,
-                    )
+                    Update(partner_node.orig, partner_node.label, current_node.label)
                 )
                 partner_node.label = current_node.label
 
-            # if not cpy_mappings.has(y, v):
-            if (
-                partner_of_parent.subtree_hash_value
-                != parent_of_partner.subtree_hash_value
-            ):
+            if parent_of_partner is not partner_of_parent:
                 # Append and apply move operation
                 position = find_pos(current_node, dst_in_order, cpy_mappings)
                 actions.append(
-                    Move(
-                        cpy_to_src[partner_node],
-                        cpy_to_src[partner_of_parent],
-                        position,
-                    )
+                    Move(partner_node.orig, partner_of_parent.orig, position)
                 )
 
-                old_position = partner_node.position_in_parent
-                partner_node.parent.children.pop(old_position)
-                partner_of_parent.children.insert(position, partner_node)
+                parent_of_partner.children_remove(partner_node)
+                partner_of_parent.children_insert(position, partner_node)
         else:
             partner_node = cpy_mappings.dst_to_src[current_node]
 
         src_in_order.add(partner_node)
         dst_in_order.add(current_node)
 
-        for move in align_children(
-            partner_node,
-            current_node,
-            src_in_order,
-            dst_in_order,
-            cpy_mappings,
+        for child, position in _align_children(
+            partner_node, current_node, src_in_order, dst_in_order, cpy_mappings
         ):
-            actions.append(
-                Move(cpy_to_src[move.node], cpy_to_src[move.parent], move.pos)
-            )
+            actions.append(Move(child.orig, partner_node.orig, position))
 
-    for node in cpy_src.post_order():
-        if node.type == "fake-type":
-            continue
-        if node not in cpy_mappings.src_to_dst:
-            actions.append(Delete(cpy_to_src[node]))
+    # Delete the unmapped nodes in post-order, skipping the fake root
+    post_order: list[_ShadowNode] = []
+    shadows = list(new_cpy_src_parent.children)
+    while len(shadows) != 0:
+        shadow = shadows.pop()
+        post_order.append(shadow)
+        shadows.extend(shadow.children)
+
+    for shadow in reversed(post_order):
+        if shadow not in cpy_mappings.src_to_dst:
+            actions.append(Delete(shadow.orig))
 
     dst.set_parent(dst_orig_parent)  # Restore dst.parent
 
     return actions
 
 
+def _complete_subtrees(nodes: Collection[Node]) -> set[Node]:
+    """
+    Returns the nodes of `nodes` whose descendants are all in `nodes`, leaves
+    included. Each node counts its children that are not known to be complete
+    yet, and leaves propagate completeness upwards, so it is linear in the
+    number of nodes and their children.
+    """
+    pending: dict[Node, int] = {}
+    complete: list[Node] = []
+    for n in nodes:
+        pending[n] = len(n.children)
+        if len(n.children) == 0:
+            complete.append(n)
+
+    result: set[Node] = set()
+    while len(complete) != 0:
+        n = complete.pop()
+        result.add(n)
+
+        parent = n.parent
+        if parent is not None and parent in pending:
+            pending[parent] -= 1
+            if pending[parent] == 0:
+                complete.append(parent)
+
+    return result
+
+
+def _label_updates(src: Node, dst: Node) -> Optional[list[Update]]:
+    """
+    Returns the updates that turn the labels of the subtree of src into those
+    of the subtree of dst, or None if the subtrees do not have the same shape
+    and types.
+    """
+    updates: list[Update] = []
+    stack: list[tuple[Node, Node]] = [(src, dst)]
+    while len(stack) != 0:
+        a, b = stack.pop()
+        if a.type != b.type or len(a.children) != len(b.children):
+            return None
+        if a.label != b.label:
+            updates.append(Update(a, a.label, b.label))
+
+        stack.extend(zip(reversed(a.children), reversed(b.children), strict=True))
+
+    return updates
+
+
+# A deleted and an inserted subtree that only differ by their labels are
+# collapsed if at most this fraction of their nodes needs an Update
+MAX_UPDATED_FRACTION = 0.5
+
+
+def _collapse_insert_delete_pairs(
+    actions: list[Action], src: Node, complete_deleted: set[Node]
+) -> list[Action]:
+    """
+    Turns the Insert of a whole subtree and the Delete of a whole subtree with
+    the same content into a Move, followed by Updates if only their labels
+    differ. This happens when the matcher misses a subtree that was moved.
+
+    Deleted subtrees are put in buckets by subtree hash, and the inserted
+    subtrees are only compared to the first subtree of their bucket, so it is
+    linear in the size of the script and of the subtrees, not pairwise.
+
+    The moved subtree leaves its parent earlier than it would have been
+    deleted, so the script is replayed on lists of children to shift the
+    positions of the actions that follow.
+    """
+    by_hash: dict[int, deque[Node]] = {}
+    by_type_hash: dict[int, deque[Node]] = {}
+    for action in actions:
+        if (
+            isinstance(action, Delete)
+            and action.node in complete_deleted
+            and action.node is not src
+        ):
+            n = action.node
+            by_hash.setdefault(n.subtree_hash_value, deque()).append(n)
+            by_type_hash.setdefault(n.subtree_type_hash_value, deque()).append(n)
+
+    inserts = [a for a in actions if isinstance(a, Insert) and a.whole_subtree]
+    pairs: dict[Node, tuple[Node, list[Update]]] = {}
+    moved: set[Node] = set()
+
+    # Identical subtrees first, then subtrees that only differ by labels
+    for exact in [True, False]:
+        buckets = by_hash if exact else by_type_hash
+        for insert in inserts:
+            if insert.node in pairs:
+                continue
+            key = (
+                insert.node.subtree_hash_value
+                if exact
+                else insert.node.subtree_type_hash_value
+            )
+            bucket = buckets.get(key)
+            while bucket and bucket[0] in moved:
+                bucket.popleft()
+            if not bucket:
+                continue
+
+            deleted = bucket[0]
+            updates = _label_updates(deleted, insert.node)
+            max_updates = 0 if exact else MAX_UPDATED_FRACTION * deleted.size
+            if updates is None or len(updates) > max_updates:
+                continue
+
+            bucket.popleft()
+            pairs[insert.node] = (deleted, updates)
+            moved.add(deleted)
+
+    if len(pairs) == 0:
+        return actions
+
+    # Children and parents of the nodes while the original script is replayed.
+    # Moved subtrees are gone from the new script, but stay in their parent
+    # until their original Delete.
+    children: dict[Node, list[Node]] = {}
+    parents: dict[Node, Optional[Node]] = {src: None}
+    gone: set[Node] = set()
+    n_gone_children: dict[Node, int] = defaultdict(int)
+
+    def children_of(node: Node) -> list[Node]:
+        result = children.get(node)
+        if result is None:
+            # Inserted nodes are added before being used, so node is in src
+            result = children[node] = list(node.children)
+        return result
+
+    def shifted(parent: Node, pos: int) -> int:
+        # Position in the children of parent once the moved subtrees are gone
+        if n_gone_children[parent] == 0:
+            return pos
+        return pos - sum(1 for n in children_of(parent)[:pos] if n in gone)
+
+    result: list[Action] = []
+    for action in actions:
+        if isinstance(action, Insert):
+            pos = action.pos
+            pair = pairs.get(action.node)
+            if pair is not None:
+                deleted, updates = pair
+                gone.add(deleted)
+                n_gone_children[cast(Node, deleted.parent)] += 1
+                result.append(Move(deleted, action.parent, shifted(action.parent, pos)))
+                result.extend(updates)
+            else:
+                action.pos = shifted(action.parent, pos)
+                result.append(action)
+
+            children_of(action.parent).insert(pos, action.node)
+            children[action.node] = []
+            parents[action.node] = action.parent
+
+        elif isinstance(action, Move):
+            parent = parents.get(action.node, action.node.parent)
+            if parent is not None:
+                children_of(parent).remove(action.node)
+
+            pos = action.pos
+            action.pos = shifted(action.parent, pos)
+            result.append(action)
+
+            children_of(action.parent).insert(pos, action.node)
+            parents[action.node] = action.parent
+
+        elif isinstance(action, Delete):
+            parent = parents.get(action.node, action.node.parent)
+            if parent is not None:
+                children_of(parent).remove(action.node)
+
+            if action.node in gone:
+                n_gone_children[cast(Node, parent)] -= 1
+            else:
+                result.append(action)
+
+        else:
+            result.append(action)
+
+    return result
+
+
 def generate_simplified_chawathe_edit_script(
-    mappings: MappingDict, src: Node, dst: Node
+    mappings: MappingDict, src: Node, dst: Node, collapse_pairs: bool = False
 ) -> list[Action]:
-    actions = generate_chawathe_edit_script(mappings, src, dst)
     """
     The regular Chawathe algorithm generates a lot of redundant actions. This
-    function simplifies the edit script by collapsing actions. 
+    function simplifies the edit script by collapsing actions: when a node and
+    all its descendants are inserted (or deleted), only the action of the node
+    is kept.
+
+    With collapse_pairs, deleted and inserted subtrees with the same content
+    are also turned into Moves, see `_collapse_insert_delete_pairs`.
     """
+    actions = generate_chawathe_edit_script(mappings, src, dst)
+
     added_nodes: dict[Node, Insert] = {}
     deleted_nodes: dict[Node, Delete] = {}
 
@@ -311,22 +882,30 @@ def generate_simplified_chawathe_edit_script(
         elif isinstance(action, Delete):
             deleted_nodes[action.node] = action
 
-    # Determine if the whole subtree should be inserted or removed.
-    # NOTE: There might be a faster way of doing this
-    for n in added_nodes:
-        if n.parent in added_nodes and all(
-            d in added_nodes for d in n.parent.pre_order(skip_self=True)
-        ):
-            actions.remove(added_nodes[n])
-            added_nodes[n.parent].whole_subtree = True
+    # Determine if the whole subtree should be inserted or removed. The
+    # actions of the children of complete subtrees are dropped in one pass.
+    complete_added = _complete_subtrees(added_nodes)
+    complete_deleted = _complete_subtrees(deleted_nodes)
 
+    for n in complete_added:
+        if len(n.children) != 0:
+            added_nodes[n].whole_subtree = True
+
+    redundant: set[Node] = set()
+    for n in added_nodes:
+        if n.parent in complete_added:
+            redundant.add(n)
     for n in deleted_nodes:
-        if n.parent in deleted_nodes and all(
-            d in deleted_nodes for d in n.parent.pre_order(skip_self=True)
-        ):
-            actions.remove(deleted_nodes[n])
+        if n.parent in complete_deleted:
+            redundant.add(n)
+
+    actions = [
+        action
+        for action in actions
+        if not (isinstance(action, (Insert, Delete)) and action.node in redundant)
+    ]
 
-    # TODO: Figure out if there is an intelligent way of removing insert-delete
-    # pairs. Either by combining them here or modifying the Chawathe algorithm.
+    if collapse_pairs:
+        actions = _collapse_insert_delete_pairs(actions, src, complete_deleted)
 
     return actions
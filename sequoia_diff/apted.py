@@ -0,0 +1,720 @@
+"""
+APTED algorithm for tree edit distance [1, 2].
+
+Like RTED, it decomposes the trees along root-leaf paths, but for every pair of
+subtrees it picks the path (left, right or heavy, in either tree) that
+minimizes the number of subproblems. This keeps it fast on the skewed trees
+Zhang-Shasha (`match_rted`) is bad at, such as long `else if` cascades or
+chains of method calls.
+
+[1]: https://doi.org/10.1145/2699485
+[2]: https://doi.org/10.1016/j.is.2015.08.004
+"""
+
+import sys
+from abc import ABC, abstractmethod
+from typing import Callable, NamedTuple
+
+from sequoia_diff.models import MappingDict, Node
+from sequoia_diff.string_comparisons import LabelDistanceCache
+
+# Types of root-leaf paths. A strategy picks one of them in the src tree
+# (LEFT, RIGHT, HEAVY) or in the dst tree (LEFT + 3, RIGHT + 3, HEAVY + 3).
+LEFT = 0
+RIGHT = 1
+HEAVY = 2
+
+
+class CostModel(ABC):
+    """
+    Costs of the edit operations of the tree edit distance.
+
+    Mappings only involve nodes with identical types, so `update` should return
+    `sys.float_info.max` for nodes of different types.
+    """
+
+    @abstractmethod
+    def delete(self, node: Node) -> float: ...
+
+    @abstractmethod
+    def insert(self, node: Node) -> float: ...
+
+    @abstractmethod
+    def update(self, a: Node, b: Node) -> float: ...
+
+
+class TriGramCostModel(CostModel):
+    """
+    The costs used by `match_rted`. Deleting or inserting a node costs 1 and
+    updating a node costs the normalized tri-gram distance between the labels,
+    looked up in label_distances, a new cache if None.
+    """
+
+    def __init__(self, label_distances: LabelDistanceCache | None = None) -> None:
+        if label_distances is None:
+            label_distances = LabelDistanceCache()
+        self.label_distances = label_distances
+
+    def delete(self, node: Node) -> float:
+        return 1.0
+
+    def insert(self, node: Node) -> float:
+        return 1.0
+
+    def update(self, a: Node, b: Node) -> float:
+        if a.type != b.type:
+            return sys.float_info.max
+
+        return self.label_distances.normalized_tri_gram_distance(a.label, b.label)
+
+
+class PostOrderView:
+    """
+    Post-order numbering of an `APTEDTree`, for the Zhang-Shasha style
+    single-path functions. With rtl=True, children are visited right to left,
+    so "leftmost" means rightmost.
+    """
+
+    def __init__(self, tree: "APTEDTree", rtl: bool):
+        ids = {n: i for i, n in enumerate(tree.nodes)}
+
+        # Node id of each post-order index and post-order index of each node id
+        self.ids = [ids[n] for n in tree.nodes[0].post_order(rtl=rtl)]
+        self.post = [0] * len(self.ids)
+
+        # Post-order index of the leftmost leaf descendant. In post-order, the
+        # subtree of a node is contiguous and ends at the node.
+        self.lld = [0] * len(self.ids)
+
+        # If the subtree is a key root, i.e. not on the leftmost path of its
+        # parent
+        self.is_key_root = [True] * len(self.ids)
+
+        first_child = tree.path_child[RIGHT if rtl else LEFT]
+        for k, i in enumerate(self.ids):
+            self.post[i] = k
+            self.lld[k] = k - tree.size[i] + 1
+
+            parent = tree.parent[i]
+            if parent != -1 and first_child[parent] == i:
+                self.is_key_root[k] = False
+
+    def key_roots(self, k: int) -> list[int]:
+        """
+        Key roots of the subtree at post-order index k, in post-order.
+        """
+        result = [x for x in range(self.lld[k], k) if self.is_key_root[x]]
+        result.append(k)
+        return result
+
+
+class APTEDTree:
+    """
+    Data structure for use in the APTED algorithm. Nodes are identified by
+    their left-to-right pre-order index, so the subtree of node i is made of
+    the nodes i to i + size[i] - 1.
+    """
+
+    def __init__(self, node: Node):
+        self.nodes = list(node.pre_order())
+        ids = {n: i for i, n in enumerate(self.nodes)}
+
+        self.children = [[ids[c] for c in n.children] for n in self.nodes]
+        self.parent = [-1] * len(self.nodes)
+        self.size = [1] * len(self.nodes)
+
+        # Right-to-left pre-order index of each node and the other way around
+        self.rtl_ids = [ids[n] for n in node.pre_order(rtl=True)]
+        self.pre_rtl = [0] * len(self.nodes)
+        for k, i in enumerate(self.rtl_ids):
+            self.pre_rtl[i] = k
+
+        # Children on the left, right and heavy paths, -1 for leaves
+        self.path_child: list[list[int]] = [[-1] * len(self.nodes) for _ in range(3)]
+
+        # Sums of the sizes of the key roots of the left and right
+        # decompositions, i.e. the cost of the single-path functions of the
+        # other tree along left and right paths
+        self.key_root_sum: list[list[int]] = [[1] * len(self.nodes) for _ in range(2)]
+
+        # Children come after their parent in pre-order
+        for i in reversed(range(len(self.nodes))):
+            children = self.children[i]
+            if len(children) == 0:
+                continue
+
+            for c in children:
+                self.parent[c] = i
+                self.size[i] += self.size[c]
+
+            self.path_child[LEFT][i] = children[0]
+            self.path_child[RIGHT][i] = children[-1]
+            self.path_child[HEAVY][i] = max(children, key=lambda c: self.size[c])
+
+            for path_type in [LEFT, RIGHT]:
+                first_child = self.path_child[path_type][i]
+                self.key_root_sum[path_type][i] = (
+                    self.size[i]
+                    + sum(self.key_root_sum[path_type][c] for c in children)
+                    - self.size[first_child]
+                )
+
+        self.left = PostOrderView(self, rtl=False)
+        self.right = PostOrderView(self, rtl=True)
+
+    def hanging(self, i: int, path_type: int) -> list[int]:
+        """
+        Roots of the subtrees that hang off the path of the given type going
+        down from node i.
+        """
+        result: list[int] = []
+        path_child = self.path_child[path_type]
+        while path_child[i] != -1:
+            result.extend(c for c in self.children[i] if c != path_child[i])
+            i = path_child[i]
+
+        return result
+
+
+class Orientation(NamedTuple):
+    """
+    The single-path functions decompose a tree F along a path and compute its
+    distances to a tree G. F is either the src tree or, transposing the
+    problem, the dst tree.
+    """
+
+    delta: list[list[float]]
+    delta_transposed: list[list[float]]
+    delete_costs: list[float]
+    insert_costs: list[float]
+    update_cost: Callable[[int, int], float]
+
+
+class APTED:
+    """
+    Computes the tree edit distance between src and dst, and the mappings of
+    an optimal edit script.
+    """
+
+    def __init__(self, src: Node, dst: Node, cost_model: CostModel | None = None):
+        if cost_model is None:
+            cost_model = TriGramCostModel()
+
+        self.cost_model = cost_model
+        self.src = APTEDTree(src)
+        self.dst = APTEDTree(dst)
+
+        n, m = len(self.src.nodes), len(self.dst.nodes)
+
+        # delta[i][j] is the distance between the subtrees of src node i and
+        # dst node j. The transposed copy is for the transposed problems.
+        self.delta = [[0.0] * m for _ in range(n)]
+        self.delta_transposed = [[0.0] * n for _ in range(m)]
+
+        self.delete_costs = [cost_model.delete(x) for x in self.src.nodes]
+        self.insert_costs = [cost_model.insert(x) for x in self.dst.nodes]
+        self.update_costs: dict[tuple[int, int], float] = {}
+
+        # strategy[i][j] is the path that decomposes the subtree pair (i, j)
+        self.strategy: list[list[int]] = []
+        self.distance: float | None = None
+
+    def get_update_cost(self, i: int, j: int) -> float:
+        key = (i, j)
+        if key not in self.update_costs:
+            self.update_costs[key] = self.cost_model.update(
+                self.src.nodes[i], self.dst.nodes[j]
+            )
+
+        return self.update_costs[key]
+
+    def orientation(self, transposed: bool) -> Orientation:
+        if transposed:
+            return Orientation(
+                self.delta_transposed,
+                self.delta,
+                self.insert_costs,
+                self.delete_costs,
+                lambda j, i: self.get_update_cost(i, j),
+            )
+
+        return Orientation(
+            self.delta,
+            self.delta_transposed,
+            self.delete_costs,
+            self.insert_costs,
+            self.get_update_cost,
+        )
+
+    def compute_strategy(self) -> None:
+        """
+        Picks the path of every subtree pair that minimizes the number of
+        subproblems, i.e. the cost of its single-path function plus the costs of
+        the subtree pairs hanging off the path.
+        """
+        src, dst = self.src, self.dst
+        m = len(dst.nodes)
+
+        self.strategy = [[0] * m for _ in range(len(src.nodes))]
+
+        # For every src node, the sum of the costs of its children, and for
+        # each path type, the costs of the subtrees hanging off the path of its
+        # path child minus the cost of the path child. Filled by the children.
+        src_sums: dict[int, list[list[int]]] = {}
+
+        dst_size = dst.size
+        dst_parent = dst.parent
+        dst_left, dst_right, dst_heavy = dst.path_child
+        dst_kr_left, dst_kr_right = dst.key_root_sum
+
+        for v in src.left.ids:
+            size_v = src.size[v]
+            full_v = (size_v + 1) ** 2
+            kr_left_v = src.key_root_sum[LEFT][v]
+            kr_right_v = src.key_root_sum[RIGHT][v]
+
+            sums_v = src_sums.pop(v, None)
+            cost_v = [0] * m
+            hang_v = [[0] * m for _ in range(3)]
+
+            # Same as src_sums, for the dst nodes paired with v
+            dst_sums = [[0] * m for _ in range(4)]
+            sum_w, diff_left, diff_right, diff_heavy = dst_sums
+
+            strategy_v = self.strategy[v]
+            for w in dst.left.ids:
+                size_w = dst_size[w]
+
+                if sums_v is None:
+                    src_hang_left = src_hang_right = src_hang_heavy = 0
+                else:
+                    total = sums_v[0][w]
+                    src_hang_left = total + sums_v[1 + LEFT][w]
+                    src_hang_right = total + sums_v[1 + RIGHT][w]
+                    src_hang_heavy = total + sums_v[1 + HEAVY][w]
+                    hang_v[LEFT][w] = src_hang_left
+                    hang_v[RIGHT][w] = src_hang_right
+                    hang_v[HEAVY][w] = src_hang_heavy
+
+                if dst_left[w] == -1:
+                    dst_hang_left = dst_hang_right = dst_hang_heavy = 0
+                else:
+                    total = sum_w[w]
+                    dst_hang_left = total + diff_left[w]
+                    dst_hang_right = total + diff_right[w]
+                    dst_hang_heavy = total + diff_heavy[w]
+
+                costs = (
+                    size_v * dst_kr_left[w] + src_hang_left,
+                    size_v * dst_kr_right[w] + src_hang_right,
+                    size_v * (size_w + 1) ** 2 + src_hang_heavy,
+                    size_w * kr_left_v + dst_hang_left,
+                    size_w * kr_right_v + dst_hang_right,
+                    size_w * full_v + dst_hang_heavy,
+                )
+                cost = min(costs)
+                strategy_v[w] = costs.index(cost)
+                cost_v[w] = cost
+
+                parent = dst_parent[w]
+                if parent == -1:
+                    continue
+
+                sum_w[parent] += cost
+                if dst_left[parent] == w:
+                    diff_left[parent] = dst_hang_left - cost
+                if dst_right[parent] == w:
+                    diff_right[parent] = dst_hang_right - cost
+                if dst_heavy[parent] == w:
+                    diff_heavy[parent] = dst_hang_heavy - cost
+
+            parent = src.parent[v]
+            if parent == -1:
+                continue
+
+            if parent not in src_sums:
+                src_sums[parent] = [[0] * m for _ in range(4)]
+
+            sums_parent = src_sums[parent]
+            total_parent = sums_parent[0]
+            for w in range(m):
+                total_parent[w] += cost_v[w]
+
+            for path_type in [LEFT, RIGHT, HEAVY]:
+                if src.path_child[path_type][parent] == v:
+                    sums_parent[1 + path_type] = [
+                        hang - cost
+                        for hang, cost in zip(hang_v[path_type], cost_v, strict=True)
+                    ]
+
+    def compute_distance(self) -> float:
+        """
+        GTED algorithm. Computes the distances between all the subtree pairs,
+        decomposing them according to the strategy.
+        """
+        if len(self.strategy) == 0:
+            self.compute_strategy()
+
+        stack = [(0, 0, False)]
+        while len(stack) > 0:
+            v, w, ready = stack.pop()
+            path_type, transposed = self.strategy[v][w] % 3, self.strategy[v][w] >= 3
+
+            if not ready:
+                # Distances of the subtrees hanging off the path first
+                stack.append((v, w, True))
+                if transposed:
+                    stack.extend((v, u, False) for u in self.dst.hanging(w, path_type))
+                else:
+                    stack.extend((u, w, False) for u in self.src.hanging(v, path_type))
+                continue
+
+            if transposed:
+                self.single_path_function(
+                    self.dst, self.src, w, v, path_type, self.orientation(True)
+                )
+            else:
+                self.single_path_function(
+                    self.src, self.dst, v, w, path_type, self.orientation(False)
+                )
+
+        self.distance = self.delta[0][0]
+        return self.distance
+
+    def single_path_function(
+        self,
+        f_tree: APTEDTree,
+        g_tree: APTEDTree,
+        v: int,
+        w: int,
+        path_type: int,
+        orientation: Orientation,
+    ) -> None:
+        """
+        Computes the distances between the subtrees on the path of the given
+        type going down from f_tree node v and all the subtrees of g_tree node
+        w. The distances of the subtrees hanging off the path must be known.
+        """
+        if path_type == HEAVY:
+            self.spf_heavy(f_tree, g_tree, v, w, orientation)
+            return
+
+        f_view = f_tree.left if path_type == LEFT else f_tree.right
+        g_view = g_tree.left if path_type == LEFT else g_tree.right
+        i = f_view.post[v]
+        for k in g_view.key_roots(g_view.post[w]):
+            self.forest_dist(f_view, g_view, i, k, orientation)
+
+    def forest_dist(
+        self,
+        f_view: PostOrderView,
+        g_view: PostOrderView,
+        i: int,
+        j: int,
+        orientation: Orientation,
+    ) -> list[list[float]]:
+        """
+        Zhang-Shasha forest distances between the post-order prefixes of the
+        subtrees at post-order indices i and j. Row r and column c are the
+        forests made of the first r and c nodes of the subtrees. Stores the
+        distances between the subtrees on the leftmost paths of i and j.
+        """
+        delta, delta_transposed, delete_costs, insert_costs, update_cost = orientation
+        f_ids, f_lld = f_view.ids, f_view.lld
+        g_lld = g_view.lld
+
+        li, lj = f_lld[i], g_lld[j]
+        g_ids = g_view.ids[lj : j + 1]
+        g_insert = [insert_costs[y] for y in g_ids]
+        g_on_path = [g_lld[dj] == lj for dj in range(lj, j + 1)]
+        g_lld_cols = [g_lld[dj] - lj for dj in range(lj, j + 1)]
+
+        first_row = [0.0] * (len(g_ids) + 1)
+        for c in range(1, len(first_row)):
+            first_row[c] = first_row[c - 1] + g_insert[c - 1]
+
+        forest_dist = [first_row]
+        for di in range(li, i + 1):
+            x = f_ids[di]
+            cost_del = delete_costs[x]
+            delta_x = delta[x]
+            on_path = f_lld[di] == li
+            lld_row = forest_dist[f_lld[di] - li]
+
+            previous = forest_dist[-1]
+            last = previous[0] + cost_del
+            row = [last]
+            if on_path:
+                for c in range(1, len(previous)):
+                    y = g_ids[c - 1]
+                    if g_on_path[c - 1]:
+                        last = min(
+                            previous[c] + cost_del,
+                            last + g_insert[c - 1],
+                            previous[c - 1] + update_cost(x, y),
+                        )
+                        delta_x[y] = last
+                        delta_transposed[y][x] = last
+                    else:
+                        last = min(
+                            previous[c] + cost_del,
+                            last + g_insert[c - 1],
+                            lld_row[g_lld_cols[c - 1]] + delta_x[y],
+                        )
+                    row.append(last)
+            else:
+                for deleted, cost_ins, lld_col, y in zip(
+                    previous[1:], g_insert, g_lld_cols, g_ids, strict=True
+                ):
+                    last = min(
+                        deleted + cost_del,
+                        last + cost_ins,
+                        lld_row[lld_col] + delta_x[y],
+                    )
+                    row.append(last)
+
+            forest_dist.append(row)
+
+        return forest_dist
+
+    def spf_heavy(
+        self,
+        f_tree: APTEDTree,
+        g_tree: APTEDTree,
+        v: int,
+        w: int,
+        orientation: Orientation,
+    ) -> None:
+        """
+        Single-path function along the heavy path of v. Goes up the path from
+        its leaf, adding the subtrees hanging off the path one node at a time,
+        and computes the distances to every forest of the subtree of w that is
+        obtained by removing leftmost and rightmost roots.
+
+        Such a forest G(a, b) is made of the nodes whose left-to-right and
+        right-to-left pre-order indices in the subtree of w are at least a and
+        b. Distances to all of them are stored in flat rows of (n + 1) ** 2
+        values.
+        """
+        delta, delta_transposed, delete_costs, insert_costs, update_cost = orientation
+
+        n = g_tree.size[w]
+        stride = n + 1
+
+        # Local pre-order indices of the subtree of w in both directions
+        rtl_base = g_tree.pre_rtl[w]
+        rtl_of = [g_tree.pre_rtl[w + p] - rtl_base for p in range(n)]
+        ltr_of = [g_tree.rtl_ids[rtl_base + q] - w for q in range(n)]
+        sizes = g_tree.size[w : w + n]
+        insert = insert_costs[w : w + n]
+
+        # Leftmost root (ltr index), rightmost root (rtl index) and insertion
+        # cost of every G(a, b). The roots are n if G(a, b) is empty.
+        leftmost = [n] * (stride * stride)
+        rightmost = [n] * (stride * stride)
+        insert_sum = [0.0] * (stride * stride)
+        for a in reversed(range(n)):
+            for b in reversed(range(n)):
+                idx = a * stride + b
+                if rtl_of[a] >= b:
+                    leftmost[idx] = a
+                    insert_sum[idx] = insert_sum[idx + stride] + insert[a]
+                else:
+                    leftmost[idx] = leftmost[idx + stride]
+                    insert_sum[idx] = insert_sum[idx + stride]
+                rightmost[idx] = b if ltr_of[b] >= a else rightmost[idx + 1]
+
+        def add_left(u: int, base: list[float]) -> list[float]:
+            # The subtree of u is added to the left of the forest. Its nodes
+            # become leftmost roots in reverse left-to-right pre-order.
+            s = f_tree.size[u]
+            t_sizes = f_tree.size[u : u + s]
+            t_delete = delete_costs[u : u + s]
+            t_delta = delta[u : u + s]
+
+            result = [0.0] * (stride * stride)
+            for b in range(stride):
+                # table[t][a] is the distance between the forest without the
+                # first t nodes of the subtree and G(a, b)
+                table = [[0.0] * stride for _ in range(s)]
+                table.append(base[b::stride])
+                for t in reversed(range(s)):
+                    cur, nxt, skip = table[t], table[t + 1], table[t + t_sizes[t]]
+                    cost_del = t_delete[t]
+                    delta_t = t_delta[t]
+
+                    cur[n] = nxt[n] + cost_del
+                    for a in reversed(range(n)):
+                        p = leftmost[a * stride + b]
+                        if p != a:
+                            cur[a] = cur[p]
+                            continue
+
+                        cur[a] = min(
+                            min(nxt[a] + cost_del, cur[a + 1] + insert[a]),
+                            skip[a + sizes[a]] + delta_t[w + a],
+                        )
+
+                result[b::stride] = table[0]
+
+            return result
+
+        def add_right(u: int, base: list[float]) -> list[float]:
+            # Mirror of add_left, with right-to-left pre-order
+            s = f_tree.size[u]
+            t_ids = f_tree.rtl_ids[f_tree.pre_rtl[u] : f_tree.pre_rtl[u] + s]
+            t_sizes = [f_tree.size[x] for x in t_ids]
+            t_delete = [delete_costs[x] for x in t_ids]
+            t_delta = [delta[x] for x in t_ids]
+
+            result = [0.0] * (stride * stride)
+            for a in range(stride):
+                table = [[0.0] * stride for _ in range(s)]
+                table.append(base[a * stride : (a + 1) * stride])
+                for t in reversed(range(s)):
+                    cur, nxt, skip = table[t], table[t + 1], table[t + t_sizes[t]]
+                    cost_del = t_delete[t]
+                    delta_t = t_delta[t]
+
+                    cur[n] = nxt[n] + cost_del
+                    for b in reversed(range(n)):
+                        q = rightmost[a * stride + b]
+                        if q != b:
+                            cur[b] = cur[q]
+                            continue
+
+                        y = ltr_of[b]
+                        cur[b] = min(
+                            min(nxt[b] + cost_del, cur[b + 1] + insert[y]),
+                            skip[b + sizes[y]] + delta_t[w + y],
+                        )
+
+                result[a * stride : (a + 1) * stride] = table[0]
+
+            return result
+
+        def add_root(x: int, children: list[float]) -> list[float]:
+            # x is added on top of the forest of its children. Also stores the
+            # distances between the subtree of x and the subtrees of w.
+            cost_del = delete_costs[x]
+            delta_x = delta[x]
+
+            result = [0.0] * (stride * stride)
+            for b in reversed(range(stride)):
+                result[n * stride + b] = children[n * stride + b] + cost_del
+                for a in reversed(range(n)):
+                    idx = a * stride + b
+                    p = leftmost[idx]
+                    if p != a:
+                        result[idx] = result[p * stride + b]
+                        continue
+
+                    y = w + a
+                    if b == rtl_of[a]:
+                        # G(a, b) is the subtree of y
+                        rest = (a + 1) * stride + b + 1
+                        result[idx] = min(
+                            min(
+                                children[idx] + cost_del,
+                                result[rest] + insert[a],
+                            ),
+                            children[rest] + update_cost(x, y),
+                        )
+                        delta_x[y] = result[idx]
+                        delta_transposed[y][x] = result[idx]
+                    else:
+                        result[idx] = min(
+                            min(
+                                children[idx] + cost_del,
+                                result[idx + stride] + insert[a],
+                            ),
+                            insert_sum[(a + sizes[a]) * stride + b] + delta_x[y],
+                        )
+
+            return result
+
+        path = [v]
+        while f_tree.path_child[HEAVY][path[-1]] != -1:
+            path.append(f_tree.path_child[HEAVY][path[-1]])
+
+        row = add_root(path[-1], insert_sum)
+        for k in reversed(range(len(path) - 1)):
+            siblings = f_tree.children[path[k]]
+            pos = siblings.index(path[k + 1])
+            for u in siblings[pos + 1 :]:
+                row = add_right(u, row)
+            for u in reversed(siblings[:pos]):
+                row = add_left(u, row)
+            row = add_root(path[k], row)
+
+    def compute_mapping(self, mappings: MappingDict) -> MappingDict:
+        """
+        Backtracks through the forest distances of the subtree pairs of an
+        optimal edit script, like `match_rted` does, and puts the pairs of
+        updated nodes in mappings. Subtree pairs decomposed along right paths
+        are backtracked right to left.
+        """
+        if self.distance is None:
+            self.compute_distance()
+
+        orientation = self.orientation(False)
+
+        tree_pairs: list[tuple[int, int]] = [(0, 0)]
+        while len(tree_pairs) > 0:
+            v, w = tree_pairs.pop()
+
+            rtl = self.strategy[v][w] % 3 == RIGHT
+            f_view = self.src.right if rtl else self.src.left
+            g_view = self.dst.right if rtl else self.dst.left
+
+            last_row, last_col = f_view.post[v], g_view.post[w]
+            forest_dist = self.forest_dist(
+                f_view, g_view, last_row, last_col, orientation
+            )
+            first_row = f_view.lld[last_row] - 1
+            first_col = g_view.lld[last_col] - 1
+
+            row, col = last_row, last_col
+            while (row > first_row) and (col > first_col):
+                r, c = row - first_row, col - first_col
+                x, y = f_view.ids[row], g_view.ids[col]
+
+                if forest_dist[r - 1][c] + self.delete_costs[x] == forest_dist[r][c]:
+                    row -= 1
+                elif forest_dist[r][c - 1] + self.insert_costs[y] == forest_dist[r][c]:
+                    col -= 1
+                else:
+                    if (f_view.lld[row] - 1 == first_row) and (
+                        g_view.lld[col] - 1 == first_col
+                    ):
+                        t_src: Node = self.src.nodes[x]
+                        t_dst: Node = self.dst.nodes[y]
+                        if t_src.type == t_dst.type:
+                            mappings.put(t_src, t_dst)
+                        else:
+                            raise Exception("Should not map incompatible nodes.")
+                        row -= 1
+                        col -= 1
+                    else:
+                        tree_pairs.append((x, y))
+
+                        row = f_view.lld[row] - 1
+                        col = g_view.lld[col] - 1
+
+        return mappings
+
+
+def match_apted(
+    mappings: MappingDict,
+    src: Node,
+    dst: Node,
+    cost_model: CostModel | None = None,
+) -> MappingDict:
+    """
+    APTED algorithm for tree edit distance. Like `match_rted`, puts the mappings
+    of an optimal edit script with add, delete and update actions, but is much
+    faster on skewed trees. The costs default to the ones of `match_rted`.
+    """
+    apted = APTED(src, dst, cost_model)
+    apted.compute_distance()
+    return apted.compute_mapping(mappings)
@@ -0,0 +1,121 @@
+import hashlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sequoia_diff.models import Node
+
+MASK_64 = (1 << 64) - 1
+
+# Odd 64-bit multiplier used to combine child hashes (from splitmix64)
+ROLLING_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+class HashStrategy(ABC):
+    """
+    Computes the content hashes of a node. See `Node.hash_value`,
+    `Node.subtree_hash_value` and `Node.subtree_type_hash_value`.
+    """
+
+    # If True, equal hashes are trusted to mean isomorphic subtrees. Otherwise,
+    # matchers double check the subtrees when hashes match.
+    strict: bool = False
+
+    @abstractmethod
+    def compute(self, node: "Node") -> tuple[int, int, int]:
+        """
+        Returns the hash value, subtree hash value and subtree type hash value
+        of node. The subtree hashes of the children of node are available
+        through their properties.
+        """
+        ...
+
+
+def mix_64(x: int) -> int:
+    """
+    Finalizer of splitmix64. Scrambles the bits of a 64-bit integer.
+    """
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return x ^ (x >> 31)
+
+
+@lru_cache(maxsize=1 << 16)
+def symbol_hash(s: str) -> int:
+    """
+    Interns s to a 64-bit integer. Unlike `hash(s)`, the result is stable
+    across processes.
+    """
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest())
+
+
+@lru_cache(maxsize=1 << 16)
+def node_hash(type: str, label: str, is_internal: bool) -> tuple[int, int]:
+    """
+    Returns the hash of a node with the given type, label and leafness, along
+    with the hash of its type and leafness only.
+    """
+    type_hash = mix_64(symbol_hash(type) ^ is_internal)
+    return mix_64(type_hash ^ symbol_hash(label)), type_hash
+
+
+class FastHashStrategy(HashStrategy):
+    """
+    Fast 64-bit non-cryptographic hashes. The type and label are interned to
+    integers and the hashes of the children are combined arithmetically.
+    """
+
+    strict = False
+
+    def compute(self, node: "Node") -> tuple[int, int, int]:
+        hash_value, type_hash = node_hash(
+            node.type, node.label if node.label else "", len(node.children) > 0
+        )
+        if len(node.children) == 0:
+            return hash_value, hash_value, type_hash
+
+        subtree_hash = hash_value
+        subtree_type_hash = type_hash
+        for child in node.children:
+            subtree_hash = (
+                subtree_hash * ROLLING_MULTIPLIER + child.subtree_hash_value
+            ) & MASK_64
+            subtree_type_hash = (
+                subtree_type_hash * ROLLING_MULTIPLIER + child.subtree_type_hash_value
+            ) & MASK_64
+
+        return hash_value, mix_64(subtree_hash), mix_64(subtree_type_hash)
+
+
+class Sha256HashStrategy(HashStrategy):
+    """
+    256-bit SHA-256 hashes. Much slower than `FastHashStrategy`, but collisions
+    can be safely ignored.
+    """
+
+    strict = True
+
+    def compute(self, node: "Node") -> tuple[int, int, int]:
+        type_label_hasher = hashlib.new("sha256")
+        type_hasher = hashlib.new("sha256")
+
+        # 0 if leaf, 1 if not
+        type_label_hasher.update(f"{len(node.children) > 0}".encode("utf-8"))
+        type_label_hasher.update(node.type.encode("utf-8"))
+        type_label_hasher.update(f"{node.label if node.label else ''}".encode("utf-8"))
+
+        type_hasher.update(f"{len(node.children) > 0}".encode("utf-8"))
+        type_hasher.update(node.type.encode("utf-8"))
+
+        hash_value = int(type_label_hasher.hexdigest(), 16)
+
+        for child in node.children:
+            type_label_hasher.update(child.subtree_hash_value.to_bytes(32, "big"))
+            type_hasher.update(child.subtree_type_hash_value.to_bytes(32, "big"))
+
+        return (
+            hash_value,
+            int(type_label_hasher.hexdigest(), 16),
+            int(type_hasher.hexdigest(), 16),
+        )
@@ -1,6 +1,9 @@
 import json
 import os
-from typing import Callable, Optional
+import sys
+import threading
+from array import array
+from typing import Callable, Iterator, Literal, Optional
 
 import tree_sitter as ts
 
@@ -10,50 +13,306 @@ LoaderFunc = Callable[..., Node]
 
 PATH_TS_RULES = os.path.join(os.path.dirname(__file__), "rules.json")
 
+# Longer labels, like string literals and comments, are rarely repeated, so
+# they are not interned
+INTERNED_LABEL_MAX_LENGTH = 32
 
-def from_tree_sitter_node(
-    ts_node: ts.Node, language_or_rules: Optional[LanguageRules | str] = None
-) -> Node:
-    if language_or_rules is None:
-        rules = LanguageRules()
-    elif isinstance(language_or_rules, str):
-        language = language_or_rules
 
-        with open(PATH_TS_RULES, "r") as f:
-            rule_set = LanguageRuleSet.model_validate(json.loads(f.read()))
+class LanguageRuleRegistry:
+    """
+    Process-wide cache of the rules of every language, so that rule files are
+    read and validated once instead of on every load. The rules of
+    PATH_TS_RULES are loaded lazily on the first lookup. Rules registered at
+    runtime take precedence over them.
+    """
+
+    def __init__(self, default_path: Optional[str] = PATH_TS_RULES):
+        self.default_path = default_path
+        self._rules: dict[str, LanguageRules] = {}
+        self._default_loaded = default_path is None
+        self._lock = threading.Lock()
+
+    def _load_default(self) -> None:
+        with self._lock:
+            if self._default_loaded:
+                return
+
+            assert self.default_path is not None
+            for language, rules in self._read(self.default_path).items():
+                self._rules.setdefault(language, rules)
+            self._default_loaded = True
+
+    @staticmethod
+    def _read(path: str) -> dict[str, LanguageRules]:
+        with open(path, "r") as f:
+            return LanguageRuleSet.model_validate(json.loads(f.read())).root
 
-        root_rules = rule_set.root.get(language)
-        if root_rules is None:
+    def register(self, language: str, rules: LanguageRules) -> None:
+        with self._lock:
+            self._rules[language] = rules
+
+    def register_file(self, path: str) -> None:
+        """
+        Registers every language of a rules file in the format of rules.json.
+        """
+        rules = self._read(path)
+        with self._lock:
+            self._rules.update(rules)
+
+    def get(self, language: str) -> LanguageRules:
+        if not self._default_loaded:
+            self._load_default()
+
+        rules = self._rules.get(language)
+        if rules is None:
             raise ValueError(f"Language '{language}' not supported")
-        rules = root_rules
-    else:  # isinstance(language_or_rules, LanguageRules)
-        rules = language_or_rules
-
-    if ((ts_node.child_count == 0) or (ts_node.type in rules.flattened)) and (
-        ts_node.text is not None
-    ):
-        label = ts_node.text.decode("utf-8")
-    else:
-        label = None
-
-    output = Node(
-        orig_node=ts_node,
-        type=rules.aliased.get(ts_node.type, ts_node.type),
-        label=label,
+        return rules
+
+    def __contains__(self, language: str) -> bool:
+        if not self._default_loaded:
+            self._load_default()
+
+        return language in self._rules
+
+
+rule_registry = LanguageRuleRegistry()
+
+# What the loader keeps in `Node.orig_node`: the tree-sitter node itself, which
+# keeps the whole tree-sitter tree alive, a SourceRange or nothing.
+RetentionMode = Literal["node", "range", "none"]
+
+
+class SourceRanges:
+    """
+    Positions of the tree-sitter nodes of one load, in arrays shared by every
+    SourceRange of the load and indexed by pre-order position. A range then
+    costs a small reference and a few 32-bit ints (tree-sitter positions are
+    32-bit), instead of a tuple of Python ints.
+    """
+
+    __slots__ = (
+        "start_bytes",
+        "end_bytes",
+        "start_rows",
+        "start_columns",
+        "end_rows",
+        "end_columns",
+        "types",
     )
 
-    if ts_node.type not in rules.flattened:
-        for ts_child in ts_node.children:
-            if ts_child.type in rules.ignored:
+    def __init__(self) -> None:
+        self.start_bytes = array("I")
+        self.end_bytes = array("I")
+        self.start_rows = array("I")
+        self.start_columns = array("I")
+        self.end_rows = array("I")
+        self.end_columns = array("I")
+        self.types: list[str] = []  # Of the tree-sitter nodes, before aliasing
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def append(self, ts_node: ts.Node, ts_type: str) -> "SourceRange":
+        start_row, start_column = ts_node.start_point
+        end_row, end_column = ts_node.end_point
+        self.start_bytes.append(ts_node.start_byte)
+        self.end_bytes.append(ts_node.end_byte)
+        self.start_rows.append(start_row)
+        self.start_columns.append(start_column)
+        self.end_rows.append(end_row)
+        self.end_columns.append(end_column)
+        self.types.append(ts_type)
+
+        return SourceRange(self, len(self.types) - 1)
+
+
+class SourceRange:
+    """
+    Position of a tree-sitter node in its source. Kept in `Node.orig_node`
+    instead of the node itself with the "range" retention mode. Unlike
+    tree-sitter nodes, it can be pickled; pickling a single range pickles the
+    SourceRanges of its whole load.
+    """
+
+    __slots__ = ("ranges", "index")
+
+    def __init__(self, ranges: SourceRanges, index: int) -> None:
+        self.ranges = ranges
+        self.index = index
+
+    @property
+    def start_byte(self) -> int:
+        return self.ranges.start_bytes[self.index]
+
+    @property
+    def end_byte(self) -> int:
+        return self.ranges.end_bytes[self.index]
+
+    @property
+    def start_point(self) -> tuple[int, int]:
+        return (
+            self.ranges.start_rows[self.index],
+            self.ranges.start_columns[self.index],
+        )
+
+    @property
+    def end_point(self) -> tuple[int, int]:
+        return self.ranges.end_rows[self.index], self.ranges.end_columns[self.index]
+
+    @property
+    def type(self) -> str:
+        return self.ranges.types[self.index]
+
+    def _key(self) -> tuple[int, int, str]:
+        return self.start_byte, self.end_byte, self.type
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SourceRange):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (
+            f"SourceRange(type={self.type!r}, start_byte={self.start_byte},"
+            f" end_byte={self.end_byte})"
+        )
+
+    def rehydrate(self, tree: ts.Tree) -> ts.Node:
+        """
+        Finds the tree-sitter node in the tree it was loaded from. Nodes with
+        the same range, like a `modifiers` node and its only child, are told
+        apart by type.
+        """
+        start_byte, end_byte, ts_type = self._key()
+        ts_node = tree.root_node.descendant_for_byte_range(start_byte, end_byte)
+        while ts_node is not None and (
+            ts_node.type != ts_type
+            or ts_node.start_byte != start_byte
+            or ts_node.end_byte != end_byte
+        ):
+            ts_node = ts_node.parent
+
+        if ts_node is None:
+            raise ValueError(f"{self} is not in the tree")
+        return ts_node
+
+
+def _resolve_rules(language_or_rules: Optional[LanguageRules | str]) -> LanguageRules:
+    if language_or_rules is None:
+        return LanguageRules()
+    elif isinstance(language_or_rules, str):
+        return rule_registry.get(language_or_rules)
+    else:  # isinstance(language_or_rules, LanguageRules)
+        return language_or_rules
+
+
+def _walk_tree_sitter_node(
+    ts_node: ts.Node, rules: LanguageRules
+) -> Iterator[tuple[int, ts.Node, str, Optional[str]]]:
+    """
+    Yields the parent index, tree-sitter node, tree-sitter type and label of
+    every node to load, in pre-order. The parent index is the position of the
+    parent in the output, -1 for ts_node.
+
+    The subtree is walked with a TreeCursor and an explicit stack, so deep
+    trees do not exhaust the stack and no list of children is allocated per
+    node. Labels are sliced from the source of ts_node by byte range.
+
+    Types and short labels are interned, so that every `identifier` or `;`
+    of every tree is the same string. Comparing them short-circuits on
+    identity and their hashes are computed once.
+    """
+    flattened, ignored = rules.flattened, rules.ignored
+
+    # None if the tree does not have its source anymore, e.g. after an edit
+    source = ts_node.text
+    base = ts_node.start_byte
+
+    def get_label(ts_node: ts.Node, ts_type: str) -> Optional[str]:
+        if source is not None and (ts_node.child_count == 0 or ts_type in flattened):
+            label = source[ts_node.start_byte - base : ts_node.end_byte - base]
+            if len(label) <= INTERNED_LABEL_MAX_LENGTH:
+                return sys.intern(label.decode("utf-8"))
+            return label.decode("utf-8")
+        return None
+
+    ts_type = sys.intern(ts_node.type)
+    yield -1, ts_node, ts_type, get_label(ts_node, ts_type)
+    if ts_type in flattened:
+        return
+
+    cursor = ts_node.walk()
+    if not cursor.goto_first_child():
+        return
+
+    # parents[-1] is the output index of the parent of the cursor's node
+    parents = [0]
+    n_yielded = 1
+    while True:
+        ts_child = cursor.node
+        assert ts_child is not None
+        ts_type = sys.intern(ts_child.type)
+
+        if ts_type not in ignored:
+            yield parents[-1], ts_child, ts_type, get_label(ts_child, ts_type)
+            n_yielded += 1
+
+            if ts_type not in flattened and cursor.goto_first_child():
+                parents.append(n_yielded - 1)
                 continue
 
-            output_child = from_tree_sitter_node(ts_child, rules)
-            output.children_append(output_child)
+        while not cursor.goto_next_sibling():
+            cursor.goto_parent()
+            parents.pop()
+            if len(parents) == 0:
+                return
 
-    return output
+
+def from_tree_sitter_node(
+    ts_node: ts.Node,
+    language_or_rules: Optional[LanguageRules | str] = None,
+    retain: RetentionMode = "node",
+) -> Node:
+    """
+    Converts a tree-sitter node and its subtree, without recursion.
+
+    With `retain="range"` or `retain="none"`, the tree-sitter tree can be
+    freed once loaded. See `RetentionMode`.
+    """
+    if retain not in ("node", "range", "none"):
+        raise ValueError(f"Unknown retention mode '{retain}'")
+
+    rules = _resolve_rules(language_or_rules)
+    aliased = rules.aliased
+
+    ranges = SourceRanges()
+    nodes: list[Node] = []
+    for parent, ts_current, ts_type, label in _walk_tree_sitter_node(ts_node, rules):
+        orig_node: Optional[ts.Node | SourceRange]
+        if retain == "node":
+            orig_node = ts_current
+        elif retain == "range":
+            orig_node = ranges.append(ts_current, ts_type)
+        else:
+            orig_node = None
+
+        node = Node(
+            orig_node=orig_node, type=aliased.get(ts_type, ts_type), label=label
+        )
+        if parent != -1:
+            nodes[parent].children_append(node)
+        nodes.append(node)
+
+    return nodes[0]
 
 
 def from_tree_sitter_tree(
-    tree: ts.Tree, language_or_rules: Optional[LanguageRules | str] = None
+    tree: ts.Tree,
+    language_or_rules: Optional[LanguageRules | str] = None,
+    retain: RetentionMode = "node",
 ) -> Node:
-    return from_tree_sitter_node(tree.root_node, language_or_rules)
+    return from_tree_sitter_node(tree.root_node, language_or_rules, retain)
+
@@ -1,10 +1,89 @@
+import bisect
 import itertools
+import math
 import sys
-from collections import defaultdict
-from typing import Callable, NoReturn, Optional
-
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Literal, Optional
+
+from sequoia_diff.actions import myers_lcs, unique_lcs
+from sequoia_diff.apted import TriGramCostModel, match_apted
 from sequoia_diff.models import MappingDict, Node, NodePriorityQueue
-from sequoia_diff.string_comparisons import normalized_tri_gram_distance
+from sequoia_diff.string_comparisons import (
+    LABEL_DISTANCE_CACHE_SIZE,
+    LabelDistanceCache,
+    normalized_tri_gram_distance,
+)
+
+try:
+    from sequoia_diff.matching_numpy import match_rted_numpy
+except ImportError:  # NumPy is an optional dependency
+    match_rted_numpy = None  # type: ignore[assignment]
+
+LastChanceAlgorithm = Literal["rted", "apted", "histogram"]
+
+
+@dataclass(frozen=True, slots=True)
+class MatcherConfig:
+    """
+    Settings of the built-in matchers, passed to them by `generate_mappings`.
+    See `low_latency` for interactive use and `thorough` for offline mining.
+    """
+
+    # Minimum height of the subtrees mapped by `match_greedy_top_down`
+    min_height: int = 1
+
+    # Minimum dice similarity for `match_greedy_bottom_up` to map a node to a
+    # candidate. With "adaptive", the threshold is 1 / (1 + log(n)) with n the
+    # total size of both subtrees, so that big subtrees need less similarity.
+    sim_threshold: float | Literal["adaptive"] = 0.5
+
+    # `match_last_chance` skips pairs where both subtrees are at least this big
+    last_chance_size_threshold: int = 1000
+    last_chance_algorithm: LastChanceAlgorithm = "rted"
+
+    # Budgets of `match_last_chance`. Pairs whose product of sizes, the number
+    # of cells of the RTED tables, is above last_chance_max_cost back off, and
+    # so do all the pairs once last_chance_time_budget seconds were spent in
+    # the last-chance matches of a `match_greedy_bottom_up`. A pair that backs
+    # off is matched with last_chance_fallback, or skipped if None.
+    last_chance_max_cost: Optional[int] = None
+    last_chance_time_budget: Optional[float] = None
+    last_chance_fallback: Optional[LastChanceAlgorithm] = "histogram"
+
+    label_distance_cache_size: int = LABEL_DISTANCE_CACHE_SIZE
+
+    # Thresholds of `match_chawathe_fast`. The LCS of a chain stops at its
+    # common prefix and suffix if more than chawathe_max_d of its nodes would
+    # be left out (see `myers_lcs`), and the rest is paired by label.
+    label_threshold: float = 0.5
+    common_threshold: float = 0.5
+    chawathe_max_d: Optional[int] = 500
+
+    @classmethod
+    def low_latency(cls) -> "MatcherConfig":
+        """
+        For interactive use: big pairs are matched with the histogram matcher
+        rather than RTED, and last-chance matching stops using RTED after 50 ms.
+        """
+        return cls(
+            last_chance_size_threshold=500,
+            last_chance_max_cost=100_000,
+            last_chance_time_budget=0.05,
+        )
+
+    @classmethod
+    def thorough(cls) -> "MatcherConfig":
+        """
+        For offline use: the adaptive similarity threshold maps more big
+        subtrees bottom-up, and so more pairs get last-chance matching.
+        """
+        return cls(sim_threshold="adaptive")
+
+
+DEFAULT_MATCHER_CONFIG = MatcherConfig()
 
 MatchingFunc = Callable[[MappingDict, Node, Node], None]
 
@@ -14,11 +93,10 @@ def number_of_mapped_descendants(mappings: MappingDict, src: Node, dst: Node) ->
     Returns the number of descendants of src that are mapped to descendants of
     dst.
     """
-    dst_descendants = set(node for node in dst.pre_order(skip_self=True))
-
     result = 0
     for node in src.pre_order(skip_self=True):
-        if mappings.src_to_dst.get(node) in dst_descendants:
+        partner = mappings.src_to_dst.get(node)
+        if partner is not None and partner.is_descendant(dst):
             result += 1
 
     return result
@@ -35,17 +113,107 @@ def dice_similarity(mappings: MappingDict, src: Node, dst: Node) -> float:
     return float(2.0 * common / (src.size + dst.size))
 
 
-def match_greedy_top_down(mappings: MappingDict, src: Node, dst: Node) -> None:
+class MappedDescendantsIndex:
+    """
+    Keeps the sorted `idx_pre_ltr` indices of the partners of the mapped
+    descendants of src nodes, so that the number of descendants of a src node
+    mapped to descendants of a dst node is two binary searches over the
+    descendant range of the dst node.
+
+    Lists are built bottom-up from the lists of the children, so the nodes must
+    be updated in post-order. Lists of children are dropped once merged.
+    """
+
+    def __init__(self, mappings: MappingDict):
+        self.mappings = mappings
+        self.partner_indices: dict[Node, list[int]] = {}
+
+    def update(self, node: Node) -> None:
+        """
+        Computes the list of node from the lists of its children. Mappings
+        added inside the subtree of node after this call require `rebuild`.
+        """
+        indices: list[int] = []
+        for child in node.children:
+            indices.extend(self.partner_indices.pop(child, []))
+            partner = self.mappings.src_to_dst.get(child)
+            if partner is not None:
+                indices.append(partner.idx_pre_ltr)
+
+        # The lists of the children are already sorted, so this is close to a
+        # linear merge
+        indices.sort()
+        self.partner_indices[node] = indices
+
+    def rebuild(self, node: Node) -> None:
+        """
+        Computes the list of node from scratch by going through its subtree.
+        """
+        self.partner_indices[node] = sorted(
+            partner.idx_pre_ltr
+            for descendant in node.pre_order(skip_self=True)
+            if (partner := self.mappings.src_to_dst.get(descendant)) is not None
+        )
+
+    def number_of_mapped_descendants(self, src: Node, dst: Node) -> int:
+        """
+        Same as `number_of_mapped_descendants`, in O(log n) time complexity.
+        """
+        indices = self.partner_indices[src]
+        descendants = dst.descendant_range()
+        return bisect.bisect_left(indices, descendants.stop) - bisect.bisect_left(
+            indices, descendants.start
+        )
+
+    def dice_similarity(self, src: Node, dst: Node) -> float:
+        """
+        Same as `dice_similarity`, in O(log n) time complexity.
+        """
+        common = self.number_of_mapped_descendants(src, dst)
+        return float(2.0 * common / (src.size + dst.size))
+
+
+def split_isomorphic(
+    src_nodes: list[Node], dst_nodes: list[Node]
+) -> list[tuple[list[Node], list[Node]]]:
+    """
+    Splits nodes that share the same subtree hash into groups of isomorphic
+    subtrees, ruling out hash collisions. Almost always returns a single group.
     """
-    Map the common subtrees of src and dst with the greatest height possible.
+    groups: list[tuple[list[Node], list[Node]]] = []
+
+    for side, nodes in enumerate((src_nodes, dst_nodes)):
+        for node in nodes:
+            for group in groups:
+                representative = group[0][0] if len(group[0]) != 0 else group[1][0]
+                if representative.is_isomorphic(node):
+                    group[side].append(node)
+                    break
+            else:
+                new_group: tuple[list[Node], list[Node]] = ([], [])
+                new_group[side].append(node)
+                groups.append(new_group)
+
+    return groups
+
+
+def match_greedy_top_down(
+    mappings: MappingDict,
+    src: Node,
+    dst: Node,
+    config: MatcherConfig = DEFAULT_MATCHER_CONFIG,
+) -> None:
+    """
+    Map the common subtrees of src and dst with the greatest height possible,
+    down to config.min_height.
 
     https://dl.acm.org/doi/10.1145/2642937.2642982
     """
 
-    ambiguous_mappings: list[tuple[set[Node], set[Node]]] = []
+    ambiguous_mappings: list[tuple[list[Node], list[Node]]] = []
 
-    pq_src = NodePriorityQueue()
-    pq_dst = NodePriorityQueue()
+    pq_src = NodePriorityQueue(config.min_height)
+    pq_dst = NodePriorityQueue(config.min_height)
 
     pq_src.push(src)
     pq_dst.push(dst)
@@ -55,33 +223,40 @@ def match_greedy_top_down(mappings: MappingDict, src: Node, dst: Node) -> None:
         _, src_nodes = pq_src.pop_equal_priority()
         _, dst_nodes = pq_dst.pop_equal_priority()
 
-        local_mappings: dict[int, tuple[set[Node], set[Node]]] = defaultdict(
-            lambda: (set(), set())
+        # Lists rather than sets so that ambiguous mappings are resolved in a
+        # deterministic order (nodes are hashed by identity).
+        local_mappings: dict[int, tuple[list[Node], list[Node]]] = defaultdict(
+            lambda: ([], [])
         )
 
         # Utilize the hash function to determine of two nodes are isomorphic
         for node in src_nodes:
-            local_mappings[node.subtree_hash_value][0].add(node)
+            local_mappings[node.subtree_hash_value][0].append(node)
         for node in dst_nodes:
-            local_mappings[node.subtree_hash_value][1].add(node)
+            local_mappings[node.subtree_hash_value][1].append(node)
 
-        for _, local_set in local_mappings.items():
-            src_set, dst_set = local_set
+        for local_set in local_mappings.values():
+            # Equal hashes might be a collision if the strategy is not strict
+            if Node.hash_strategy.strict or not (local_set[0] and local_set[1]):
+                local_groups = [local_set]
+            else:
+                local_groups = split_isomorphic(*local_set)
 
-            # Unmapped
-            if len(src_set) == 0 or len(dst_set) == 0:
-                for node in src_set:
-                    pq_src.push_children(node)
-                for node in dst_set:
-                    pq_dst.push_children(node)
+            for src_set, dst_set in local_groups:
+                # Unmapped
+                if len(src_set) == 0 or len(dst_set) == 0:
+                    for node in src_set:
+                        pq_src.push_children(node)
+                    for node in dst_set:
+                        pq_dst.push_children(node)
 
-            # Unique
-            elif len(src_set) == 1 and len(dst_set) == 1:
-                mappings.put_recursively(list(src_set)[0], list(dst_set)[0])
+                # Unique
+                elif len(src_set) == 1 and len(dst_set) == 1:
+                    mappings.put_recursively(src_set[0], dst_set[0])
 
-            # Ambiguous
-            else:
-                ambiguous_mappings.append(local_set)
+                # Ambiguous
+                else:
+                    ambiguous_mappings.append((src_set, dst_set))
 
     # TODO: Implement dice similarity sorting, something like:
     #   cmp = lambda a, b: dice(*b) - dice(*a)
@@ -101,7 +276,7 @@ class RTEDTree:
 
     https://arxiv.org/abs/1201.0230
 
-    TODO: Clean up (lots of weird 1-indexed stuff) and implement APTED algorithm
+    TODO: Clean up (lots of weird 1-indexed stuff)
     """
 
     def __init__(self, node: Node):
@@ -110,16 +285,10 @@ class RTEDTree:
         self.leftmost_leaf_descendant: list[int] = [0] * self.size
         self.nodes = [n for n in node.post_order()]
 
-        node_to_idx: dict[Node, int] = {}
-        for idx, n in enumerate(node.post_order(), 1):
-            node_to_idx[n] = idx
-            self.nodes[idx - 1] = n
-
-            leaf = n
-            while len(leaf.children) != 0:
-                leaf = leaf.children[0]
-
-            self.leftmost_leaf_descendant[idx - 1] = node_to_idx[leaf] - 1
+        # In post-order, the subtree of a node is contiguous, ends at the node
+        # and starts at its leftmost leaf descendant
+        for idx, n in enumerate(self.nodes):
+            self.leftmost_leaf_descendant[idx] = idx - len(n.descendant_range())
             if len(n.children) == 0:
                 self.leaf_count += 1
 
@@ -140,13 +309,20 @@ class RTEDTree:
         return self.nodes[i - 1]
 
 
-def match_rted(mappings: MappingDict, src: Node, dst: Node) -> MappingDict:
+def match_rted(
+    mappings: MappingDict,
+    src: Node,
+    dst: Node,
+    label_distances: Optional[LabelDistanceCache] = None,
+) -> MappingDict:
     """
-    RTED algorithm for tree edit distance.
+    RTED algorithm for tree edit distance. The distances between labels are
+    looked up in label_distances, a new cache if None.
 
     https://arxiv.org/abs/1201.0230
 
-    TODO: Clean up (lots of weird 1-indexed stuff) and implement APTED algorithm
+    TODO: Clean up (lots of weird 1-indexed stuff). See `match_apted` for the
+    APTED algorithm.
     """
     zs_src = RTEDTree(src)
     zs_dst = RTEDTree(dst)
@@ -154,11 +330,15 @@ def match_rted(mappings: MappingDict, src: Node, dst: Node) -> MappingDict:
     tree_dist = [[0.0] * (zs_dst.size + 1) for _ in range(zs_src.size + 1)]
     forest_dist = [[0.0] * (zs_dst.size + 1) for _ in range(zs_src.size + 1)]
 
+    if label_distances is None:
+        label_distances = LabelDistanceCache()
+    label_distance = label_distances.normalized_tri_gram_distance
+
     def get_update_cost(a: Node, b: Node) -> float:
         if a.type != b.type:
             return sys.float_info.max
 
-        return normalized_tri_gram_distance(a.label, b.label)
+        return label_distance(a.label, b.label)
 
     def compute_forest_dist(i: int, j: int) -> None:
         forest_dist[zs_src.lld(i) - 1][zs_dst.lld(j) - 1] = 0
@@ -251,10 +431,52 @@ def match_rted(mappings: MappingDict, src: Node, dst: Node) -> MappingDict:
     return mappings
 
 
-def match_last_chance(mappings: MappingDict, a: Node, b: Node) -> None:
+def match_histogram(mappings: MappingDict, src: Node, dst: Node) -> MappingDict:
+    """
+    Cheap last-chance matcher, linear in the size of the trees. Maps the
+    children of src and dst whose type is unique among the children of both,
+    then does the same for the children of every pair it maps, like the
+    histogram matching of the simple bottom-up matcher of GumTree.
+    """
+    stack = [(src, dst)]
+    while stack:
+        a, b = stack.pop()
+
+        src_by_type: defaultdict[str, list[Node]] = defaultdict(list)
+        for child in a.children:
+            src_by_type[child.type].append(child)
+        dst_by_type: defaultdict[str, list[Node]] = defaultdict(list)
+        for child in b.children:
+            dst_by_type[child.type].append(child)
+
+        for type, src_children in src_by_type.items():
+            dst_children = dst_by_type.get(type)
+            if len(src_children) == 1 and dst_children and len(dst_children) == 1:
+                mappings.put(src_children[0], dst_children[0])
+                stack.append((src_children[0], dst_children[0]))
+
+    return mappings
+
+
+def match_last_chance(
+    mappings: MappingDict,
+    a: Node,
+    b: Node,
+    config: MatcherConfig = DEFAULT_MATCHER_CONFIG,
+    label_distances: Optional[LabelDistanceCache] = None,
+    over_budget: bool = False,
+) -> None:
     """
     Use the RTED algorithm to match the remaining nodes. Technically, any
-    matching algorithm that does not produce Move edit actions will work.
+    matching algorithm that does not produce Move edit actions will work. If
+    NumPy is installed, the faster `match_rted_numpy` is used, which produces
+    the same mappings. With config.last_chance_algorithm="apted", `match_apted`
+    is used instead, which is much faster on skewed trees but may break ties
+    between equally good mappings differently. label_distances is passed to the
+    algorithm.
+
+    Pairs above config.last_chance_max_cost, or any pair if over_budget, use
+    config.last_chance_fallback instead, e.g. the linear `match_histogram`.
 
     The best known algorithm with add, delete and update actions has a O(n^3)
     time complexity with n being the number of nodes of the AST [1]. Computing
@@ -264,12 +486,30 @@ def match_last_chance(mappings: MappingDict, a: Node, b: Node) -> None:
     [1]: https://arxiv.org/abs/1201.0230
     [2]: https://doi.org/10.1016/j.tcs.2004.12.030
     """
-    SIZE_THRESHOLD = 1000
-    if a.size >= SIZE_THRESHOLD and b.size >= SIZE_THRESHOLD:
+    size_threshold = config.last_chance_size_threshold
+    if a.size >= size_threshold and b.size >= size_threshold:
         return
 
+    algorithm: Optional[LastChanceAlgorithm] = config.last_chance_algorithm
+    if over_budget or (
+        config.last_chance_max_cost is not None
+        and a.size * b.size > config.last_chance_max_cost
+    ):
+        algorithm = config.last_chance_fallback
+        if algorithm is None:
+            return
+
     zs_mappings = MappingDict()
-    match_rted(zs_mappings, a, b)
+    if algorithm == "apted":
+        match_apted(zs_mappings, a, b, TriGramCostModel(label_distances))
+    elif algorithm == "histogram":
+        match_histogram(zs_mappings, a, b)
+    elif algorithm != "rted":
+        raise ValueError(f"Unknown last chance algorithm: {algorithm}")
+    elif match_rted_numpy is not None:
+        match_rted_numpy(zs_mappings, a, b, label_distances)
+    else:
+        match_rted(zs_mappings, a, b, label_distances)
 
     for src_cand, dst_cand in zs_mappings.items():
         if mappings.is_mapping_allowed(src_cand, dst_cand):
@@ -309,16 +549,117 @@ def get_dst_candidates(mappings: MappingDict, src: Node) -> list[Node]:
     return candidates
 
 
-def match_greedy_bottom_up(mappings: MappingDict, src: Node, dst: Node) -> None:
+class DstCandidatesIndex:
+    """
+    Keeps, for src nodes, the dst nodes visited by `get_dst_candidates`: the
+    ancestors of the partners of the mapped descendants, in order of discovery.
+    They are built bottom-up from the visited nodes of the children, so the
+    nodes must be updated in post-order. Visited nodes of children are dropped
+    once merged.
+
+    A set of dst nodes that contains a node also contains all its ancestors,
+    so climbing from a seed stops at the first visited node.
+    """
+
+    def __init__(self, mappings: MappingDict):
+        self.mappings = mappings
+        # dicts are used as insertion ordered sets
+        self.visited: dict[Node, dict[Node, None]] = {}
+
+    def climb(self, visited: dict[Node, None], dst_seed: Node) -> None:
+        parent = dst_seed.parent
+        while parent is not None and parent not in visited:
+            visited[parent] = None
+            parent = parent.parent
+
+    def update(self, node: Node) -> None:
+        """
+        Computes the visited nodes of node from the visited nodes of its
+        children. Mappings added inside the subtree of node after this call
+        require `rebuild`.
+        """
+        visited: dict[Node, None] = {}
+        for child in node.children:
+            partner = self.mappings.src_to_dst.get(child)
+            if partner is not None:
+                self.climb(visited, partner)
+
+            child_visited = self.visited.pop(child, None)
+            if child_visited is None:
+                continue
+            if len(visited) == 0:
+                visited = child_visited
+            else:
+                for dst_node in child_visited:
+                    if dst_node not in visited:
+                        visited[dst_node] = None
+
+        self.visited[node] = visited
+
+    def rebuild(self, node: Node) -> None:
+        """
+        Computes the visited nodes of node from scratch by going through its
+        subtree.
+        """
+        visited: dict[Node, None] = {}
+        for descendant in node.pre_order(skip_self=True):
+            partner = self.mappings.src_to_dst.get(descendant)
+            if partner is not None:
+                self.climb(visited, partner)
+
+        self.visited[node] = visited
+
+    def get_dst_candidates(self, src: Node) -> list[Node]:
+        """
+        Same as `get_dst_candidates`, without going through the subtree of src.
+        """
+        return [
+            dst_node
+            for dst_node in self.visited[src]
+            if dst_node.type == src.type
+            and not (dst_node.parent is None or dst_node in self.mappings.dst_to_src)
+        ]
+
+
+def match_greedy_bottom_up(
+    mappings: MappingDict,
+    src: Node,
+    dst: Node,
+    config: MatcherConfig = DEFAULT_MATCHER_CONFIG,
+    label_distances: Optional[LabelDistanceCache] = None,
+) -> None:
     """
     https://dl.acm.org/doi/10.1145/2642937.2642982
+
+    config is passed to `match_last_chance`. Every call to it shares
+    label_distances, a new cache of config.label_distance_cache_size if None,
+    and config.last_chance_time_budget.
     """
-    SIM_THRESHOLD = 0.5
+    if label_distances is None:
+        label_distances = LabelDistanceCache(config.label_distance_cache_size)
+
+    time_left = config.last_chance_time_budget
+
+    def last_chance(a: Node, b: Node) -> None:
+        nonlocal time_left
+        if time_left is None:
+            match_last_chance(mappings, a, b, config, label_distances)
+            return
+
+        start = time.perf_counter()
+        match_last_chance(mappings, a, b, config, label_distances, time_left <= 0)
+        time_left -= time.perf_counter() - start
+
+    index = MappedDescendantsIndex(mappings)
+    candidates_index = DstCandidatesIndex(mappings)
 
     for node in src.post_order():
+        index.update(node)
+        candidates_index.update(node)
+
         if node.parent is None:
             mappings.put(node, dst)
-            match_last_chance(mappings, node, dst)
+            last_chance(node, dst)
             break
 
         if len(node.children) == 0 or node in mappings.src_to_dst:
@@ -326,18 +667,31 @@ def match_greedy_bottom_up(mappings: MappingDict, src: Node, dst: Node) -> None:
 
         best: Optional[Node] = None
         the_max: float = -1.0
-        for candidate in get_dst_candidates(mappings, node):
-            sim = dice_similarity(mappings, node, candidate)
-            if sim > the_max and sim >= SIM_THRESHOLD:
+        for candidate in candidates_index.get_dst_candidates(node):
+            sim = index.dice_similarity(node, candidate)
+            if config.sim_threshold == "adaptive":
+                sim_threshold = 1.0 / (1.0 + math.log(node.size + candidate.size))
+            else:
+                sim_threshold = config.sim_threshold
+            if sim > the_max and sim >= sim_threshold:
                 the_max = sim
                 best = candidate
 
         if best is not None:
-            match_last_chance(mappings, node, best)
+            num_mappings = len(mappings)
+            last_chance(node, best)
+            if len(mappings) != num_mappings:
+                index.rebuild(node)
+                candidates_index.rebuild(node)
             mappings.put(node, best)
 
 
-def match_chawathe_fast(mappings: MappingDict, src: Node, dst: Node) -> NoReturn:
+def match_chawathe_fast(
+    mappings: MappingDict,
+    src: Node,
+    dst: Node,
+    config: MatcherConfig = DEFAULT_MATCHER_CONFIG,
+) -> None:
     """
     1. M <- phi
     2. For each leaf label l do
@@ -352,19 +706,186 @@ def match_chawathe_fast(mappings: MappingDict, src: Node, dst: Node) -> NoReturn
     3. Repeat steps 2a-2e for each internal node label l.
 
     https://dl.acm.org/doi/10.1145/235968.233366
+
+    Labels of the paper are node types here, and values are node labels. Two
+    leaves are equal if the tri-gram distance between their labels is at most
+    config.label_threshold, and two internal nodes if more than
+    config.common_threshold of their leaves are mapped to each other. Chains
+    are in pre-order and the LCS is computed with `myers_lcs`, so similar trees
+    are matched in close to linear time. The LCS is given up past
+    config.chawathe_max_d, so that very different trees are not quadratic.
+
+    To keep step e linear too, leaves are only paired with leaves with the
+    exact same label, and internal nodes with the ancestors of the partner of
+    their median leaf, which is part of every equal internal node.
+
+    Much faster than `match_greedy_top_down` followed by
+    `match_greedy_bottom_up`, but moved and heavily edited subtrees are matched
+    less often, so edit scripts are longer.
     """
 
-    raise NotImplementedError()
+    def chains(root: Node) -> tuple[list[Node], dict[str, list[Node]]]:
+        leaves: list[Node] = []
+        internal: defaultdict[str, list[Node]] = defaultdict(list)
+        for node in root.pre_order():
+            if len(node.children) == 0:
+                leaves.append(node)
+            else:
+                internal[node.type].append(node)
+
+        return leaves, internal
+
+    src_leaves, src_internal = chains(src)
+    dst_leaves, dst_internal = chains(dst)
+
+    # Leaves. All of them are in a single chain, because chains of a single
+    # type are too repetitive (think of every `;`): after a deleted statement,
+    # the LCS would map every following `;` to the one of the next statement.
+    def equal_leaves(x: Node, y: Node) -> bool:
+        return x.type == y.type and (
+            x.label == y.label
+            or normalized_tri_gram_distance(x.label, y.label) <= config.label_threshold
+        )
+
+    s1 = [x for x in src_leaves if x not in mappings.src_to_dst]
+    s2 = [y for y in dst_leaves if y not in mappings.dst_to_src]
+
+    # Leaves whose type and label are unique in both chains are aligned first,
+    # like in patience diff, and the LCS only runs between them, so that its
+    # D stays small on long chains and config.chawathe_max_d is rarely hit
+    src_counts = Counter((x.type, x.label) for x in s1)
+    dst_counts = Counter((y.type, y.label) for y in s2)
+    unique_src = {
+        (x.type, x.label): x
+        for x in s1
+        if src_counts[(x.type, x.label)] == 1 and dst_counts[(x.type, x.label)] == 1
+    }
+
+    def unique_partner(y: Node) -> Optional[Node]:
+        if dst_counts[(y.type, y.label)] != 1:
+            return None
+        return unique_src.get((y.type, y.label))
+
+    anchors = unique_lcs(s1, s2, unique_partner)
+    src_positions = {x: i for i, x in enumerate(s1)}
+    dst_positions = {y: j for j, y in enumerate(s2)}
+
+    src_start = dst_start = 0
+    for anchor in [*anchors, None]:
+        src_end = len(s1) if anchor is None else src_positions[anchor[0]]
+        dst_end = len(s2) if anchor is None else dst_positions[anchor[1]]
+        for x, y in myers_lcs(
+            s1[src_start:src_end],
+            s2[dst_start:dst_end],
+            equal_leaves,
+            config.chawathe_max_d,
+        ):
+            mappings.put(x, y)
+
+        if anchor is not None:
+            mappings.put(*anchor)
+            src_start, dst_start = src_end + 1, dst_end + 1
+
+    dst_by_label: defaultdict[tuple[str, str | None], list[Node]] = defaultdict(list)
+    for y in reversed(s2):
+        if y not in mappings.dst_to_src:
+            dst_by_label[(y.type, y.label)].append(y)
+
+    for x in s1:
+        if x not in mappings.src_to_dst and len(dst_by_label[(x.type, x.label)]) != 0:
+            mappings.put(x, dst_by_label[(x.type, x.label)].pop())
+
+    # Internal nodes. The number of leaves of every src node and the
+    # `idx_pre_ltr` indices of the partners of its mapped leaves, sorted, are
+    # gathered bottom-up like in `MappedDescendantsIndex`. Only internal nodes
+    # are mapped from now on, so they are gathered once. The lists of the nodes
+    # that are not in a chain are dropped once merged.
+    dst_leaf_count: dict[Node, int] = {}
+    for node in dst.post_order():
+        dst_leaf_count[node] = sum(dst_leaf_count[c] for c in node.children) or 1
+
+    src_leaf_count: dict[Node, int] = {}
+    leaf_partner_indices: dict[Node, list[int]] = {}
+    leaf_partners_by_index: dict[int, Node] = {}
+    for node in src.post_order():
+        if len(node.children) == 0:
+            src_leaf_count[node] = 1
+            partner = mappings.src_to_dst.get(node)
+            if partner is not None:
+                leaf_partners_by_index[partner.idx_pre_ltr] = partner
+            continue
+
+        count = 0
+        indices: list[int] = []
+        for child in node.children:
+            count += src_leaf_count[child]
+            if len(child.children) == 0:
+                partner = mappings.src_to_dst.get(child)
+                if partner is not None:
+                    indices.append(partner.idx_pre_ltr)
+            elif child in mappings.src_to_dst:
+                indices.extend(leaf_partner_indices.pop(child))
+            else:
+                indices.extend(leaf_partner_indices[child])
+
+        # The lists of the children are already sorted, so this is close to a
+        # linear merge
+        indices.sort()
+        src_leaf_count[node] = count
+        leaf_partner_indices[node] = indices
+
+    def equal_internal(x: Node, y: Node) -> bool:
+        indices = leaf_partner_indices[x]
+        descendants = y.descendant_range()
+        common = bisect.bisect_left(indices, descendants.stop) - bisect.bisect_left(
+            indices, descendants.start
+        )
+        return (
+            common / max(src_leaf_count[x], dst_leaf_count[y]) > config.common_threshold
+        )
+
+    for node_type, chain in src_internal.items():
+        s1 = [x for x in chain if x not in mappings.src_to_dst]
+        s2 = [y for y in dst_internal[node_type] if y not in mappings.dst_to_src]
+
+        for x, y in myers_lcs(s1, s2, equal_internal, config.chawathe_max_d):
+            mappings.put(x, y)
+
+        for x in s1:
+            indices = leaf_partner_indices[x]
+            if x in mappings.src_to_dst or len(indices) == 0:
+                continue
+
+            candidate = leaf_partners_by_index[indices[len(indices) // 2]].parent
+            while candidate in dst_leaf_count:
+                if mappings.is_mapping_allowed(x, candidate) and equal_internal(
+                    x, candidate
+                ):
+                    mappings.put(x, candidate)
+                    break
+                candidate = candidate.parent
+
+        for x in s1:
+            del leaf_partner_indices[x]
+
+    if mappings.is_mapping_allowed(src, dst):
+        mappings.put(src, dst)
 
 
-# TODO: Add the ability to pass in kwargs to the matching functions.
 def generate_mappings(
     src: Node,
     dst: Node,
     funcs: list[MatchingFunc] | None = None,
+    config: MatcherConfig = DEFAULT_MATCHER_CONFIG,
+    label_distances: Optional[LabelDistanceCache] = None,
 ) -> MappingDict:
     """
-    Establish mappings between similar nodes of the two trees.
+    Establish mappings between similar nodes of the two trees. config and
+    label_distances are given to the default matchers; pass a
+    LabelDistanceCache to read its hits and misses afterwards. Custom funcs are
+    called with (mappings, src, dst) only, so bind the config of built-in
+    matchers beforehand, e.g.
+    `functools.partial(match_chawathe_fast, config=config)`.
 
     There are only two constraints for these mappings:
     - A given node can only belong to one mapping.
@@ -372,7 +893,12 @@ def generate_mappings(
     """
 
     if funcs is None:
-        funcs = [match_greedy_top_down, match_greedy_bottom_up]
+        funcs = [
+            partial(match_greedy_top_down, config=config),
+            partial(
+                match_greedy_bottom_up, config=config, label_distances=label_distances
+            ),
+        ]
 
     mappings = MappingDict()
     for func in funcs:
@@ -0,0 +1,284 @@
+"""
+NumPy implementation of `match_rted`. Requires the optional `numpy` dependency
+(`pip install sequoia_diff[numpy]`).
+
+It computes exactly the same tree distances, and thus the same mappings, as
+`match_rted`, but instead of filling the tables one cell at a time, it fills a
+whole row of the forest distance tables of many dst key roots at once.
+"""
+
+import sys
+
+import numpy as np
+import numpy.typing as npt
+
+from sequoia_diff.models import MappingDict, Node
+from sequoia_diff.string_comparisons import LabelDistanceCache
+
+FloatArray = npt.NDArray[np.float64]
+IntArray = npt.NDArray[np.intp]
+BoolArray = npt.NDArray[np.bool_]
+
+# Maximum number of cells of the forest distance table of a src key root. dst
+# key roots are split into several tables if needed.
+MAX_TABLE_SIZE = 1 << 22
+
+
+class NumpyRTEDTree:
+    """
+    Same as `RTEDTree`, with arrays instead of lists. Nodes are numbered in
+    post-order starting from 1, and `lld[i]` is the number of the leftmost leaf
+    descendant of node i.
+    """
+
+    def __init__(self, node: Node, type_ids: dict[str, int]):
+        self.nodes = list(node.post_order())
+        self.size = len(self.nodes)
+
+        self.lld: IntArray = np.zeros(self.size + 1, dtype=np.intp)
+        self.type_ids: IntArray = np.full(self.size + 1, -1, dtype=np.intp)
+        key_root_of_lld: dict[int, int] = {}
+
+        for idx, n in enumerate(self.nodes, 1):
+            # In post-order, the subtree of a node is contiguous, ends at the
+            # node and starts at its leftmost leaf descendant
+            lld = idx - len(n.descendant_range())
+            self.lld[idx] = lld
+            self.type_ids[idx] = type_ids.setdefault(n.type, len(type_ids))
+
+            # The key root of a leftmost path is its node with the largest number
+            key_root_of_lld[lld] = idx
+
+        self.key_roots = sorted(key_root_of_lld.values())
+
+    def tree(self, i: int) -> Node:
+        return self.nodes[i - 1]
+
+    def key_root_levels(self) -> list[list[int]]:
+        """
+        Groups the key roots so that the subtree of a key root only contains key
+        roots of previous groups.
+        """
+        key_roots = np.array(self.key_roots, dtype=np.intp)
+        levels = np.zeros(len(key_roots), dtype=np.intp)
+
+        for k, j in enumerate(self.key_roots):
+            inside = key_roots[:k] >= self.lld[j]
+            if inside.any():
+                levels[k] = levels[:k][inside].max() + 1
+
+        return [
+            [int(j) for j in key_roots[levels == level]]
+            for level in range(int(levels.max()) + 1 if len(levels) != 0 else 0)
+        ]
+
+
+class ForestLayout:
+    """
+    Lays out the columns of the forest distance tables of several dst subtrees
+    side by side. The segment of a subtree rooted at j covers the columns
+    lld(j) - 1 (the boundary) to j.
+    """
+
+    def __init__(self, tree: NumpyRTEDTree, roots: list[int]):
+        segment_sizes = [j - int(tree.lld[j]) + 2 for j in roots]
+        self.width = sum(segment_sizes)
+
+        # Column of the full dst table of each position
+        self.cols: IntArray = np.concatenate(
+            [np.arange(tree.lld[j] - 1, j + 1, dtype=np.intp) for j in roots]
+        )
+        starts = np.cumsum([0] + segment_sizes[:-1], dtype=np.intp)
+        self.boundary: IntArray = starts
+        self.segment_ids: IntArray = np.repeat(
+            np.arange(len(roots), dtype=np.intp), segment_sizes
+        )
+        segment_lld = np.repeat(tree.lld[roots], segment_sizes)
+
+        # Distance between the position and the boundary of its segment
+        self.offsets: IntArray = np.arange(self.width, dtype=np.intp) - np.repeat(
+            starts, segment_sizes
+        )
+
+        inner_mask = np.ones(self.width, dtype=np.bool_)
+        inner_mask[starts] = False
+        self.inner: IntArray = np.flatnonzero(inner_mask)
+        self.inner_cols: IntArray = self.cols[self.inner]
+
+        # Position of column lld(dj) - 1 in the segment of each inner column dj
+        self.inner_lld_pos: IntArray = (
+            self.inner - self.offsets[self.inner] + tree.lld[self.inner_cols] - 1
+        ) - (segment_lld[self.inner] - 1)
+
+        # If lld(dj) == lld(j)
+        self.inner_on_path: BoolArray = (
+            tree.lld[self.inner_cols] == segment_lld[self.inner]
+        )
+
+
+def match_rted_numpy(
+    mappings: MappingDict,
+    src: Node,
+    dst: Node,
+    label_distances: LabelDistanceCache | None = None,
+) -> MappingDict:
+    """
+    Same as `match_rted`, using NumPy.
+    """
+    type_ids: dict[str, int] = {}
+    zs_src = NumpyRTEDTree(src, type_ids)
+    zs_dst = NumpyRTEDTree(dst, type_ids)
+
+    tree_dist: FloatArray = np.zeros((zs_src.size + 1, zs_dst.size + 1))
+
+    # Large enough for the segments of the first positions to never win the
+    # minimum of the positions of later segments when solving a row
+    segment_gap = float(2 * (zs_src.size + zs_dst.size) + 4)
+
+    if label_distances is None:
+        label_distances = LabelDistanceCache()
+    label_distance = label_distances.normalized_tri_gram_distance
+
+    def get_update_costs(di: int, dj: IntArray) -> FloatArray:
+        result = np.full(len(dj), sys.float_info.max)
+
+        a = zs_src.tree(di)
+        same_type = np.flatnonzero(zs_dst.type_ids[dj] == zs_src.type_ids[di])
+        for k in same_type:
+            b = zs_dst.tree(int(dj[k]))
+            result[k] = label_distance(a.label, b.label)
+
+        return result
+
+    def solve_row(
+        layout: ForestLayout, best: FloatArray, boundary_value: float
+    ) -> FloatArray:
+        """
+        Solves `row[x] = min(best[x], row[x - 1] + 1.0)` in every segment, with
+        the boundary of each segment set to boundary_value. The insertion
+        costs are added one at a time, like the original recurrence, so that
+        the results are exactly equal.
+        """
+        best[layout.boundary] = boundary_value
+
+        # Initial guess with a prefix minimum, then fix the rounding errors
+        # until nothing changes. A fixed point satisfies the recurrence, and
+        # the recurrence has a single solution. Each iteration makes at least
+        # one more position of every segment exact, so the last one of width
+        # iterations at most only checks that nothing changes.
+        shift = np.arange(layout.width) + layout.segment_ids * segment_gap
+        row = np.minimum.accumulate(best - shift) + shift
+
+        previous = np.empty(layout.width)
+        for _ in range(layout.width):
+            previous[1:] = row[:-1]
+            previous[layout.boundary] = np.inf
+            new_row = np.minimum(best, previous + 1.0)
+            if np.array_equal(new_row, row):
+                return row
+            row = new_row
+
+        raise AssertionError(f"No fixed point after {layout.width} iterations")
+
+    def compute_forest_dist(i: int, layout: ForestLayout) -> FloatArray:
+        """
+        Computes the forest distance tables of the subtree rooted at i against
+        all the subtrees of layout. Row r corresponds to node lld(i) - 1 + r.
+        """
+        li = int(zs_src.lld[i])
+        forest_dist: FloatArray = np.empty((i - li + 2, layout.width))
+        forest_dist[0] = layout.offsets
+
+        inner = layout.inner
+        inner_prev = inner - 1
+
+        for r in range(1, i - li + 2):
+            di = li - 1 + r
+            previous_row = forest_dist[r - 1]
+
+            cost_del = previous_row[inner] + 1.0
+            cost_other = (
+                forest_dist[zs_src.lld[di] - li][layout.inner_lld_pos]
+                + tree_dist[di][layout.inner_cols]
+            )
+
+            on_path = zs_src.lld[di] == li
+            if on_path:
+                path = layout.inner_on_path
+                cost_upd = previous_row[inner_prev[path]] + get_update_costs(
+                    di, layout.inner_cols[path]
+                )
+                cost_other[path] = cost_upd
+
+            best = np.empty(layout.width)
+            best[inner] = np.minimum(cost_del, cost_other)
+            row = solve_row(layout, best, float(r))
+            forest_dist[r] = row
+
+            if on_path:
+                path_positions = inner[layout.inner_on_path]
+                tree_dist[di][layout.cols[path_positions]] = row[path_positions]
+
+        return forest_dist
+
+    # Fill tree_dist. The key roots of a level only depend on lower levels
+    max_width = max(1, MAX_TABLE_SIZE // (zs_src.size + 1))
+    layouts: list[ForestLayout] = []
+    for level in zs_dst.key_root_levels():
+        chunk: list[int] = []
+        chunk_width = 0
+        for j in level:
+            chunk.append(j)
+            chunk_width += j - int(zs_dst.lld[j]) + 2
+            if chunk_width >= max_width:
+                layouts.append(ForestLayout(zs_dst, chunk))
+                chunk, chunk_width = [], 0
+        if len(chunk) != 0:
+            layouts.append(ForestLayout(zs_dst, chunk))
+
+    for i in zs_src.key_roots:
+        for layout in layouts:
+            compute_forest_dist(i, layout)
+
+    # Backtrack exactly like match_rted, recomputing the forest distances of
+    # each tree pair
+    tree_pairs: list[tuple[int, int]] = []
+    tree_pairs.append((zs_src.size, zs_dst.size))
+
+    while len(tree_pairs) > 0:
+        last_row, last_col = tree_pairs.pop(0)
+
+        forest_dist = compute_forest_dist(last_row, ForestLayout(zs_dst, [last_col]))
+
+        first_row = int(zs_src.lld[last_row]) - 1
+        first_col = int(zs_dst.lld[last_col]) - 1
+
+        # Rows and columns of forest_dist start at first_row and first_col
+        fd = forest_dist.tolist()
+
+        row, col = last_row, last_col
+        while (row > first_row) and (col > first_col):
+            r, c = row - first_row, col - first_col
+            if (row > first_row) and (fd[r - 1][c] + 1.0 == fd[r][c]):
+                row -= 1
+            elif (col > first_col) and (fd[r][c - 1] + 1.0 == fd[r][c]):
+                col -= 1
+            else:
+                if (zs_src.lld[row] - 1 == first_row) and (
+                    zs_dst.lld[col] - 1 == first_col
+                ):
+                    t_src: Node = zs_src.tree(row)
+                    t_dst: Node = zs_dst.tree(col)
+                    if t_src.type == t_dst.type:
+                        mappings.put(t_src, t_dst)
+                    else:
+                        raise Exception("Should not map incompatible nodes.")
+                    row -= 1
+                    col -= 1
+                else:
+                    tree_pairs.insert(0, (row, col))
+
+                    row = int(zs_src.lld[row]) - 1
+                    col = int(zs_dst.lld[col]) - 1
+
+    return mappings
@@ -1,17 +1,20 @@
-import hashlib
 import heapq
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Any, ItemsView, Iterator, Optional
+from typing import Any, ClassVar, ItemsView, Iterator, Optional
 
 from pydantic.fields import Field
 from pydantic.main import BaseModel
 from pydantic.root_model import RootModel
 
+from sequoia_diff.hashing import FastHashStrategy, HashStrategy
+
 
 class LanguageRules(BaseModel):
-    flattened: list[str] = []
+    # Sets, as loaders check the type of every node against them
+    flattened: frozenset[str] = frozenset()
     aliased: dict[str, str] = {}
-    ignored: list[str] = []
+    ignored: frozenset[str] = frozenset()
 
 
 class LanguageRuleSet(RootModel[dict[str, LanguageRules]]):
@@ -22,6 +25,38 @@ class LanguageRuleSet(RootModel[dict[str, LanguageRules]]):
 # Node, it's entirely possible that the parent or child of a Node could have a
 # different type for orig_node. Thus, it would only work for one layer.
 class Node:
+    # Strategy used to compute the content hashes of all nodes. Set it to
+    # `Sha256HashStrategy()` for strict, but much slower, hashing. Hashes that
+    # were already computed are not invalidated when changing it.
+    hash_strategy: ClassVar[HashStrategy] = FastHashStrategy()
+
+    # Trees contain hundreds of thousands of nodes, so no per-instance __dict__
+    __slots__ = (
+        "type",
+        "label",
+        "orig_node",
+        "children",
+        "parent",
+        "_stale_positions_from",
+        "_position_in_parent",
+        "_needs_lightweight_recomputation",
+        "_size",
+        "_height",
+        "_hash_value",
+        "_subtree_hash_value",
+        "_subtree_type_hash_value",
+        "_structure_version",
+        "_heavy_version",
+        "_heavy_root",
+        "_idx_pre_ltr",
+        "_idx_post_ltr",
+        "_idx_pre_rtl",
+        "_idx_post_rtl",
+        "_idx_descendants_end",
+        "_lies_on_rightmost_path",
+        "_lies_on_leftmost_path",
+    )
+
     def __init__(
         self,
         type: str,
@@ -41,35 +76,50 @@ class Node:
         self.children: list["Node"] = []
         self.parent: Optional["Node"] = None
 
-        for child in children:
-            self.children_append(child)
-        if parent is not None:
-            self.set_parent(parent)
+        # Index of the first child whose position_in_parent is stale. The
+        # positions of all the children are up to date if it is equal to
+        # len(self.children).
+        self._stale_positions_from: int = 0
+        self._position_in_parent: int = -1
 
         # Lightweight statistics. Amortized O(1) time complexity
         self._needs_lightweight_recomputation: bool = True
         self._size: int = -1  # total number of nodes in this subtree including self
         self._height: int = -1  # edges to furthest leaf
-        self._position_in_parent: int = -1
         self._hash_value: int = -1
         self._subtree_hash_value: int = -1
         self._subtree_type_hash_value: int = -1
 
-        # TODO: Implement heavy statistics
-
-        # Heavy statistics. O(n) as it requires going through entire tree
+        # Heavy statistics. O(n) as it requires going through entire tree, but
+        # computed at once for every node of the tree. Indices are relative to
+        # the root of the tree. They are stale if they were computed at another
+        # version of the tree, kept by its root: _structure_version is
+        # incremented on every structural modification of a tree whose heavy
+        # statistics are up to date.
+        self._structure_version: int = 0
+        self._heavy_version: int = -1
+        self._heavy_root: Node = self
+        self._idx_pre_ltr: int = -1
+        self._idx_post_ltr: int = -1
+        self._idx_pre_rtl: int = -1
+        self._idx_post_rtl: int = -1
+        self._idx_descendants_end: int = -1  # idx_pre_ltr after the subtree
+        self._lies_on_rightmost_path: bool = False
+        self._lies_on_leftmost_path: bool = False
 
-        # self._dsu_parent: "Node" = parent if parent else self
-
-        # self._idx_pre_ltr: int = -1
-        # self._idx_post_ltr: int = -1
-        # self._idx_pre_rtl: int = -1
-        # self._idx_post_rtl: int = -1
-        # self._lies_on_rightmost_path: bool = False
-        # self._lies_on_leftmost_path: bool = False
+        for child in children:
+            self.children_append(child)
+        if parent is not None:
+            self.set_parent(parent)
 
     def __hash__(self) -> int:
-        return self.hash_value
+        """
+        Nodes are hashed by identity, not by content. Many nodes in a tree share
+        the same type and label (think `;` or `identifier "i"`), so hashing by
+        content would put all of them in the same bucket of every dict and set
+        keyed by nodes. Use `hash_value` and `subtree_hash_value` for content.
+        """
+        return object.__hash__(self)
 
     def __lt__(self, other: "Node") -> bool:
         return (self.type, self.label) < (other.type, other.label)
@@ -96,76 +146,138 @@ class Node:
             parent=None,
         )
 
-        for orig_child in self.children:
-            child = orig_child.deep_copy()
-            result.children_append(child)
+        stack: list[tuple[Node, Node]] = [(self, result)]
+        while len(stack) != 0:
+            orig, cpy = stack.pop()
+            for orig_child in orig.children:
+                child = Node(
+                    orig_node=orig_child.orig_node,
+                    type=orig_child.type,
+                    label=orig_child.label,
+                )
+                cpy.children_append(child)
+                stack.append((orig_child, child))
 
         return result
 
     def recompute_lightweight_stats(self) -> None:
         """
-        Recomputes some statistics about the node and its subtree. Note, because
-        the statistics are tagged with `@property`, each child's statistics will
-        be recursively computed as well.
+        Recomputes some statistics about the node and its subtree. The
+        statistics of any descendant that needs recomputation are computed
+        first, deepest first, so that deep trees do not exhaust the stack.
         """
-        new_size = 1
-        new_height = 0
+        stale: list[Node] = []
+        stack: list[Node] = [self]
+        while len(stack) != 0:
+            node = stack.pop()
+            stale.append(node)
+            stack.extend(
+                child
+                for child in node.children
+                if child._needs_lightweight_recomputation
+            )
 
-        type_label_hasher = hashlib.new("sha256")
-        type_hasher = hashlib.new("sha256")
+        for node in reversed(stale):
+            node.recompute_own_lightweight_stats()
 
-        # 0 if leaf, 1 if not
-        type_label_hasher.update(f"{len(self.children) > 0}".encode("utf-8"))
-        type_label_hasher.update(self.type.encode("utf-8"))
-        type_label_hasher.update(f"{self.label if self.label else ''}".encode("utf-8"))
-
-        type_hasher.update(f"{len(self.children) > 0}".encode("utf-8"))
-        type_hasher.update(self.type.encode("utf-8"))
-
-        self._hash_value = int(type_label_hasher.hexdigest(), 16)
+    def recompute_own_lightweight_stats(self) -> None:
+        """
+        Recomputes the statistics of the node only, assuming that the
+        statistics of its children are up to date.
+        """
+        new_size = 1
+        new_height = 0
 
         for child in self.children:
             new_size += child.size
             new_height = max(new_height, child.height + 1)
 
-            type_label_hasher.update(child.subtree_hash_value.to_bytes(32, "big"))
-            type_hasher.update(child.subtree_type_hash_value.to_bytes(32, "big"))
-
         self._size = new_size
         self._height = new_height
-        self._subtree_hash_value = int(type_label_hasher.hexdigest(), 16)
-        self._subtree_type_hash_value = int(type_hasher.hexdigest(), 16)
+        (
+            self._hash_value,
+            self._subtree_hash_value,
+            self._subtree_type_hash_value,
+        ) = self.hash_strategy.compute(self)
 
         self._needs_lightweight_recomputation = False
 
-    # def recompute_heavy_stats(self):
-    #     for idx, node in enumerate(self.pre_order()):
-    #         node._idx_pre_ltr = idx
-    #         node._idx_pre_rtl = self.size - idx - 1
-    #         if (parent := node.parent) is not None:
-    #             node._lies_on_rightmost_path = parent.children[-1] is node
-    #             node._lies_on_leftmost_path = parent.children[0] is node
-    #         node._needs_heavy_recomputation = False
+    def recompute_heavy_stats(self) -> None:
+        """
+        Recomputes the traversal indices of every node in the tree that contains
+        the node, along with whether they lie on the leftmost and rightmost
+        paths from the root.
+        """
+        root = self
+        while root.parent is not None:
+            root = root.parent
+
+        version = root._structure_version
+        nodes = list(root.pre_order())
+        n = len(nodes)
 
-    #     for idx, node in enumerate(self.post_order()):
-    #         node._idx_post_ltr = idx
-    #         node._idx_post_rtl = self.size - idx - 1
+        for idx, node in enumerate(nodes):
+            node._heavy_version = version
+            node._heavy_root = root
+            node._idx_pre_ltr = idx
+            node._idx_post_rtl = n - idx - 1
+
+            parent = node.parent
+            if parent is None:
+                node._lies_on_leftmost_path = True
+                node._lies_on_rightmost_path = True
+            else:
+                node._lies_on_leftmost_path = (
+                    parent._lies_on_leftmost_path and parent.children[0] is node
+                )
+                node._lies_on_rightmost_path = (
+                    parent._lies_on_rightmost_path and parent.children[-1] is node
+                )
+
+        for idx, node in enumerate(root.post_order()):
+            node._idx_post_ltr = idx
+            node._idx_pre_rtl = n - idx - 1
+            if len(node.children) == 0:
+                node._idx_descendants_end = node._idx_pre_ltr + 1
+            else:
+                node._idx_descendants_end = node.children[-1]._idx_descendants_end
 
     def needs_lightweight_recomputation(self) -> None:
         """
         After certain edit operations, we need to let the node know that it
         needs to lazily recompute some statistics.
-        """
-        self._needs_lightweight_recomputation = True
 
-        if self.parent is not None:
-            self.parent.needs_lightweight_recomputation()
+        The ancestors of a node that needs recomputation always need it too, as
+        statistics are only recomputed for whole subtrees. So the walk up stops
+        at the first node that already needs it, and a series of edits under
+        the same ancestors only walks up to them once, e.g. when building a
+        tree child by child.
+        """
+        node: Optional[Node] = self
+        while node is not None and not node._needs_lightweight_recomputation:
+            node._needs_lightweight_recomputation = True
+            node = node.parent
 
-    # def needs_heavy_recomputation(self):
-    #     self._needs_heavy_recomputation = True
+    def needs_position_recomputation(self, index: int = 0) -> None:
+        """
+        After the children list of the node is modified directly, we need to
+        let the node know that the positions of its children from index onwards
+        are stale. Also invalidates the heavy statistics.
+        """
+        self._stale_positions_from = min(self._stale_positions_from, index)
+        self.needs_heavy_recomputation()
 
-    #     if self._dsu_parent is not self:
-    #         self._dsu_parent.needs_heavy_recomputation()
+    def needs_heavy_recomputation(self) -> None:
+        """
+        After the structure of the tree that contains the node changes, we need
+        to let its nodes know that they need to lazily recompute their heavy
+        statistics. Statistics are computed for a whole tree at once, so either
+        all the nodes of a tree are up to date or none is, and only the version
+        of the root they were computed from is incremented. O(1).
+        """
+        root = self._heavy_root
+        if self._heavy_version == root._structure_version:
+            root._structure_version += 1
 
     # Lightweight statistics properties
 
@@ -220,57 +332,134 @@ class Node:
     @property
     def position_in_parent(self) -> int:
         """
-        The index of this node in its parent's children list.
+        The index of this node in its parent's children list. The positions of
+        the children of a parent are only recomputed after an insertion or
+        removal, and only from the modified index onwards. Amortized O(1) time
+        complexity.
         """
-        # FIXME: This should be recomputed only when needed.
-        if self.parent is None:
-            self._position_in_parent = -1
-        else:
-            # If using .index, the whole library hangs for some reason
-            for idx, child in enumerate(self.parent.children):
-                if child is self:
-                    self._position_in_parent = idx
-                    break
+        parent = self.parent
+        if parent is None:
+            return -1
+
+        siblings = parent.children
+        if parent._stale_positions_from < len(siblings):
+            for idx in range(parent._stale_positions_from, len(siblings)):
+                siblings[idx]._position_in_parent = idx
+            parent._stale_positions_from = len(siblings)
 
         return self._position_in_parent
 
-    # Heavy statistics properties.
-
-    # @property
-    # def idx_pre_ltr(self):
-    #     if self._needs_heavy_recomputation:
-    #         self.recompute_heavy_stats()
-    #     return self._idx_pre_ltr
-
-    # @property
-    # def idx_post_ltr(self):
-    #     if self._needs_heavy_recomputation:
-    #         self.recompute_heavy_stats()
-    #     return self._idx_post_ltr
-
-    # @property
-    # def idx_pre_rtl(self):
-    #     if self._needs_heavy_recomputation:
-    #         self.recompute_heavy_stats()
-    #     return self._idx_pre_rtl
-
-    # @property
-    # def idx_post_rtl(self):
-    #     if self._needs_heavy_recomputation:
-    #         self.recompute_heavy_stats()
-    #     return self._idx_post_rtl
-
-    # @property
-    # def lies_on_rightmost_path(self):
-    #     if self._needs_heavy_recomputation:
-    #         self.recompute_heavy_stats()
-    #     return self._lies_on_rightmost_path
-
-    # @property
-    # def lies_on_leftmost_path(self):
-    #     if self._needs_heavy_recomputation:
-    #         self.recompute_heavy_stats()
-    #     return self._lies_on_leftmost_path
+    # Heavy statistics properties. O(1) time complexity, except for the first
+    # access after the tree was modified, which is O(n)
+
+    @property
+    def idx_pre_ltr(self) -> int:
+        """
+        Index of the node in the left-to-right pre-order traversal of its tree
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        return self._idx_pre_ltr
+
+    @property
+    def idx_post_ltr(self) -> int:
+        """
+        Index of the node in the left-to-right post-order traversal of its tree
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        return self._idx_post_ltr
+
+    @property
+    def idx_pre_rtl(self) -> int:
+        """
+        Index of the node in the right-to-left pre-order traversal of its tree
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        return self._idx_pre_rtl
+
+    @property
+    def idx_post_rtl(self) -> int:
+        """
+        Index of the node in the right-to-left post-order traversal of its
+        tree
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        return self._idx_post_rtl
+
+    @property
+    def lies_on_rightmost_path(self) -> bool:
+        """
+        If the node is on the path from the root of its tree to its rightmost
+        leaf
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        return self._lies_on_rightmost_path
+
+    @property
+    def lies_on_leftmost_path(self) -> bool:
+        """
+        If the node is on the path from the root of its tree to its leftmost
+        leaf
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        return self._lies_on_leftmost_path
+
+    @property
+    def heavy_root(self) -> "Node":
+        """
+        The root of the tree that contains the node
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        return self._heavy_root
+
+    def descendant_range(self) -> range:
+        """
+        The `idx_pre_ltr` indices of the descendants of the node, not including
+        the node itself.
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        return range(self._idx_pre_ltr + 1, self._idx_descendants_end)
+
+    def is_descendant(self, other: "Node") -> bool:
+        """
+        Returns if self is a descendant of other (but not other itself). O(1)
+        time complexity.
+        """
+        if self._heavy_version != self._heavy_root._structure_version:
+            self.recompute_heavy_stats()
+        if other._heavy_version != other._heavy_root._structure_version:
+            other.recompute_heavy_stats()
+
+        return (
+            self._heavy_root is other._heavy_root
+            and other._idx_pre_ltr < self._idx_pre_ltr < other._idx_descendants_end
+        )
+
+    def is_isomorphic(self, other: "Node") -> bool:
+        """
+        Returns if the subtrees rooted at self and other have the same shape,
+        types and labels. Used to rule out hash collisions.
+        """
+        stack: list[tuple[Node, Node]] = [(self, other)]
+        while len(stack) != 0:
+            a, b = stack.pop()
+            if (
+                a.type != b.type
+                or (a.label or "") != (b.label or "")
+                or len(a.children) != len(b.children)
+            ):
+                return False
+
+            stack.extend(zip(a.children, b.children, strict=True))
+
+        return True
 
     # Tree modification methods
 
@@ -281,10 +470,15 @@ class Node:
         """
         self.children.append(child)
         child.parent = self
-        # child._dsu_parent = self._dsu_parent
+        child._position_in_parent = len(self.children) - 1
+        if self._stale_positions_from == len(self.children) - 1:
+            self._stale_positions_from += 1
 
-        child.needs_lightweight_recomputation()
-        # child.needs_heavy_recomputation()
+        # The statistics of the child do not depend on its parent, but its
+        # indices do
+        self.needs_lightweight_recomputation()
+        self.needs_heavy_recomputation()
+        child.needs_heavy_recomputation()
 
     def children_insert(self, index: int, child: "Node") -> None:
         """
@@ -293,26 +487,27 @@ class Node:
         """
         self.children.insert(index, child)
         child.parent = self
-        # child._dsu_parent = self._dsu_parent
+        self.needs_position_recomputation(index)
+        child.needs_heavy_recomputation()
 
-        child.needs_lightweight_recomputation()
-        # child.needs_heavy_recomputation()
+        self.needs_lightweight_recomputation()
 
     def children_remove(self, child: "Node") -> None:
         """
         Removes the specified child from the node's children and sets the parent
         of the child to None.
         """
-        self.children.remove(child)
+        position = child.position_in_parent if child.parent is self else -1
+        if position == -1 or self.children[position] is not child:
+            # Raises ValueError if child is not in the children list
+            position = self.children.index(child)
+
+        self.children.pop(position)
         child.parent = None
-        # for node in child.pre_order():
-        #     node._dsu_parent = node
+        child._position_in_parent = -1
+        self.needs_position_recomputation(position)
 
         self.needs_lightweight_recomputation()
-        # self.needs_heavy_recomputation()
-
-        child.needs_lightweight_recomputation()
-        # child.needs_heavy_recomputation()
 
     def set_parent(self, parent: Optional["Node"]) -> None:
         """
@@ -328,35 +523,60 @@ class Node:
 
     # Traversal generators
 
+    # The traversals use explicit stacks rather than recursion, so each step
+    # is O(1) regardless of depth and deep trees do not hit the recursion
+    # limit. With rtl=True, the children of every node are visited right to
+    # left.
+
     def pre_order(self, skip_self: bool = False, rtl: bool = False) -> Iterator["Node"]:
         if not skip_self:
             yield self
 
-        if not rtl:
-            for child in self.children:
-                yield from child.pre_order()
-        else:
-            for child in reversed(self.children):
-                yield from child.pre_order()
+        stack: list[Node] = (
+            list(self.children) if rtl else list(reversed(self.children))
+        )
+        while len(stack) != 0:
+            node = stack.pop()
+            yield node
+
+            if len(node.children) == 0:
+                continue
+            if rtl:
+                stack.extend(node.children)
+            else:
+                stack.extend(reversed(node.children))
 
     def post_order(
         self, skip_self: bool = False, rtl: bool = False
     ) -> Iterator["Node"]:
-        if not rtl:
-            for child in self.children:
-                yield from child.post_order()
-        else:
-            for child in reversed(self.children):
-                yield from child.post_order()
-
-        if not skip_self:
-            yield self
+        stack: list[tuple[Node, Iterator[Node]]] = [
+            (self, reversed(self.children) if rtl else iter(self.children))
+        ]
+        while len(stack) != 0:
+            node, children = stack[-1]
+            child = next(children, None)
+
+            if child is not None:
+                if len(child.children) == 0:
+                    yield child
+                else:
+                    stack.append(
+                        (
+                            child,
+                            reversed(child.children) if rtl else iter(child.children),
+                        )
+                    )
+                continue
+
+            stack.pop()
+            if node is not self or not skip_self:
+                yield node
 
     def bfs(self) -> Iterator["Node"]:
-        queue: list[Node] = [self]
+        queue: deque[Node] = deque([self])
 
         while len(queue) != 0:
-            node = queue.pop(0)
+            node = queue.popleft()
             queue.extend(node.children)
             yield node
 
@@ -382,7 +602,7 @@ class Node:
         return f"{self.__class__.__name__}({', '.join(a)})"
 
 
-@dataclass
+@dataclass(slots=True)
 class MappingDict:
     src_to_dst: dict[Node, Node] = field(default_factory=dict)
     dst_to_src: dict[Node, Node] = field(default_factory=dict)
@@ -399,9 +619,11 @@ class MappingDict:
         self.dst_to_src[dst] = src
 
     def put_recursively(self, src: Node, dst: Node) -> None:
-        self.put(src, dst)
-        for i in range(len(src.children)):
-            self.put_recursively(src.children[i], dst.children[i])
+        stack: list[tuple[Node, Node]] = [(src, dst)]
+        while len(stack) != 0:
+            src, dst = stack.pop()
+            self.put(src, dst)
+            stack.extend(reversed(list(zip(src.children, dst.children, strict=True))))
 
     def pop(self, src: Node, dst: Node) -> tuple[Node, Node]:
         return (self.src_to_dst.pop(src), self.dst_to_src.pop(dst))
@@ -438,7 +660,7 @@ class MappingDict:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class NodePriorityQueue:
     """
     A priority queue for nodes. The priority is the height of the node, with
@@ -525,7 +747,14 @@ class NodePriorityQueue:
         return True
 
 
-@dataclass
+def _rehydrate_orig_node(orig_node: Any, tree: Optional[Any]) -> Optional[Any]:
+    # Duck typed, so that models does not depend on any loader
+    if tree is not None and hasattr(orig_node, "rehydrate"):
+        return orig_node.rehydrate(tree)
+    return orig_node
+
+
+@dataclass(slots=True)
 class Insert:
     node: Node
     parent: Node
@@ -540,8 +769,15 @@ class Insert:
     def orig_node(self, value: Optional[Any]) -> None:
         self.node.orig_node = value
 
+    def get_orig_node(self, tree: Optional[Any] = None) -> Optional[Any]:
+        """
+        Same as orig_node, but nodes loaded with retain="range" are looked up
+        in tree, the tree they were loaded from.
+        """
+        return _rehydrate_orig_node(self.node.orig_node, tree)
+
 
-@dataclass
+@dataclass(slots=True)
 class Update:
     node: Node
     old_label: Optional[str]
@@ -555,8 +791,15 @@ class Update:
     def orig_node(self, value: Optional[Any]) -> None:
         self.node.orig_node = value
 
+    def get_orig_node(self, tree: Optional[Any] = None) -> Optional[Any]:
+        """
+        Same as orig_node, but nodes loaded with retain="range" are looked up
+        in tree, the tree they were loaded from.
+        """
+        return _rehydrate_orig_node(self.node.orig_node, tree)
+
 
-@dataclass
+@dataclass(slots=True)
 class Move:
     node: Node
     parent: Node
@@ -570,8 +813,15 @@ class Move:
     def orig_node(self, value: Optional[Any]) -> None:
         self.node.orig_node = value
 
+    def get_orig_node(self, tree: Optional[Any] = None) -> Optional[Any]:
+        """
+        Same as orig_node, but nodes loaded with retain="range" are looked up
+        in tree, the tree they were loaded from.
+        """
+        return _rehydrate_orig_node(self.node.orig_node, tree)
+
 
-@dataclass
+@dataclass(slots=True)
 class Delete:
     node: Node
 
@@ -583,5 +833,12 @@ class Delete:
     def orig_node(self, value: Optional[Any]) -> None:
         self.node.orig_node = value
 
+    def get_orig_node(self, tree: Optional[Any] = None) -> Optional[Any]:
+        """
+        Same as orig_node, but nodes loaded with retain="range" are looked up
+        in tree, the tree they were loaded from.
+        """
+        return _rehydrate_orig_node(self.node.orig_node, tree)
+
 
 Action = Insert | Update | Move | Delete
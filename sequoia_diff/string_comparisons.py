@@ -1,4 +1,200 @@
 import difflib
+import sys
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import lru_cache
+
+try:
+    from rapidfuzz.distance import Levenshtein as rapidfuzz_levenshtein
+except ImportError:
+    rapidfuzz_levenshtein = None  # type: ignore[assignment]
+
+# difflib.SequenceMatcher treats the popular elements of sequences of at least
+# this many elements as junk (autojunk). Longer sequences of tri-grams are left
+# to difflib so that the results stay the same.
+AUTOJUNK_MIN_LENGTH = 200
+
+# Default number of label pairs remembered by a `LabelDistanceCache`
+LABEL_DISTANCE_CACHE_SIZE = 1 << 16
+
+
+class StringDistanceBackend(ABC):
+    """
+    Computes the distances between labels used by the matchers. See
+    `distance_backend`.
+    """
+
+    @abstractmethod
+    def levenshtein_distance(self, s1: str, s2: str) -> int:
+        """
+        Returns the minimum number of insertions, deletions and substitutions
+        of characters needed to turn s1 into s2.
+        """
+        ...
+
+    @abstractmethod
+    def matching_tri_grams(self, trigrams1: list[str], trigrams2: list[str]) -> int:
+        """
+        Returns the number of tri-grams of trigrams1 matched to a tri-gram of
+        trigrams2.
+        """
+        ...
+
+
+class DifflibBackend(StringDistanceBackend):
+    """
+    Reference implementation. The Levenshtein distance is a dynamic program
+    over the two strings and the tri-grams are matched by
+    difflib.SequenceMatcher (Ratcliff/Obershelp).
+    """
+
+    def levenshtein_distance(self, s1: str, s2: str) -> int:
+        if len(s1) < len(s2):
+            s1, s2 = s2, s1
+
+        if len(s2) == 0:
+            return len(s1)
+
+        previous_row = list(range(len(s2) + 1))
+        for i, c1 in enumerate(s1):
+            current_row = [i + 1]
+            for j, c2 in enumerate(s2):
+                insertions = previous_row[j + 1] + 1
+                deletions = current_row[j] + 1
+                substitutions = previous_row[j] + (c1 != c2)
+                current_row.append(min(insertions, deletions, substitutions))
+            previous_row = current_row
+
+        return previous_row[-1]
+
+    def matching_tri_grams(self, trigrams1: list[str], trigrams2: list[str]) -> int:
+        matcher = difflib.SequenceMatcher(None, trigrams1, trigrams2)
+        return sum(n for _, _, n in matcher.get_matching_blocks())
+
+
+class BitParallelBackend(DifflibBackend):
+    """
+    Same results as `DifflibBackend`, faster. The Levenshtein distance is
+    computed a column at a time with bit vectors (Myers/Hyyrö), and the
+    tri-grams are matched without the overhead of difflib.SequenceMatcher.
+
+    Myers, "A fast bit-vector algorithm for approximate string matching based
+    on dynamic programming" (1999) and Hyyrö, "A bit-vector algorithm for
+    computing Levenshtein and Damerau edit distances" (2003).
+    """
+
+    def levenshtein_distance(self, s1: str, s2: str) -> int:
+        # The bits of the vectors are the characters of the shorter string
+        if len(s1) < len(s2):
+            s1, s2 = s2, s1
+
+        if len(s2) == 0:
+            return len(s1)
+
+        peq: dict[str, int] = {}
+        for i, c in enumerate(s2):
+            peq[c] = peq.get(c, 0) | (1 << i)
+
+        mask = (1 << len(s2)) - 1
+        last = 1 << (len(s2) - 1)
+        pv = mask  # Vertical differences of +1
+        mv = 0  # Vertical differences of -1
+        score = len(s2)
+
+        for c in s1:
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+
+        return score
+
+    def matching_tri_grams(self, trigrams1: list[str], trigrams2: list[str]) -> int:
+        if len(trigrams2) >= AUTOJUNK_MIN_LENGTH:
+            return super().matching_tri_grams(trigrams1, trigrams2)
+
+        b2j: dict[str, list[int]] = {}
+        for j, trigram in enumerate(trigrams2):
+            b2j.setdefault(trigram, []).append(j)
+
+        if b2j.keys().isdisjoint(trigrams1):
+            return 0
+
+        # Same as difflib.SequenceMatcher.get_matching_blocks without junk: the
+        # longest common block, leftmost in trigrams1 then in trigrams2, is
+        # matched and both sides of it are matched recursively.
+        matches = 0
+        queue = [(0, len(trigrams1), 0, len(trigrams2))]
+        while queue:
+            alo, ahi, blo, bhi = queue.pop()
+            best_i = best_j = best_size = 0
+            j2len: dict[int, int] = {}
+            for i in range(alo, ahi):
+                new_j2len: dict[int, int] = {}
+                for j in b2j.get(trigrams1[i], ()):
+                    if j < blo:
+                        continue
+                    if j >= bhi:
+                        break
+                    k = new_j2len[j] = j2len.get(j - 1, 0) + 1
+                    if k > best_size:
+                        best_i, best_j, best_size = i - k + 1, j - k + 1, k
+                j2len = new_j2len
+
+            if best_size:
+                matches += best_size
+                if alo < best_i and blo < best_j:
+                    queue.append((alo, best_i, blo, best_j))
+                if best_i + best_size < ahi and best_j + best_size < bhi:
+                    queue.append((best_i + best_size, ahi, best_j + best_size, bhi))
+
+        return matches
+
+
+class RapidFuzzBackend(BitParallelBackend):
+    """
+    `BitParallelBackend` with the Levenshtein distance of RapidFuzz. The
+    tri-grams are still matched by `BitParallelBackend`, because the ratios of
+    RapidFuzz are based on the longest common subsequence rather than
+    Ratcliff/Obershelp. Requires the optional `rapidfuzz` dependency.
+    """
+
+    def __init__(self) -> None:
+        if rapidfuzz_levenshtein is None:
+            raise ImportError("RapidFuzzBackend requires rapidfuzz")
+
+    def levenshtein_distance(self, s1: str, s2: str) -> int:
+        return rapidfuzz_levenshtein.distance(s1, s2)
+
+
+class MultisetBackend(BitParallelBackend):
+    """
+    Matches the tri-grams as multisets, regardless of their order. This is
+    linear in the length of the labels but, unlike the other backends, can match
+    more tri-grams than difflib.SequenceMatcher, so the distances are lower or
+    equal and the mappings may change.
+    """
+
+    def matching_tri_grams(self, trigrams1: list[str], trigrams2: list[str]) -> int:
+        return sum((Counter(trigrams1) & Counter(trigrams2)).values())
+
+
+# Backend of the functions below. Set it before diffing to change how labels are
+# compared, e.g. `string_comparisons.distance_backend = MultisetBackend()`.
+distance_backend: StringDistanceBackend = (
+    BitParallelBackend() if rapidfuzz_levenshtein is None else RapidFuzzBackend()
+)
 
 
 def levenshtein_distance(s1: str | None, s2: str | None) -> int:
@@ -7,23 +203,7 @@ def levenshtein_distance(s1: str | None, s2: str | None) -> int:
     if s2 is None:
         s2 = ""
 
-    if len(s1) < len(s2):
-        s1, s2 = s2, s1
-
-    if len(s2) == 0:
-        return len(s1)
-
-    previous_row = list(range(len(s2) + 1))
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-
-    return previous_row[-1]
+    return distance_backend.levenshtein_distance(s1, s2)
 
 
 def normalized_levenshtein_distance(s1: str | None, s2: str | None) -> float:
@@ -55,11 +235,16 @@ def normalized_tri_gram_distance(a: str | None, b: str | None) -> float:
     if b is None:
         b = ""
 
-    trigrams1 = generate_trigrams(a)
-    trigrams2 = generate_trigrams(b)
+    # Every tri-gram of equal strings is matched
+    if a == b:
+        return 0.0
+
+    return _normalized_tri_gram_distance(generate_trigrams(a), generate_trigrams(b))
 
-    matcher = difflib.SequenceMatcher(None, trigrams1, trigrams2)
-    similarity_ratio = matcher.ratio()
+
+def _normalized_tri_gram_distance(trigrams1: list[str], trigrams2: list[str]) -> float:
+    matches = distance_backend.matching_tri_grams(trigrams1, trigrams2)
+    similarity_ratio = 2.0 * matches / (len(trigrams1) + len(trigrams2))
 
     return 1.0 - similarity_ratio  # Distance is 1 - similarity ratio
 
@@ -70,11 +255,56 @@ def tri_gram_distance(a: str | None, b: str | None) -> int:
     if b is None:
         b = ""
 
+    if a == b:
+        return 0
+
     trigrams1 = generate_trigrams(a)
     trigrams2 = generate_trigrams(b)
 
-    matcher = difflib.SequenceMatcher(None, trigrams1, trigrams2)
-    matches = sum(n for _, _, n in matcher.get_matching_blocks())
+    matches = distance_backend.matching_tri_grams(trigrams1, trigrams2)
     total_trigrams = len(trigrams1) + len(trigrams2)
 
     return total_trigrams - 2 * matches
+
+
+class LabelDistanceCache:
+    """
+    Bounded LRU cache of `normalized_tri_gram_distance`, keyed by pairs of
+    interned labels, next to an LRU cache of the tri-grams of up to maxsize
+    labels. Meant to be shared by the matchers of a diff, for instance by every
+    `match_last_chance` of a `match_greedy_bottom_up`, or by several diffs
+    through `get_tree_diff`: changing `distance_backend` afterwards is not seen
+    by the cached distances.
+
+    `hits` and `misses` count the lookups of pairs of different labels, to help
+    tune maxsize. Pairs of equal labels are not cached.
+    """
+
+    def __init__(self, maxsize: int = LABEL_DISTANCE_CACHE_SIZE) -> None:
+        self._trigrams = lru_cache(maxsize=maxsize)(generate_trigrams)
+        self._distance = lru_cache(maxsize=maxsize)(self._compute_distance)
+
+    @property
+    def hits(self) -> int:
+        return self._distance.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        return self._distance.cache_info().misses
+
+    def normalized_tri_gram_distance(self, a: str | None, b: str | None) -> float:
+        """
+        Same as `normalized_tri_gram_distance`.
+        """
+        if a is None:
+            a = ""
+        if b is None:
+            b = ""
+
+        if a == b:
+            return 0.0
+
+        return self._distance(sys.intern(a), sys.intern(b))
+
+    def _compute_distance(self, a: str, b: str) -> float:
+        return _normalized_tri_gram_distance(self._trigrams(a), self._trigrams(b))
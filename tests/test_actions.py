@@ -1,12 +1,16 @@
+import random
 import unittest
 
 from sequoia_diff.actions import (
     align_children,
     find_pos,
+    generate_chawathe_edit_script,
     generate_simplified_chawathe_edit_script,
     lcs,
+    myers_lcs,
+    unique_lcs,
 )
-from sequoia_diff.models import Action, MappingDict, Move, Node
+from sequoia_diff.models import Action, Delete, Insert, MappingDict, Move, Node, Update
 from tests.util import node
 
 
@@ -97,6 +101,126 @@ class TestAlignChildren(unittest.TestCase):
         actions = align_children(src, dst, src_in_order, dst_in_order, mappings)
         self.assertEqual(actions, expected_actions)
 
+    def test_shuffled_children(self):
+        rng = random.Random(0)
+        labels = [str(i) for i in range(200)]
+        shuffled = rng.sample(labels, len(labels))
+        src = node("src", children=[node(label) for label in labels])
+        dst = node("dst", children=[node(label) for label in shuffled])
+
+        mappings = MappingDict()
+        for child in src.children:
+            mappings.put(child, dst.children[shuffled.index(child.label)])
+
+        # Applying the moves one by one gives the same order
+        expected = list(src.children)
+        actions = align_children(src, dst, set(), set(), mappings)
+        for action in actions:
+            expected.remove(action.node)
+            expected.insert(action.pos, action.node)
+
+        self.assertEqual(src.children, expected)
+        self.assertEqual([child.label for child in src.children], shuffled)
+        self.assertEqual(
+            [child.position_in_parent for child in src.children], list(range(200))
+        )
+        self.assertEqual(len(actions), len(labels) - len(lcs(labels, shuffled)))
+
+
+class TestChawatheEditScript(unittest.TestCase):
+    def test_src_is_not_modified(self):
+        src = node("root", children=[node("a"), node("b", children=[node("c")])])
+        dst = node("root", children=[node("b", children=[node("c"), node("a")])])
+        src_str = src.pretty_str()
+        src_nodes = list(src.pre_order())
+
+        mapping = MappingDict()
+        mapping.put(src, dst)
+        mapping.put(src.children[0], dst.children[0].children[1])
+        mapping.put(src.children[1], dst.children[0])
+        mapping.put(src.children[1].children[0], dst.children[0].children[0])
+
+        actions = generate_chawathe_edit_script(mapping, src, dst)
+        self.assertEqual(actions, [Move(src.children[0], src.children[1], 1)])
+        self.assertEqual(src.pretty_str(), src_str)
+        self.assertEqual(list(src.pre_order()), src_nodes)
+        self.assertIsNone(dst.parent)
+
+    def test_simplified_collapses_complete_subtrees(self):
+        a = node("a", children=[node("b"), node("c")])
+        y = node("y", children=[node("z", children=[node("w")])])
+        src = node("root", children=[a, node("x"), y])
+        n = node("n", children=[node("m"), node("o", children=[node("p")])])
+        q = node("q", children=[node("c")])
+        dst = node("root", children=[node("x"), n, q])
+
+        mapping = MappingDict()
+        mapping.put(src, dst)
+        mapping.put(src.children[1], dst.children[0])
+        mapping.put(a.children[1], q.children[0])
+
+        # Only the subtrees of n and y are fully inserted or deleted
+        actions = generate_simplified_chawathe_edit_script(mapping, src, dst)
+        self.assertEqual(
+            actions,
+            [
+                Insert(n, src, 2, whole_subtree=True),
+                Insert(q, src, 3, whole_subtree=False),
+                Move(a.children[1], q, 0),
+                Delete(a.children[0]),
+                Delete(a),
+                Delete(y),
+            ],
+        )
+
+    def test_simplified_collapses_insert_delete_pairs(self):
+        x = node("x", children=[node("p"), node("q")])
+        y = node("y", children=[node("r"), node("s"), node("t")])
+        src = node("root", children=[node("a", children=[x, y]), node("b"), node("m")])
+        dst = node(
+            "root",
+            children=[
+                node("a"),
+                node("b", children=[node("x", children=[node("p"), node("q")])]),
+                node("y", children=[node("r"), node("s"), Node(type="t", label="u")]),
+                Node(type="m", label="n"),
+            ],
+        )
+
+        mapping = MappingDict()
+        for a, b in zip(src.children[:2], dst.children[:2], strict=True):
+            mapping.put(a, b)
+        mapping.put(src, dst)
+
+        actions = generate_simplified_chawathe_edit_script(mapping, src, dst)
+        self.assertEqual(
+            actions,
+            [
+                Insert(dst.children[2], src, 2, whole_subtree=True),
+                Insert(dst.children[3], src, 3, whole_subtree=True),
+                Insert(dst.children[1].children[0], src.children[1], 0, True),
+                Delete(x),
+                Delete(y),
+                Delete(src.children[2]),
+            ],
+        )
+
+        # x moves as is and y with an update. m and n differ by their only
+        # label, so they are not collapsed.
+        actions = generate_simplified_chawathe_edit_script(
+            mapping, src, dst, collapse_pairs=True
+        )
+        self.assertEqual(
+            actions,
+            [
+                Move(y, src, 2),
+                Update(y.children[2], "t", "u"),
+                Insert(dst.children[3], src, 3, whole_subtree=True),
+                Move(x, src.children[1], 0),
+                Delete(src.children[2]),
+            ],
+        )
+
 
 class TestFindPos(unittest.TestCase):
     def test_node_with_no_parent(self):
@@ -242,3 +366,59 @@ class TestLCS(unittest.TestCase):
         y = ["x", "b", "c", "f", "d"]
         expected_result = [("b", "b"), ("c", "c"), ("d", "d")]
         self.assertEqual(lcs(x, y), expected_result)
+
+    def test_myers_lcs_same_length_as_lcs(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            x = rng.choices("abc", k=rng.randint(0, 20))
+            y = rng.choices("abc", k=rng.randint(0, 20))
+            result = myers_lcs(x, y)
+
+            self.assertEqual(len(result), len(lcs(x, y)))
+            self.assertTrue(all(a == b for a, b in result))
+
+    def test_myers_lcs_with_any_matches(self):
+        # Any pairs may match, so that equality is not transitive
+        rng = random.Random(0)
+        for _ in range(500):
+            x = list(range(rng.randint(0, 20)))
+            y = list(range(rng.randint(0, 20)))
+            matches = {(i, j) for i in x for j in y if rng.random() < 0.3}
+
+            def equal(i: int, j: int, matches=matches) -> bool:
+                return (i, j) in matches
+
+            result = myers_lcs(x, y, equal)
+            self.assertEqual(len(result), len(lcs(x, y, equal)))
+            self.assertTrue(all(equal(i, j) for i, j in result))
+            self.assertEqual([i for i, _ in result], sorted({i for i, _ in result}))
+            self.assertEqual([j for _, j in result], sorted({j for _, j in result}))
+
+    def test_myers_lcs_max_d(self):
+        x = list("apqrsz")
+        y = list("a1p2q3r4s5z")
+
+        # D is 5
+        self.assertEqual(len(myers_lcs(x, y, max_d=5)), 6)
+        self.assertEqual(myers_lcs(x, y, max_d=0), [("a", "a"), ("z", "z")])
+
+    def test_myers_lcs_with_custom_equality_func(self):
+        x = [1, 2, 3, 4]
+        y = [3, 4, 5]
+        expected_result = [(2, 3), (3, 4), (4, 5)]
+        self.assertEqual(myers_lcs(x, y, lambda a, b: a + 1 == b), expected_result)
+
+    def test_unique_lcs_same_pairs_as_lcs(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            x = list(range(rng.randint(0, 15)))
+            y = [f"y{j}" for j in range(rng.randint(0, 15))]
+            n_partners = rng.randint(0, min(len(x), len(y)))
+            partners = dict(
+                zip(rng.sample(y, n_partners), rng.sample(x, n_partners), strict=True)
+            )
+
+            self.assertEqual(
+                unique_lcs(x, y, partners.get),
+                lcs(x, y, lambda a, b, partners=partners: a == partners.get(b)),
+            )
@@ -0,0 +1,132 @@
+import os
+import random
+import unittest
+
+import yaml
+
+from sequoia_diff.apted import APTED, CostModel, TriGramCostModel, match_apted
+from sequoia_diff.loaders import PATH_TS_RULES, from_tree_sitter_tree
+from sequoia_diff.matching import match_rted
+from sequoia_diff.models import LanguageRuleSet, MappingDict, Node
+from tests.util import PATH_DATA, TS_LANGUAGE_JAVA, node, read_and_parse_tree
+
+
+def random_tree(rng: random.Random, n_nodes: int) -> Node:
+    nodes = [Node(type="a", label=None)]
+    for _ in range(n_nodes - 1):
+        child = Node(type=rng.choice("ab"), label=rng.choice(["x", "xy", "yz", None]))
+        parent = rng.choice(nodes)
+        parent.children_insert(rng.randint(0, len(parent.children)), child)
+        nodes.append(child)
+
+    return nodes[0]
+
+
+def mapping_cost(
+    mappings: MappingDict, src: Node, dst: Node, cost_model: CostModel
+) -> float:
+    """
+    Cost of the edit script with add, delete and update actions of mappings.
+    """
+    result = 0.0
+    for x in src.pre_order():
+        if x in mappings.src_to_dst:
+            result += cost_model.update(x, mappings.src_to_dst[x])
+        else:
+            result += cost_model.delete(x)
+    for y in dst.pre_order():
+        if y not in mappings.dst_to_src:
+            result += cost_model.insert(y)
+
+    return result
+
+
+class TestAPTED(unittest.TestCase):
+    def test_same_distance_as_rted(self):
+        rng = random.Random(0)
+        cost_model = TriGramCostModel()
+
+        for _ in range(100):
+            src = random_tree(rng, rng.randint(1, 30))
+            dst = random_tree(rng, rng.randint(1, 30))
+
+            expected = mapping_cost(
+                match_rted(MappingDict(), src, dst), src, dst, cost_model
+            )
+
+            apted = APTED(src, dst)
+            self.assertAlmostEqual(apted.compute_distance(), expected)
+
+            mappings = apted.compute_mapping(MappingDict())
+            self.assertAlmostEqual(
+                mapping_cost(mappings, src, dst, cost_model), expected
+            )
+
+    def test_every_path_type(self):
+        rng = random.Random(1)
+
+        for _ in range(30):
+            src = random_tree(rng, rng.randint(1, 30))
+            dst = random_tree(rng, rng.randint(1, 30))
+            expected = APTED(src, dst).compute_distance()
+
+            # Decompose every subtree pair along the same path type, in the src
+            # tree (0, 1, 2) or in the dst tree (3, 4, 5)
+            for option in range(6):
+                apted = APTED(src, dst)
+                apted.strategy = [[option] * dst.size for _ in range(src.size)]
+                self.assertAlmostEqual(apted.compute_distance(), expected)
+
+    def test_skewed_trees(self):
+        # Right-deep trees, like `else if` cascades, are decomposed along right
+        # paths
+        src, dst = node("x"), node("x")
+        for i in range(30):
+            src = node("if", children=[node("cond"), src])
+            dst = node("if", children=[node("cond" if i % 5 else "other"), dst])
+
+        apted = APTED(src, dst)
+        self.assertEqual(apted.compute_distance(), 12.0)
+        self.assertEqual(apted.strategy[0][0], 1)
+
+        mappings = apted.compute_mapping(MappingDict())
+        self.assertEqual(len(mappings), src.size - 6)
+
+    def test_cost_model(self):
+        class ExpensiveDeletes(TriGramCostModel):
+            def delete(self, node: Node) -> float:
+                return 3.0
+
+        src = node("root", children=[node("a"), node("b")])
+        dst = node("root", children=[node("a")])
+
+        self.assertEqual(APTED(src, dst).compute_distance(), 1.0)
+        self.assertEqual(APTED(src, dst, ExpensiveDeletes()).compute_distance(), 3.0)
+
+    def test_java_test_cases(self):
+        path_my_data = os.path.join(PATH_DATA, "test_sequoia_diff")
+        with open(PATH_TS_RULES, "r") as f:
+            java_rules = LanguageRuleSet.model_validate(yaml.safe_load(f)).root.get(
+                "java"
+            )
+
+        for test_case_name in ["0", "1", "2", "3"]:
+            src, dst = [
+                from_tree_sitter_tree(
+                    read_and_parse_tree(
+                        TS_LANGUAGE_JAVA,
+                        os.path.join(path_my_data, test_case_name, file_name),
+                    ),
+                    java_rules,
+                )
+                for file_name in ["before.java", "after.java"]
+            ]
+
+            cost_model = TriGramCostModel()
+            self.assertAlmostEqual(
+                mapping_cost(
+                    match_apted(MappingDict(), src, dst), src, dst, cost_model
+                ),
+                mapping_cost(match_rted(MappingDict(), src, dst), src, dst, cost_model),
+                msg="Failed on test case: " + test_case_name,
+            )
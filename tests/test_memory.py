@@ -0,0 +1,61 @@
+import tracemalloc
+import unittest
+
+from sequoia_diff.models import Delete, Insert, MappingDict, Move, Node, Update
+from tests.util import node
+
+# Budgets in bytes, measured with tracemalloc. Lower them when memory usage
+# improves, so that regressions are caught.
+BYTES_PER_NODE = 500
+BYTES_PER_ACTION = 100
+
+# Shared by every tree, so they are not counted
+LABELS = [f"var{i}" for i in range(50)]
+
+
+def wide_tree(n_children: int) -> Node:
+    root = Node(type="block", label=None)
+    for i in range(n_children):
+        root.children_append(Node(type="identifier", label=LABELS[i % len(LABELS)]))
+
+    return root
+
+
+class TestMemory(unittest.TestCase):
+    def test_no_instance_dicts(self):
+        root = node("a", children=[node("b")])
+        objects = [
+            root,
+            MappingDict(),
+            Insert(root.children[0], root, 0),
+            Update(root, "a", "b"),
+            Move(root.children[0], root, 0),
+            Delete(root),
+        ]
+        for obj in objects:
+            self.assertFalse(hasattr(obj, "__dict__"), type(obj).__name__)
+
+    def test_bytes_per_node(self):
+        n_nodes = 10_000
+
+        tracemalloc.start()
+        root = wide_tree(n_nodes - 1)
+        # Compute the lightweight and heavy statistics
+        self.assertEqual(root.size, n_nodes)
+        self.assertEqual(root.idx_pre_ltr, 0)
+        bytes_per_node = tracemalloc.get_traced_memory()[0] / n_nodes
+        tracemalloc.stop()
+
+        self.assertLess(bytes_per_node, BYTES_PER_NODE, f"{bytes_per_node:.0f} B/node")
+
+    def test_bytes_per_action(self):
+        root = wide_tree(10_000)
+
+        tracemalloc.start()
+        actions = [Move(child, root, i) for i, child in enumerate(root.children)]
+        bytes_per_action = tracemalloc.get_traced_memory()[0] / len(actions)
+        tracemalloc.stop()
+
+        self.assertLess(
+            bytes_per_action, BYTES_PER_ACTION, f"{bytes_per_action:.0f} B/action"
+        )
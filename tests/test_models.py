@@ -1,8 +1,10 @@
 import logging
+import sys
 import unittest
 from hashlib import sha256
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+from sequoia_diff.hashing import FastHashStrategy, Sha256HashStrategy
 from sequoia_diff.models import Delete, Insert, Move, Node, Update
 from tests.util import node
 
@@ -38,6 +40,7 @@ class TestNode(unittest.TestCase):
         self.assertEqual(copy.children[0].type, self.child1.type)
         self.assertEqual(copy.children[1].type, self.child2.type)
 
+    @patch.object(Node, "hash_strategy", Sha256HashStrategy())
     def test_recompute_lightweight_stats(self):
         self.root.children_append(self.child1)
         self.root.children_append(self.child2)
@@ -93,6 +96,103 @@ class TestNode(unittest.TestCase):
         self.assertIn(self.child1, self.root.children)
         self.assertEqual(self.root.size, 3)
 
+    def test_position_in_parent(self):
+        self.assertEqual(self.root.position_in_parent, -1)
+
+        self.root.children_append(self.child1)
+        self.root.children_append(self.child2)
+        self.assertEqual(self.child1.position_in_parent, 0)
+        self.assertEqual(self.child2.position_in_parent, 1)
+
+        new_child = Node(type="new_child", label="new_child_node")
+        self.root.children_insert(1, new_child)
+        self.assertEqual(self.child1.position_in_parent, 0)
+        self.assertEqual(new_child.position_in_parent, 1)
+        self.assertEqual(self.child2.position_in_parent, 2)
+
+        self.root.children_remove(self.child1)
+        self.assertEqual(self.child1.position_in_parent, -1)
+        self.assertEqual(new_child.position_in_parent, 0)
+        self.assertEqual(self.child2.position_in_parent, 1)
+
+        # Direct modifications of the children list must be signaled
+        self.root.children.reverse()
+        self.root.needs_position_recomputation()
+        self.assertEqual(self.child2.position_in_parent, 0)
+        self.assertEqual(new_child.position_in_parent, 1)
+
+    def test_heavy_stats(self):
+        self.root.children_append(self.child1)
+        self.root.children_append(self.child2)
+        child1_1 = Node(type="child1_1", label="child_node_1_1")
+        self.child1.children_append(child1_1)
+
+        nodes = [self.root, self.child1, child1_1, self.child2]
+        self.assertEqual([n.idx_pre_ltr for n in nodes], [0, 1, 2, 3])
+        self.assertEqual([n.idx_post_ltr for n in nodes], [3, 1, 0, 2])
+        self.assertEqual([n.idx_pre_rtl for n in nodes], [0, 2, 3, 1])
+        self.assertEqual([n.idx_post_rtl for n in nodes], [3, 2, 1, 0])
+        self.assertEqual(
+            [n.lies_on_leftmost_path for n in nodes], [True, True, True, False]
+        )
+        self.assertEqual(
+            [n.lies_on_rightmost_path for n in nodes], [True, False, False, True]
+        )
+        self.assertIs(child1_1.heavy_root, self.root)
+
+        self.assertEqual(self.root.descendant_range(), range(1, 4))
+        self.assertEqual(self.child1.descendant_range(), range(2, 3))
+        self.assertEqual(self.child2.descendant_range(), range(4, 4))
+
+        self.assertTrue(child1_1.is_descendant(self.root))
+        self.assertTrue(child1_1.is_descendant(self.child1))
+        self.assertFalse(child1_1.is_descendant(self.child2))
+        self.assertFalse(self.root.is_descendant(self.root))
+        self.assertFalse(self.root.is_descendant(child1_1))
+
+        # Modifications invalidate the statistics
+        self.child1.children_remove(child1_1)
+        self.child2.children_append(child1_1)
+        self.assertTrue(child1_1.is_descendant(self.child2))
+        self.assertFalse(child1_1.is_descendant(self.child1))
+        self.assertEqual(self.child2.idx_pre_ltr, 2)
+
+        # Nodes in different trees are never descendants of each other
+        other = Node(type="other", label="other_node")
+        self.assertFalse(other.is_descendant(self.root))
+
+    def test_heavy_stats_per_tree(self):
+        self.root.children_append(self.child1)
+        other = node("other", children=[node("a"), node("b", children=[node("c")])])
+        self.assertEqual(self.child1.idx_pre_ltr, 1)
+        self.assertEqual(other.children[1].idx_pre_ltr, 2)
+
+        # Modifying another tree does not invalidate the statistics
+        with patch.object(
+            Node, "recompute_heavy_stats", autospec=True
+        ) as recompute_heavy_stats:
+            other.children_append(Node(type="d", label=None))
+            other.children_remove(other.children[0])
+            self.assertEqual(self.child1.idx_pre_ltr, 1)
+            self.assertTrue(self.child1.is_descendant(self.root))
+            recompute_heavy_stats.assert_not_called()
+
+        # A subtree moved from a tree whose statistics are up to date
+        self.assertEqual(other.descendant_range(), range(1, 4))
+        b = other.children[0]
+        b.set_parent(self.child1)
+        self.assertIs(b.children[0].heavy_root, self.root)
+        self.assertEqual([n.idx_pre_ltr for n in self.root.pre_order()], [0, 1, 2, 3])
+        self.assertEqual(other.descendant_range(), range(1, 2))
+        self.assertFalse(b.is_descendant(other))
+
+        # A whole tree whose statistics are up to date attached to another
+        self.assertEqual(self.child2.idx_pre_ltr, 0)
+        self.child1.children_insert(0, self.child2)
+        self.assertIs(self.child2.heavy_root, self.root)
+        self.assertEqual(self.child2.idx_pre_ltr, 2)
+        self.assertEqual(b.idx_pre_ltr, 3)
+
     def test_traversal_methods(self):
         self.root.children_append(self.child1)
         self.root.children_append(self.child2)
@@ -115,9 +215,107 @@ class TestNode(unittest.TestCase):
         bfs_result = list(self.root.bfs())
         self.assertEqual(bfs_result, [self.root, self.child1, self.child2, child1_1])
 
+        # Test skip_self and rtl
+        self.assertEqual(
+            list(self.root.pre_order(skip_self=True)),
+            [self.child1, child1_1, self.child2],
+        )
+        self.assertEqual(
+            list(self.root.post_order(skip_self=True)),
+            [child1_1, self.child1, self.child2],
+        )
+
+        child1_2 = Node(type="child1_2", label="child_node_1_2")
+        self.child1.children_append(child1_2)
+        self.assertEqual(
+            list(self.root.pre_order(rtl=True)),
+            [self.root, self.child2, self.child1, child1_2, child1_1],
+        )
+        self.assertEqual(
+            list(self.root.post_order(rtl=True)),
+            [self.child2, child1_2, child1_1, self.child1, self.root],
+        )
+
+    def test_deep_tree(self):
+        depth = 2 * sys.getrecursionlimit()
+
+        root = node("0")
+        leaf = root
+        for i in range(1, depth):
+            leaf = node(str(i), parent=leaf)
+
+        self.assertEqual(root.size, depth)
+        self.assertEqual(root.height, depth - 1)
+        self.assertEqual(len(list(root.pre_order())), depth)
+        self.assertIs(next(root.post_order()), leaf)
+        self.assertEqual(root.deep_copy().size, depth)
+
     def test_hash_value(self):
         self.assertEqual(node("a").subtree_hash_value, node("a").subtree_hash_value)
 
+    def test_fast_hash_strategy(self):
+        self.assertIsInstance(Node.hash_strategy, FastHashStrategy)
+
+        a = node("a", children=[node("b"), node("c")])
+        b = node("a", children=[node("b"), node("c")])
+        swapped = node("a", children=[node("c"), node("b")])
+        relabeled = Node(type="a", label="a", children=[node("b"), node("d")])
+
+        self.assertEqual(a.subtree_hash_value, b.subtree_hash_value)
+        self.assertNotEqual(a.subtree_hash_value, swapped.subtree_hash_value)
+        self.assertNotEqual(a.subtree_hash_value, relabeled.subtree_hash_value)
+        self.assertNotEqual(a.hash_value, node("a").hash_value)  # leafness
+        self.assertLess(a.subtree_hash_value, 1 << 64)
+
+        relabeled.children[1].type = "c"
+        relabeled.children[1].label = "c"
+        relabeled.children[1].needs_lightweight_recomputation()
+        self.assertEqual(a.subtree_hash_value, relabeled.subtree_hash_value)
+
+    def test_is_isomorphic(self):
+        a = node("a", children=[node("b"), node("c")])
+        self.assertTrue(a.is_isomorphic(node("a", children=[node("b"), node("c")])))
+        self.assertFalse(a.is_isomorphic(node("a", children=[node("c"), node("b")])))
+        self.assertFalse(a.is_isomorphic(node("a", children=[node("b")])))
+
+    def test_invalidation_stops_at_stale_ancestor(self):
+        # Statistics are read between edits, so some of the walks up stop at
+        # a stale ancestor and others do not
+        root = node("a")
+        leaf = root
+        for i in range(50):
+            child = node("b", children=[node("c")])
+            leaf.children_append(child)
+            leaf = child
+            if i % 7 == 0:
+                self.assertEqual(root.size, 2 * i + 3)
+
+        moved = leaf.parent.parent
+        moved.parent.children_remove(moved)
+        self.assertEqual(root.size, 2 * 50 + 1 - moved.size)
+        root.children_insert(0, moved)
+        self.assertEqual(root.size, 2 * 50 + 1)
+
+        leaf.children[0].label = "d"
+        leaf.children[0].needs_lightweight_recomputation()
+        moved.children[0].label = "e"
+        moved.children[0].needs_lightweight_recomputation()
+
+        copy = root.deep_copy()
+        for a, b in zip(root.pre_order(), copy.pre_order(), strict=True):
+            self.assertEqual(a.size, b.size)
+            self.assertEqual(a.height, b.height)
+            self.assertEqual(a.subtree_hash_value, b.subtree_hash_value)
+
+    def test_identity_hash(self):
+        a, b = node("a"), node("a")
+        self.assertEqual(a.hash_value, b.hash_value)
+
+        d = {a: 1, b: 2}
+        self.assertEqual(len(d), 2)
+        self.assertEqual(d[a], 1)
+        self.assertEqual(d[b], 2)
+
 
 class TestAction(unittest.TestCase):
     def test_orig_node(self):
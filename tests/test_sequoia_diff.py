@@ -1,20 +1,52 @@
+import itertools
 import logging
 import os
+import pickle
+import sys
 import unittest
-from unittest.mock import MagicMock, call, patch
+from dataclasses import replace
+from functools import partial
+from unittest.mock import ANY, MagicMock, call, patch
 
 import yaml
+from tree_sitter import Node as TSNode
+from tree_sitter import Parser
 
 # from sequoia_diff import SEQUOIA_RULES,
-from sequoia_diff import get_tree_diff
+from sequoia_diff import LabelDistanceCache, get_tree_diff
 from sequoia_diff.actions import generate_simplified_chawathe_edit_script
-from sequoia_diff.loaders import PATH_TS_RULES, from_tree_sitter_tree
+from sequoia_diff.hashing import HashStrategy
+from sequoia_diff.loaders import (
+    INTERNED_LABEL_MAX_LENGTH,
+    PATH_TS_RULES,
+    LanguageRuleRegistry,
+    SourceRange,
+    from_tree_sitter_node,
+    from_tree_sitter_tree,
+)
 from sequoia_diff.matching import (
+    DstCandidatesIndex,
+    MappedDescendantsIndex,
+    MatcherConfig,
+    dice_similarity,
     generate_mappings,
+    get_dst_candidates,
+    match_chawathe_fast,
     match_greedy_bottom_up,
     match_greedy_top_down,
+    match_histogram,
+    match_rted,
+    match_rted_numpy,
+    number_of_mapped_descendants,
+)
+from sequoia_diff.models import (
+    Delete,
+    Insert,
+    LanguageRules,
+    LanguageRuleSet,
+    MappingDict,
+    Node,
 )
-from sequoia_diff.models import Insert, LanguageRuleSet, MappingDict, Node
 from tests.util import (
     PATH_DATA,
     TS_LANGUAGE_JAVA,
@@ -101,6 +133,106 @@ class TestGetTreeAndAdjacent(unittest.TestCase):
 
         from_tree_sitter_tree(self.tree_before, self.java_rules)
 
+    def test_from_tree_sitter_tree_labels_and_depth(self):
+        def pretty(node: Node) -> list[tuple[str, str | None, int]]:
+            return [(n.type, n.label, len(n.children)) for n in node.pre_order()]
+
+        # Multi-byte characters before a label do not shift it
+        source = 'class A { String s = "héllo"; int ünïcode = 1; }'
+        parser = Parser(TS_LANGUAGE_JAVA)
+        tree = parser.parse(source.encode("utf-8"))
+        labels = [
+            n.label
+            for n in from_tree_sitter_tree(tree, "java").pre_order()
+            if n.label is not None
+        ]
+        self.assertIn("héllo", labels)
+        self.assertIn("ünïcode", labels)
+
+        # Subtrees are converted on their own
+        root = from_tree_sitter_tree(tree, self.java_rules)
+        class_body = tree.root_node.children[0].child_by_field_name("body")
+        self.assertEqual(
+            pretty(from_tree_sitter_node(class_body, self.java_rules)),
+            pretty(root.children[0].children[-1]),
+        )
+
+        # Deeper than the recursion limit
+        depth = 2 * sys.getrecursionlimit()
+        tree = parser.parse(
+            f"class A {{ int x = {'(' * depth}1{')' * depth}; }}".encode("utf-8")
+        )
+        self.assertGreater(from_tree_sitter_tree(tree).height, depth)
+
+    def test_retention_modes(self):
+        with_nodes = from_tree_sitter_tree(self.tree_before, self.java_rules)
+        with_ranges = from_tree_sitter_tree(self.tree_before, self.java_rules, "range")
+        with_nothing = from_tree_sitter_tree(self.tree_before, self.java_rules, "none")
+
+        for x, y, z in zip(
+            with_nodes.pre_order(),
+            with_ranges.pre_order(),
+            with_nothing.pre_order(),
+            strict=True,
+        ):
+            self.assertIsInstance(y.orig_node, SourceRange)
+            self.assertIs(y.orig_node.ranges, with_ranges.orig_node.ranges)
+            self.assertEqual(y.orig_node.start_point, x.orig_node.start_point)
+            self.assertEqual(y.orig_node.end_byte, x.orig_node.end_byte)
+            self.assertEqual(y.orig_node.rehydrate(self.tree_before), x.orig_node)
+            self.assertIsNone(z.orig_node)
+
+        # The ranges of a whole tree are pickled once
+        copy = pickle.loads(pickle.dumps(with_ranges))
+        self.assertEqual(
+            [n.orig_node for n in copy.pre_order()],
+            [n.orig_node for n in with_ranges.pre_order()],
+        )
+        self.assertEqual(len(copy.orig_node.ranges), with_ranges.size)
+
+        actions = get_tree_diff(
+            self.tree_before, self.tree_after, from_tree_sitter_tree, ["java", "range"]
+        )
+        self.assertNotEqual(len(actions), 0)
+        for action in actions:
+            tree = self.tree_after if isinstance(action, Insert) else self.tree_before
+            self.assertIsInstance(action.get_orig_node(tree), TSNode)
+            self.assertIsInstance(action.get_orig_node(), SourceRange)
+
+        with self.assertRaises(ValueError):
+            from_tree_sitter_tree(self.tree_before, self.java_rules, "nodes")
+
+    def test_interned_types_and_labels(self):
+        before = from_tree_sitter_tree(self.tree_before, self.java_rules)
+        after = from_tree_sitter_tree(self.tree_after, self.java_rules)
+
+        first_seen: dict[str, str] = {}
+        for n in itertools.chain(before.pre_order(), after.pre_order()):
+            for s in [n.type, n.label]:
+                if s is not None and len(s) <= INTERNED_LABEL_MAX_LENGTH:
+                    self.assertIs(first_seen.setdefault(s, s), s)
+
+    def test_language_rule_registry(self):
+        registry = LanguageRuleRegistry()
+
+        # Read once, and flattened/ignored are sets
+        java_rules = registry.get("java")
+        self.assertIs(registry.get("java"), java_rules)
+        self.assertEqual(java_rules, self.java_rules)
+        self.assertIsInstance(java_rules.ignored, frozenset)
+
+        with self.assertRaises(ValueError):
+            registry.get("cobol")
+
+        # Registered rules take precedence over the default ones
+        custom_rules = LanguageRules(ignored=["class_body"])
+        registry.register("java", custom_rules)
+        self.assertIs(registry.get("java"), custom_rules)
+        self.assertIn("go", registry)
+
+        node = from_tree_sitter_tree(self.tree_before, custom_rules)
+        self.assertNotIn("class_body", [n.type for n in node.pre_order()])
+
     def test_mapping_dict(self):
         node = from_tree_sitter_tree(self.tree_before, self.java_rules)
 
@@ -147,6 +279,308 @@ class TestGetTreeAndAdjacent(unittest.TestCase):
         actions = generate_simplified_chawathe_edit_script(mappings, src, dst)
         self.assertEqual(actions, expected_actions)
 
+    def test_mapped_descendants_index(self):
+        src = node(
+            "root",
+            children=[
+                node("a", children=[node("x"), node("y")]),
+                node("b", children=[node("a", children=[node("x")]), node("z")]),
+            ],
+        )
+        dst = node(
+            "root",
+            children=[
+                node("b", children=[node("z"), node("a", children=[node("x")])]),
+                node("a", children=[node("y"), node("x")]),
+            ],
+        )
+
+        mappings = MappingDict()
+        match_greedy_top_down(mappings, src, dst)
+        mappings.put(src.children[0].children[1], dst.children[1].children[0])
+
+        index = MappedDescendantsIndex(mappings)
+        for src_node in src.post_order():
+            index.update(src_node)
+            for dst_node in dst.pre_order():
+                self.assertEqual(
+                    index.number_of_mapped_descendants(src_node, dst_node),
+                    number_of_mapped_descendants(mappings, src_node, dst_node),
+                )
+
+        mappings.put(src.children[0], dst.children[1])
+        index.rebuild(src)
+        self.assertEqual(
+            index.number_of_mapped_descendants(src, dst),
+            number_of_mapped_descendants(mappings, src, dst),
+        )
+        self.assertEqual(
+            index.dice_similarity(src, dst), dice_similarity(mappings, src, dst)
+        )
+
+    def test_dst_candidates_index(self):
+        src = node(
+            "root",
+            children=[
+                node("a", children=[node("x"), node("y")]),
+                node("b", children=[node("a", children=[node("x")]), node("z")]),
+            ],
+        )
+        dst = node(
+            "root",
+            children=[
+                node("b", children=[node("z"), node("a", children=[node("x")])]),
+                node("a", children=[node("y"), node("x")]),
+            ],
+        )
+
+        mappings = MappingDict()
+        match_greedy_top_down(mappings, src, dst)
+        mappings.put(src.children[0].children[1], dst.children[1].children[0])
+
+        index = DstCandidatesIndex(mappings)
+        for src_node in src.post_order():
+            index.update(src_node)
+            self.assertEqual(
+                index.get_dst_candidates(src_node),
+                get_dst_candidates(mappings, src_node),
+            )
+
+    @unittest.skipIf(match_rted_numpy is None, "NumPy is not installed")
+    def test_match_rted_numpy(self):
+        for test_case_name in ["0", "1", "2", "3"]:
+            src = from_tree_sitter_tree(
+                read_and_parse_tree(
+                    TS_LANGUAGE_JAVA,
+                    os.path.join(self.PATH_MY_DATA, test_case_name, "before.java"),
+                ),
+                self.java_rules,
+            )
+            dst = from_tree_sitter_tree(
+                read_and_parse_tree(
+                    TS_LANGUAGE_JAVA,
+                    os.path.join(self.PATH_MY_DATA, test_case_name, "after.java"),
+                ),
+                self.java_rules,
+            )
+
+            expected = match_rted(MappingDict(), src, dst)
+            result = match_rted_numpy(MappingDict(), src, dst)
+            self.assertEqual(
+                list(result.items()),
+                list(expected.items()),
+                "Failed on test case: " + test_case_name,
+            )
+
+    def test_match_chawathe_fast(self):
+        def statement(name: str) -> Node:
+            return Node(
+                type="expression_statement",
+                label=None,
+                children=[
+                    Node(type="identifier", label=name),
+                    Node(type=";", label=";"),
+                ],
+            )
+
+        src = node(
+            "block", children=[statement(name) for name in ["foo", "bar", "baz"]]
+        )
+        dst = node("block", children=[statement(name) for name in ["foo", "baz"]])
+
+        mappings = generate_mappings(src, dst, [match_chawathe_fast])
+        self.assertEqual(len(mappings), dst.size)
+
+        # The `;` of the deleted statement is not mapped to the one of the next
+        actions = generate_simplified_chawathe_edit_script(mappings, src, dst)
+        self.assertEqual(actions, [Delete(src.children[1])])
+
+        # Statements with unique names are aligned before the LCS, which is
+        # given up between them past chawathe_max_d
+        names = [f"name{i}" for i in range(50)]
+        src = node("block", children=[statement(name) for name in names])
+        dst = node(
+            "block",
+            children=[statement(name) for name in names[:25] + ["new"] + names[25:]],
+        )
+        config = MatcherConfig(chawathe_max_d=0)
+        mappings = generate_mappings(
+            src, dst, [partial(match_chawathe_fast, config=config)]
+        )
+        actions = generate_simplified_chawathe_edit_script(mappings, src, dst)
+        self.assertEqual(actions, [Insert(dst.children[25], src, 25, True)])
+
+    def test_matcher_config_budgets(self):
+        def load(name: str) -> Node:
+            return from_tree_sitter_tree(
+                read_and_parse_tree(
+                    TS_LANGUAGE_JAVA, os.path.join(self.PATH_MY_DATA, "0", name)
+                ),
+                self.java_rules,
+            )
+
+        src, dst = load("before.java"), load("after.java")
+
+        def mapped(config: MatcherConfig) -> list[tuple[int, int]]:
+            mappings = generate_mappings(src, dst, config=config)
+            return sorted((id(a), id(b)) for a, b in mappings.items())
+
+        # Pairs that back off without a fallback are skipped, like pairs above
+        # the size threshold
+        skipped = mapped(MatcherConfig(last_chance_size_threshold=0))
+        self.assertNotEqual(skipped, mapped(MatcherConfig()))
+        self.assertEqual(
+            skipped,
+            mapped(MatcherConfig(last_chance_max_cost=0, last_chance_fallback=None)),
+        )
+        self.assertEqual(
+            skipped,
+            mapped(
+                MatcherConfig(last_chance_time_budget=0.0, last_chance_fallback=None)
+            ),
+        )
+
+    def test_label_distance_cache_counters(self):
+        cache = LabelDistanceCache()
+        actions = get_tree_diff(
+            self.tree_before, self.tree_after, label_distances=cache
+        )
+        self.assertEqual(
+            [dictize_action(a) for a in actions],
+            [
+                dictize_action(a)
+                for a in get_tree_diff(self.tree_before, self.tree_after)
+            ],
+        )
+        self.assertGreater(cache.misses, 0)
+
+        # Shared by the next diff
+        misses = cache.misses
+        get_tree_diff(self.tree_before, self.tree_after, label_distances=cache)
+        self.assertEqual(cache.misses, misses)
+        self.assertGreater(cache.hits, 0)
+
+    def test_custom_matching_funcs(self):
+        calls = []
+
+        def my_matcher(mappings: MappingDict, src: Node, dst: Node) -> None:
+            calls.append((src, dst))
+            mappings.put(src, dst)
+
+        src, dst = node("a"), node("a")
+        mappings = generate_mappings(src, dst, [my_matcher], MatcherConfig())
+        self.assertEqual(calls, [(src, dst)])
+        self.assertEqual(list(mappings.items()), [(src, dst)])
+
+    def test_matcher_config_min_height(self):
+        src = node("root", children=[node("a", children=[node("x")]), node("c")])
+        dst = node("root", children=[node("a", children=[node("x")]), node("d")])
+
+        mappings = MappingDict()
+        match_greedy_top_down(mappings, src, dst)
+        self.assertTrue(mappings.has(src.children[0], dst.children[0]))
+
+        mappings = MappingDict()
+        match_greedy_top_down(mappings, src, dst, MatcherConfig(min_height=2))
+        self.assertEqual(len(mappings), 0)
+
+    def test_matcher_config_adaptive_sim_threshold(self):
+        def tree(types: list[str]) -> Node:
+            children = [node(t, children=[node("leaf")]) for t in types]
+            return node("root", children=[node("p", children=children)])
+
+        # Two of the five children of p are kept, so the dice similarity of the
+        # p nodes is 0.4
+        src = tree(["k1", "k2", "k3", "k4", "k5"])
+        dst = tree(["k1", "k2", "m3", "m4", "m5"])
+        p_src, p_dst = src.children[0], dst.children[0]
+
+        # Without last-chance matching, only the bottom-up similarity maps p
+        fixed = MatcherConfig(last_chance_size_threshold=0)
+        adaptive = replace(fixed, sim_threshold="adaptive")
+        self.assertFalse(generate_mappings(src, dst, config=fixed).has(p_src, p_dst))
+        self.assertTrue(generate_mappings(src, dst, config=adaptive).has(p_src, p_dst))
+
+        thorough = replace(MatcherConfig.thorough(), last_chance_size_threshold=0)
+        self.assertTrue(generate_mappings(src, dst, config=thorough).has(p_src, p_dst))
+
+    def test_matcher_config_low_latency(self):
+        # Both trees are under the size threshold, but the product of their
+        # sizes is above the maximum cost, so RTED is not used
+        src = node("root", children=[node(f"x{i}") for i in range(400)])
+        dst = node("root", children=[node(f"y{i}") for i in range(400)])
+
+        with (
+            patch("sequoia_diff.matching.match_rted") as rted,
+            patch("sequoia_diff.matching.match_rted_numpy") as rted_numpy,
+            patch(
+                "sequoia_diff.matching.match_histogram", wraps=match_histogram
+            ) as histogram,
+        ):
+            generate_mappings(src, dst, config=MatcherConfig.low_latency())
+
+        rted.assert_not_called()
+        rted_numpy.assert_not_called()
+        histogram.assert_called_once_with(ANY, src, dst)
+
+    def test_match_histogram(self):
+        src = node(
+            "root",
+            children=[
+                node("a", children=[node("x"), node("y"), node("y")]),
+                node("b"),
+                node("b"),
+            ],
+        )
+        dst = node(
+            "root",
+            children=[
+                node("b"),
+                Node(type="a", label="renamed", children=[node("y"), node("x")]),
+            ],
+        )
+
+        mappings = match_histogram(MappingDict(), src, dst)
+        self.assertEqual(
+            list(mappings.items()),
+            [
+                (src.children[0], dst.children[1]),
+                (src.children[0].children[0], dst.children[1].children[1]),
+            ],
+        )
+
+    def test_top_down_hash_collisions(self):
+        class CollidingHashStrategy(HashStrategy):
+            def compute(self, node: Node) -> tuple[int, int, int]:
+                return 0, 0, 0
+
+        with patch.object(Node, "hash_strategy", CollidingHashStrategy()):
+            src = node(
+                "root",
+                children=[
+                    node("a", children=[node("x")]),
+                    node("b", children=[node("y")]),
+                ],
+            )
+            dst = node(
+                "root",
+                children=[
+                    node("b", children=[node("y")]),
+                    node("a", children=[node("x")]),
+                ],
+            )
+
+            mappings = MappingDict()
+            match_greedy_top_down(mappings, src, dst)
+
+        expected_mappings = [
+            (src.children[0], dst.children[1]),
+            (src.children[0].children[0], dst.children[1].children[0]),
+            (src.children[1], dst.children[0]),
+            (src.children[1].children[0], dst.children[0].children[0]),
+        ]
+        self.assertEqual(list(mappings.items()), expected_mappings)
+
     def test_test_cases(self):
         # get all folders in PATH_MY_DATA
         test_cases_dirs: list[str] = []
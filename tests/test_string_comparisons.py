@@ -1,10 +1,20 @@
 import logging
+import random
 import unittest
+from unittest.mock import patch
 
+from sequoia_diff import string_comparisons
 from sequoia_diff.string_comparisons import (
+    BitParallelBackend,
+    DifflibBackend,
+    LabelDistanceCache,
+    MultisetBackend,
+    RapidFuzzBackend,
+    generate_trigrams,
     levenshtein_distance,
     normalized_levenshtein_distance,
     normalized_tri_gram_distance,
+    rapidfuzz_levenshtein,
     tri_gram_distance,
 )
 
@@ -26,10 +36,75 @@ class TestStringComparisons(unittest.TestCase):
             (None, None, 0, 0.0, 0.0, 0.0),
         ]
 
-        for s1, s2, lev, lev_norm, tri, tri_norm in data:
-            logging.debug(f"s1: {s1}, s2: {s2}")
+        backends = [DifflibBackend(), BitParallelBackend(), MultisetBackend()]
+        if rapidfuzz_levenshtein is not None:
+            backends.append(RapidFuzzBackend())
 
-            self.assertEqual(levenshtein_distance(s1, s2), lev)
-            self.assertAlmostEqual(normalized_levenshtein_distance(s1, s2), lev_norm)
-            self.assertEqual(tri_gram_distance(s1, s2), tri)
-            self.assertAlmostEqual(normalized_tri_gram_distance(s1, s2), tri_norm)
+        for backend in backends:
+            with patch.object(string_comparisons, "distance_backend", backend):
+                for s1, s2, lev, lev_norm, tri, tri_norm in data:
+                    logging.debug(f"{type(backend).__name__}, s1: {s1}, s2: {s2}")
+
+                    self.assertEqual(levenshtein_distance(s1, s2), lev)
+                    self.assertAlmostEqual(
+                        normalized_levenshtein_distance(s1, s2), lev_norm
+                    )
+                    self.assertEqual(tri_gram_distance(s1, s2), tri)
+                    self.assertAlmostEqual(
+                        normalized_tri_gram_distance(s1, s2), tri_norm
+                    )
+
+    def test_backends_same_as_difflib(self):
+        rng = random.Random(0)
+        reference = DifflibBackend()
+        backends = [BitParallelBackend()]
+        if rapidfuzz_levenshtein is not None:
+            backends.append(RapidFuzzBackend())
+
+        for _ in range(300):
+            # Few distinct characters, so that the tri-grams repeat
+            s1 = "".join(rng.choices("abcé", k=rng.randint(0, 80)))
+            s2 = "".join(rng.choices("abcé", k=rng.randint(0, 80)))
+            t1 = generate_trigrams(s1)
+            t2 = generate_trigrams(s2)
+            expected_lev = reference.levenshtein_distance(s1, s2)
+            expected_tri = reference.matching_tri_grams(t1, t2)
+
+            for backend in backends:
+                self.assertEqual(backend.levenshtein_distance(s1, s2), expected_lev)
+                self.assertEqual(backend.matching_tri_grams(t1, t2), expected_tri)
+
+            # Multisets ignore the order of the tri-grams
+            self.assertGreaterEqual(
+                MultisetBackend().matching_tri_grams(t1, t2), expected_tri
+            )
+
+        # Lists of tri-grams this long get the autojunk heuristic of difflib
+        t1 = generate_trigrams("ab" * 150 + "c")
+        t2 = generate_trigrams("ab" * 140 + "c")
+        self.assertEqual(
+            BitParallelBackend().matching_tri_grams(t1, t2),
+            reference.matching_tri_grams(t1, t2),
+        )
+
+    def test_label_distance_cache(self):
+        cache = LabelDistanceCache(maxsize=2)
+        pairs = [("kitten", "sitting"), ("flaw", "lawn"), ("kitten", "sitting")]
+        for a, b in pairs:
+            self.assertEqual(
+                cache.normalized_tri_gram_distance(a, b),
+                normalized_tri_gram_distance(a, b),
+            )
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        # Equal labels are not cached
+        self.assertEqual(cache.normalized_tri_gram_distance(None, ""), 0.0)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        # ("flaw", "lawn") is the least recently used pair
+        cache.normalized_tri_gram_distance("abc", None)
+        cache.normalized_tri_gram_distance("flaw", "lawn")
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+        # So are the tri-grams
+        self.assertLessEqual(cache._trigrams.cache_info().currsize, 2)